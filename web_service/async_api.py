@@ -0,0 +1,88 @@
+import asyncio
+import contextvars
+import functools
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from config import logger
+from utils import CancelToken, current_cancel_token
+from reservation import make_reservation
+from cancellation import cancel_reservation
+from working_oxylabs_all_meal import make_reservation_external
+
+# Flows allowed to run at once per site; further callers wait on the site's semaphore.
+SITE_CONCURRENCY = {
+    "yelp": 8,
+    "opentable": 4,
+}
+CANCEL_GRACE = 5   # seconds a cancelled flow gets to stop and return its session
+
+# Flows run on a dedicated pool sized to the site limits so they never starve the loop's default executor.
+_executor = ThreadPoolExecutor(max_workers=sum(SITE_CONCURRENCY.values()), thread_name_prefix="flow")
+_semaphores = weakref.WeakKeyDictionary()   # event loop -> {site: asyncio.Semaphore}
+
+def _site_semaphore(site):
+    loop = asyncio.get_running_loop()
+    per_loop = _semaphores.setdefault(loop, {})
+    if site not in per_loop:
+        per_loop[site] = asyncio.Semaphore(SITE_CONCURRENCY[site])
+    return per_loop[site]
+
+def _log_late_result(future):
+    if not future.cancelled() and future.exception() is not None:
+        logger.info("Cancelled flow finished with %r", future.exception())
+
+async def run_flow(site, func, *args, timeout=None, deadline=None, **kwargs):
+    """
+    Runs a blocking flow in a worker thread under the site's concurrency limit.
+    timeout is in seconds; deadline is an absolute loop.time(). Whichever comes
+    first wins, and queueing for the site counts against it. Raises
+    asyncio.TimeoutError when it passes. When the awaitable
+    is cancelled or times out, the flow's cancel token is set: its current
+    WebDriver wait stops and its session goes back to the pool before this
+    coroutine re-raises (waiting at most CANCEL_GRACE seconds).
+    """
+    loop = asyncio.get_running_loop()
+    if timeout is not None:
+        deadline = loop.time() + timeout if deadline is None else min(deadline, loop.time() + timeout)
+
+    def remaining():
+        return None if deadline is None else max(deadline - loop.time(), 0)
+
+    # Time spent queued behind the site's limit counts against the deadline.
+    semaphore = _site_semaphore(site)
+    await asyncio.wait_for(semaphore.acquire(), remaining())
+    try:
+        token = CancelToken()
+        context = contextvars.copy_context()
+        context.run(current_cancel_token.set, token)
+        future = loop.run_in_executor(_executor, functools.partial(context.run, func, *args, **kwargs))
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), remaining())
+        except (asyncio.CancelledError, asyncio.TimeoutError) as e:
+            token.cancel("timed out" if isinstance(e, asyncio.TimeoutError) else "cancelled")
+            future.add_done_callback(_log_late_result)
+            # Give the flow a moment to stop so its session is back in the pool when we return.
+            done, _ = await asyncio.wait({future}, timeout=CANCEL_GRACE)
+            if not done:
+                logger.warning("%s did not stop within %d seconds of being cancelled.", getattr(func, "__name__", func), CANCEL_GRACE)
+            raise
+    finally:
+        semaphore.release()
+
+async def make_reservation_async(*args, timeout=None, deadline=None, **kwargs):
+    """
+    Awaitable make_reservation. Takes the same arguments, plus timeout/deadline.
+    """
+    return await run_flow("yelp", make_reservation, *args, timeout=timeout, deadline=deadline, **kwargs)
+
+async def cancel_reservation_async(*args, timeout=None, deadline=None, **kwargs):
+    """
+    Awaitable cancel_reservation. Takes the same arguments, plus timeout/deadline.
+    """
+    return await run_flow("yelp", cancel_reservation, *args, timeout=timeout, deadline=deadline, **kwargs)
+
+async def make_reservation_external_async(*args, timeout=None, deadline=None, **kwargs):
+    """
+    Awaitable make_reservation_external. Takes the same arguments, plus timeout/deadline.
+    """
+    return await run_flow("opentable", make_reservation_external, *args, timeout=timeout, deadline=deadline, **kwargs)
@@ -0,0 +1,117 @@
+import queue
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from config import logger
+from driver import DEFAULT_LAUNCH_PROFILE
+from http_client import get_http_session
+from reservation import make_reservation
+from singleflight import availability_flights
+from utils import validate_date, validate_reservation_date
+from yelp_http import YELP_BASE_URL, fetch_reservation_page, availability_from_page, exact_slot_available
+
+BATCH_MAX_WORKERS = 8   # restaurants checked at the same time
+
+AvailabilityCell = namedtuple("AvailabilityCell", "restaurant_id date hour minute party_size")
+
+def availability_grid(restaurants, dates, times, party_sizes):
+    """
+    Expands restaurants x dates x times x party sizes into AvailabilityCells.
+    times are (hour, minute) pairs or 'HH:MM' strings.
+    """
+    cells = []
+    for restaurant_id in restaurants:
+        for date in dates:
+            for requested in times:
+                hour, minute = map(int, requested.split(":")) if isinstance(requested, str) else requested
+                for party_size in party_sizes:
+                    cells.append(AvailabilityCell(restaurant_id, date, hour, minute, str(party_size)))
+    return cells
+
+def _check_restaurant(cells, results, proxy, launch_profile, request_allowlist, base_url):
+    # One worker per restaurant: cells share the HTTP session and, where the
+    # requested time is already shown on a loaded page, the page itself.
+    session = get_http_session(*proxy)
+    pages = {}   # (date, party_size) -> last parsed page
+    for cell in sorted(cells, key=lambda c: (c.date, c.party_size, c.hour, c.minute)):
+        start = time.perf_counter()
+        try:
+            try:
+                validate_date(cell.date)
+            except ValueError as e:
+                results.put((cell, (False, None, None, str(e))))
+                continue
+            if not (0 <= cell.hour < 24 and 0 <= cell.minute < 60):
+                results.put((cell, (False, None, None, f"Invalid time {cell.hour:02d}:{cell.minute:02d}.")))
+                continue
+            if not validate_reservation_date(cell.date, cell.hour, cell.minute):
+                results.put((cell, (False, None, None, "Invalid reservation: Date and time is in the past.")))
+                continue
+
+            result = None
+            page = pages.get((cell.date, cell.party_size))
+            if page is not None and exact_slot_available(page, cell.hour, cell.minute):
+                result = (True, None, None, None)
+                logger.info("Batch cell %s answered from an already loaded page.", cell)
+            else:
+                try:
+                    page = availability_flights.do(
+                        ("yelp", "page", cell.restaurant_id, cell.date, cell.hour, cell.minute, cell.party_size, base_url),
+                        lambda: fetch_reservation_page(session, cell.restaurant_id, cell.date, cell.hour, cell.minute, cell.party_size, base_url))
+                    pages[(cell.date, cell.party_size)] = page
+                    result = availability_from_page(page, cell.date, cell.hour, cell.minute, cell.party_size)
+                except Exception as e:
+                    logger.warning("HTTP check failed for batch cell %s, using the browser: %s", cell, e)
+
+            if result is None:
+                result = make_reservation(
+                    date=cell.date, hour=cell.hour, minute=cell.minute, party_size=cell.party_size,
+                    restaurant_id=cell.restaurant_id,
+                    proxy_host=proxy[0], proxy_port=proxy[1], proxy_username=proxy[2], proxy_password=proxy[3], proxy_scheme=proxy[4],
+                    launch_profile=launch_profile, request_allowlist=request_allowlist, use_http_probe=False,
+                )
+        except Exception as e:
+            logger.exception("Batch cell %s failed", cell)
+            result = (False, None, None, f"Unexpected error: {e}")
+        logger.info("Batch cell %s -> %s in %.4f seconds", cell, result, time.perf_counter() - start)
+        results.put((cell, result))
+
+def check_availability_many(cells,
+                            proxy_host=None,
+                            proxy_port=None,
+                            proxy_username=None,
+                            proxy_password=None,
+                            proxy_scheme="http",
+                            max_workers=BATCH_MAX_WORKERS,
+                            launch_profile=DEFAULT_LAUNCH_PROFILE,
+                            request_allowlist=None,
+                            base_url=YELP_BASE_URL):
+    """
+    Checks availability for many AvailabilityCells (see availability_grid).
+    Cells are grouped by restaurant and the groups run on at most max_workers
+    threads. Yields (cell, result) pairs as they complete, where result is
+    make_reservation's availability 4-tuple. Cells the HTTP check cannot
+    answer go through the pooled browser.
+    """
+    groups = OrderedDict()
+    for cell in cells:
+        groups.setdefault(cell.restaurant_id, []).append(cell)
+    if not groups:
+        return
+
+    overall_start = time.perf_counter()
+    total = sum(len(group) for group in groups.values())
+    results = queue.Queue()
+    proxy = (proxy_host, proxy_port, proxy_username, proxy_password, proxy_scheme)
+    logger.info("Checking %d cells across %d restaurants with %d workers.", total, len(groups), min(max_workers, len(groups)))
+
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(groups)), thread_name_prefix="availability-batch")
+    try:
+        for group in groups.values():
+            executor.submit(_check_restaurant, group, results, proxy, launch_profile, request_allowlist, base_url)
+        for _ in range(total):
+            yield results.get()
+    finally:
+        # If the caller stops early, drop restaurants that have not started.
+        executor.shutdown(wait=False, cancel_futures=True)
+    logger.info("Checked %d cells in %.4f seconds", total, time.perf_counter() - overall_start)
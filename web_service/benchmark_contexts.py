@@ -0,0 +1,72 @@
+import argparse
+import time
+from config import logger
+from contexts import SharedBrowser
+from driver import DEFAULT_LAUNCH_PROFILE, LAUNCH_PROFILES, setup_driver, quit_driver
+from procs import driver_service_pid, tree_rss
+
+GB = 1024 ** 3
+
+def _load(drivers, url):
+    for driver in drivers:
+        driver.get(url)
+    time.sleep(1)  # let renderers settle before sampling RSS
+
+def measure_processes(flows, url, launch_profile):
+    """
+    RSS of `flows` separate Chrome processes, one per flow (the current model).
+    """
+    drivers = []
+    try:
+        for _ in range(flows):
+            drivers.append(setup_driver(launch_profile=launch_profile))
+        _load(drivers, url)
+        return sum(tree_rss(driver_service_pid(driver)) for driver in drivers)
+    finally:
+        for driver in drivers:
+            quit_driver(driver)
+
+def measure_contexts(flows, url, launch_profile):
+    """
+    RSS of one Chrome process hosting `flows` browser contexts, including the
+    chromedriver attached to each context.
+    """
+    browser = SharedBrowser(launch_profile, max_contexts=flows)
+    drivers = []
+    try:
+        for _ in range(flows):
+            drivers.append(browser.open_context())
+        _load(drivers, url)
+        # The host driver's tree holds Chrome and every renderer; the attached
+        # chromedrivers are separate processes.
+        total = tree_rss(driver_service_pid(browser.host_driver))
+        total += sum(tree_rss(driver_service_pid(driver)) for driver in drivers)
+        return total
+    finally:
+        for driver in drivers:
+            browser.close_context(driver)
+        browser.close()
+
+def run_benchmark(flow_counts, url, launch_profile):
+    """
+    Logs RSS and flows per GB of RAM for separate processes vs. contexts.
+    """
+    results = {}
+    for flows in flow_counts:
+        process_rss = measure_processes(flows, url, launch_profile)
+        context_rss = measure_contexts(flows, url, launch_profile)
+        results[flows] = {"processes": process_rss, "contexts": context_rss}
+        logger.info("%d flows: separate processes %.1f MB (%.1f flows/GB), contexts %.1f MB (%.1f flows/GB)",
+                    flows,
+                    process_rss / 1024 / 1024, flows / (process_rss / GB) if process_rss else 0,
+                    context_rss / 1024 / 1024, flows / (context_rss / GB) if context_rss else 0)
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare memory per concurrent flow: one Chrome per flow vs. browser contexts.")
+    parser.add_argument("--flows", nargs="+", type=int, default=[1, 4, 8])
+    parser.add_argument("--url", default="https://www.yelp.com/reservations/mikiya-wagyu-shabu-house-new-york-3")
+    parser.add_argument("--profile", default=DEFAULT_LAUNCH_PROFILE, choices=sorted(LAUNCH_PROFILES))
+    args = parser.parse_args()
+
+    run_benchmark(args.flows, args.url, args.profile)
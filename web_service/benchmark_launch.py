@@ -0,0 +1,83 @@
+import argparse
+import statistics
+import time
+from config import logger
+from driver import LAUNCH_PROFILES, setup_driver, quit_driver
+from procs import driver_service_pid, tree_rss
+
+def measure_launch(launch_profile, use_profile_template=False, browser_url="", proxy_host=None, proxy_port=None,
+                   proxy_username=None, proxy_password=None, proxy_scheme="http"):
+    """
+    Launches one driver with the given profile and returns
+    (seconds from launch until about:blank is loaded, RSS of the Chrome tree in bytes).
+    RSS is 0 for remote drivers.
+    """
+    start = time.perf_counter()
+    driver = setup_driver(browser_url, proxy_host, proxy_port, proxy_username, proxy_password, proxy_scheme,
+                          launch_profile, use_profile_template)
+    try:
+        driver.get("about:blank")
+        driver.execute_script("return document.readyState;")
+        elapsed = time.perf_counter() - start
+        service_pid = driver_service_pid(driver)
+        rss = tree_rss(service_pid) if service_pid else 0
+        return elapsed, rss
+    finally:
+        quit_driver(driver)
+
+def run_benchmark(profiles, runs, template_modes=(False,), **setup_kwargs):
+    """
+    Measures every profile (with and/or without the profile template) `runs`
+    times and logs launch-to-ready time and RSS.
+    Returns {label: {"launch_seconds": [...], "rss_bytes": [...]}}.
+    """
+    results = {}
+    for profile in profiles:
+        for use_template in template_modes:
+            label = f"{profile}+template" if use_template else profile
+            if use_template:
+                # Build the template outside the measured runs; it is a one-off cost.
+                measure_launch(profile, True, **setup_kwargs)
+            launch_times = []
+            rss_values = []
+            for run in range(runs):
+                elapsed, rss = measure_launch(profile, use_template, **setup_kwargs)
+                launch_times.append(elapsed)
+                rss_values.append(rss)
+                logger.info("Profile '%s' run %d: ready in %.4f seconds, RSS %.1f MB", label, run + 1, elapsed, rss / 1024 / 1024)
+            results[label] = {"launch_seconds": launch_times, "rss_bytes": rss_values}
+
+    for profile, result in results.items():
+        logger.info("Profile '%s': launch-to-ready median %.4f s (min %.4f, max %.4f), RSS median %.1f MB",
+                    profile,
+                    statistics.median(result["launch_seconds"]),
+                    min(result["launch_seconds"]),
+                    max(result["launch_seconds"]),
+                    statistics.median(result["rss_bytes"]) / 1024 / 1024)
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare Chrome launch profiles and profile templates: launch-to-ready time and RSS.")
+    parser.add_argument("--profiles", nargs="+", default=sorted(LAUNCH_PROFILES), choices=sorted(LAUNCH_PROFILES))
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--profile-template", choices=["off", "on", "both"], default="both",
+                        help="start from a fresh profile, a cloned profile template, or compare both")
+    parser.add_argument("--browser-url", default="")
+    parser.add_argument("--proxy-host")
+    parser.add_argument("--proxy-port", type=int)
+    parser.add_argument("--proxy-username")
+    parser.add_argument("--proxy-password")
+    parser.add_argument("--proxy-scheme", default="http")
+    args = parser.parse_args()
+
+    run_benchmark(
+        args.profiles,
+        args.runs,
+        template_modes={"off": (False,), "on": (True,), "both": (False, True)}[args.profile_template],
+        browser_url=args.browser_url,
+        proxy_host=args.proxy_host,
+        proxy_port=args.proxy_port,
+        proxy_username=args.proxy_username,
+        proxy_password=args.proxy_password,
+        proxy_scheme=args.proxy_scheme,
+    )
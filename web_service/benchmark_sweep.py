@@ -0,0 +1,49 @@
+import argparse
+import time
+from config import logger
+from cache import day_slot_cache
+from working_oxylabs_all_meal import get_day_slots_external, sweep_dates_external
+
+def measure_renavigating(dates, restaurant_id, party_size):
+    """
+    Per-date seconds when every date gets its own page load (one all-meals run each).
+    """
+    timings = []
+    for date in dates:
+        day_slot_cache.clear()
+        start = time.perf_counter()
+        get_day_slots_external(date, party_size, restaurant_id)
+        timings.append((date, time.perf_counter() - start))
+    return timings
+
+def measure_sweep(dates, restaurant_id, party_size):
+    """
+    Per-date seconds when one page is loaded and the date is changed in place.
+    The page load is counted as overhead, not against any date.
+    """
+    day_slot_cache.clear()
+    start = time.perf_counter()
+    swept = sweep_dates_external(dates, party_size, restaurant_id)
+    total = time.perf_counter() - start
+    return [(date, seconds) for date, _, seconds in swept], total
+
+def run_benchmark(dates, restaurant_id, party_size):
+    """
+    Logs per-date timings for re-navigating vs. an in-place sweep.
+    """
+    renavigating = measure_renavigating(dates, restaurant_id, party_size)
+    sweep, sweep_total = measure_sweep(dates, restaurant_id, party_size)
+    for (date, renavigate_seconds), (_, sweep_seconds) in zip(renavigating, sweep):
+        logger.info("%s: re-navigating %.4f seconds, in-place %.4f seconds", date, renavigate_seconds, sweep_seconds)
+    logger.info("Total: re-navigating %.4f seconds, in-place sweep %.4f seconds",
+                sum(seconds for _, seconds in renavigating), sweep_total)
+    return {"renavigating": renavigating, "sweep": sweep, "sweep_total": sweep_total}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare per-date slot collection: one page load per date vs. an in-place date sweep.")
+    parser.add_argument("--dates", nargs="+", required=True, help="YYYY-MM-DD dates, in any order")
+    parser.add_argument("--restaurant", required=True, help="OpenTable restref widget URL")
+    parser.add_argument("--party-size", default="2")
+    args = parser.parse_args()
+
+    run_benchmark(sorted(set(args.dates)), args.restaurant, args.party_size)
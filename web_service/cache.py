@@ -0,0 +1,239 @@
+import functools
+import inspect
+import sys
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit
+from config import logger
+from opentable_http import restaurant_rid
+from singleflight import availability_flights
+
+DAY_SLOT_TTL = 300           # seconds a full day's slot set is trusted
+DAY_SLOT_MAX_ENTRIES = 2048  # (restaurant, date, party size) sets kept in memory
+DAY_SLOT_MAX_BYTES = 4 * 1024 * 1024
+
+AVAILABILITY_MAX_ENTRIES = 50000
+AVAILABILITY_MAX_BYTES = 16 * 1024 * 1024   # approximate; least recently used answers go first
+
+# Seconds an availability answer is reused, by outcome. A bookable time is the
+# likeliest to change; "no availability" and out-of-range answers rarely do.
+AVAILABILITY_TTL = {
+    "available": 30,
+    "alternatives": 60,
+    "unavailable": 300,
+    "out_of_range": 1800,
+}
+
+def _approx_size(value):
+    # Rough deep size of the keys and values stored here (tuples, lists, strings, numbers).
+    size = sys.getsizeof(value)
+    if isinstance(value, (tuple, list)):
+        size += sum(_approx_size(item) for item in value)
+    return size
+
+class TTLCache:
+    """
+    Thread-safe mapping whose entries expire ttl seconds after they were set.
+    When over max_entries or max_bytes, the least recently used entries are
+    dropped. Keeps hit/miss counters for stats().
+    """
+
+    def __init__(self, ttl, max_entries, max_bytes=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()   # key -> (expires, value, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _drop(self, key):
+        self._bytes -= self._entries.pop(key)[2]
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        size = _approx_size(key) + _approx_size(value)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value, size)
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or
+                                     (self.max_bytes is not None and self._bytes > self.max_bytes)):
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                return default
+            value = self._entries[key][1]
+            self._drop(key)
+        return value
+
+    def invalidate(self, predicate):
+        """Drops every entry whose key matches predicate; returns how many."""
+        with self._lock:
+            keys = [key for key in self._entries if predicate(key)]
+            for key in keys:
+                self._drop(key)
+            self.invalidations += len(keys)
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+    def __len__(self):
+        return len(self._entries)
+
+# (restaurant, date, party size) -> sorted 'HH:MM' slots bookable that day.
+day_slot_cache = TTLCache(DAY_SLOT_TTL, DAY_SLOT_MAX_ENTRIES, DAY_SLOT_MAX_BYTES)
+# (site, restaurant, date, hour, minute, party size) -> availability 4-tuple.
+availability_cache = TTLCache(AVAILABILITY_TTL["available"], AVAILABILITY_MAX_ENTRIES, AVAILABILITY_MAX_BYTES)
+
+def cache_stats():
+    """
+    Returns hit/miss and size counters of the availability and day slot
+    caches, and how many runs in-flight coalescing saved.
+    """
+    return {"availability": availability_cache.stats(), "day_slots": day_slot_cache.stats(),
+            "coalescing": availability_flights.stats()}
+
+def classify_availability(result):
+    """
+    Returns the AVAILABILITY_TTL outcome of an availability 4-tuple, or None
+    for results that must not be reused (errors, timeouts, invalid input).
+    """
+    available, _, alt_times, message = result
+    if available:
+        return "available"
+    if alt_times or (message or "").startswith("Exact time not available"):
+        return "alternatives"
+    message = message or ""
+    if "not in allowed range" in message or "bigger than maximum" in message:
+        return "out_of_range"
+    if message in ("No time slot buttons found on the page.", "No availability available") or "no longer available" in message:
+        return "unavailable"
+    return None
+
+def invalidate_restaurant(site, restaurant):
+    """
+    Drops every cached answer for a restaurant. Called after a booking or a
+    cancellation there, since either changes what the restaurant can offer.
+    """
+    if restaurant is None:
+        return
+    dropped = availability_cache.invalidate(lambda key: key[0] == site and key[1] == restaurant)
+    if site == "opentable":
+        dropped += day_slot_cache.invalidate(lambda key: key[0] == restaurant)
+    if dropped:
+        logger.info("Invalidated %d cached answer(s) for %s restaurant %s", dropped, site, restaurant)
+
+def yelp_restaurant_from_url(url):
+    """Returns the Yelp business alias from a reservation or confirmation URL."""
+    parts = [part for part in urlsplit(url or "").path.split("/") if part]
+    if "reservations" in parts and parts.index("reservations") + 1 < len(parts):
+        return parts[parts.index("reservations") + 1]
+    return None
+
+def opentable_restaurant_from_url(url):
+    """Returns the numeric OpenTable rid from a widget or booking URL, or None."""
+    try:
+        return restaurant_rid(url or "")
+    except ValueError:
+        return None
+
+def cached_availability(site, restaurant_key):
+    """
+    Wraps an availability flow (make_reservation or make_reservation_external)
+    so repeated questions are answered from availability_cache, and
+    concurrent identical ones share one run, while the flow's use_cache
+    argument is true. Bookings bypass the cache and
+    invalidate the restaurant, whether or not they went through.
+    restaurant_key(restaurant_id) turns the flow's restaurant_id into the
+    key used for caching and invalidation; calls it returns None for are
+    neither cached nor coalesced.
+    """
+    def decorator(flow):
+        signature = inspect.signature(flow)
+
+        @functools.wraps(flow)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            call = bound.arguments
+            restaurant = restaurant_key(call["restaurant_id"])
+            if call["make_booking"]:
+                try:
+                    return flow(*args, **kwargs)
+                finally:
+                    invalidate_restaurant(site, restaurant)
+            if restaurant is None or not call.get("use_cache", True):
+                return flow(*args, **kwargs)
+
+            key = (site, restaurant, call["date"], call["hour"], call["minute"], str(call["party_size"]))
+            result = availability_cache.get(key)
+            if result is not None:
+                logger.info("Availability for %s answered from cache.", key)
+                return result
+
+            def run():
+                result = flow(*args, **kwargs)
+                outcome = classify_availability(result)
+                if outcome is not None:
+                    availability_cache.set(key, result, AVAILABILITY_TTL[outcome])
+                return result
+            # Identical questions asked while this one runs wait for its answer.
+            return availability_flights.do(key, run)
+        return wrapper
+    return decorator
+
+def invalidates_restaurant(site, restaurant_from_url):
+    """
+    Wraps a cancellation flow so a successful cancellation invalidates the
+    restaurant named in its cancel_url.
+    """
+    def decorator(flow):
+        signature = inspect.signature(flow)
+
+        @functools.wraps(flow)
+        def wrapper(*args, **kwargs):
+            result = flow(*args, **kwargs)
+            if result[0]:
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                invalidate_restaurant(site, restaurant_from_url(bound.arguments["cancel_url"]))
+            return result
+        return wrapper
+    return decorator
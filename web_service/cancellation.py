@@ -1,11 +1,18 @@
 import time
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
 from config import logger
-from driver import setup_driver
+from utils import CancellableWait
+from driver import DEFAULT_LAUNCH_PROFILE
+from lifecycle import driver_session, DriverUnavailable
+from pool import driver_pool
+from contexts import context_pool
+from recorder import record_step
+from cookie_jar import jar_identity, capture_session_state
+from cache import invalidates_restaurant, yelp_restaurant_from_url
 
+@invalidates_restaurant("yelp", yelp_restaurant_from_url)
 def cancel_reservation(
     cancel_url: str = "",
     browser_url: str = "",
@@ -14,71 +21,81 @@ def cancel_reservation(
     proxy_username: str = None,
     proxy_password: str = None,
     proxy_scheme: str = "http",
+    launch_profile: str = DEFAULT_LAUNCH_PROFILE,
+    request_allowlist: str = None,
+    use_browser_context: bool = False,
+    record_network: bool = False,
+    use_session_jar: bool = True,
 ):
     overall_start = time.perf_counter()
     logger.info("Starting cancelling process...")
+    pool = context_pool if use_browser_context else driver_pool
     
     try:
-        driver = setup_driver(browser_url, proxy_host, proxy_port, proxy_username, proxy_password, proxy_scheme)
-        logger.info("WebDriver initialized successfully.")
-    except Exception as e:
-        logger.exception("WebDriver initialization failed.")
-        return (False, f"WebDriver error: {e}")
+        with driver_session(pool, browser_url, proxy_host, proxy_port, proxy_username, proxy_password, proxy_scheme,
+                            launch_profile, request_allowlist, flow="cancel_reservation", record_network=record_network,
+                            session_jar=jar_identity(proxy_host, proxy_port, proxy_username, proxy_scheme) if use_session_jar else None) as driver:
+            logger.info("WebDriver initialized successfully.")
+            logger.info("Starting booking process. Navigating to cancelling URL: %s", cancel_url)
+            start = time.perf_counter()
+            try:
+                driver.get(cancel_url)
+            except Exception as e:
+                logger.exception("WebDriver failed to navigate to cancelling URL: %s", cancel_url)
+                return (False, f"WebDriver error: {e}")
 
-    logger.info("Starting booking process. Navigating to cancelling URL: %s", cancel_url)
-    start = time.perf_counter()
-    try:
-        driver.get(cancel_url)
-    except Exception as e:
-        logger.exception("WebDriver failed to navigate to cancelling URL: %s", cancel_url)
+            elapsed = time.perf_counter() - start
+            logger.info("Cancel page loaded in %.4f seconds", elapsed)
+            record_step(driver, "cancel_page")
+
+            try:
+                cancel_button = CancellableWait(driver, 10).until(
+                    EC.element_to_be_clickable((By.XPATH, "//button[@data-button='true' and .//span[normalize-space()='Cancel']]")),
+                )
+                elapsed = time.perf_counter() - start
+                logger.info("Cancel button became visible in %.4f seconds", elapsed)
+                cancel_button.click()
+                logger.info("The cancel button is clicked")
+            except TimeoutException:
+                elapsed = time.perf_counter() - overall_start
+                logger.error("Cancel button did not appear after %.4f seconds", elapsed)
+                return (False, "Cancel button did not appear.")
+            except Exception as e:
+                logger.exception("Unexpected error while waiting for time slot elements: %s", str(e))
+                return (False, f"Unexpected error: {str(e)}")
+
+            try:
+                cancel_reservation_button = CancellableWait(driver, 10).until(
+                    EC.element_to_be_clickable((By.XPATH, "//button[@data-button='true' and .//span[normalize-space()='Cancel reservation']]")),
+                )
+                elapsed = time.perf_counter() - start
+                logger.info("Cancel reservation button became visible in %.4f seconds", elapsed)
+                cancel_reservation_button.click()
+                logger.info("The cancel_reservation button is clicked")
+            except TimeoutException:
+                elapsed = time.perf_counter() - overall_start
+                logger.error("Cancel reservation button did not appear after %.4f seconds", elapsed)
+                return (False, "Cancel reservation button did not appear.")
+            except Exception as e:
+                logger.exception("Unexpected error while waiting for time slot elements: %s", str(e))
+                return (False, f"Unexpected error: {str(e)}")
+
+            try:
+                element = CancellableWait(driver, 10).until(
+                    EC.presence_of_element_located((By.XPATH, "//span[contains(text(), 'Your reservation has been canceled!')]"))
+                )
+                elapsed = time.perf_counter() - start
+                logger.info("Cancel reservation message became visible in %.4f seconds", elapsed)
+                record_step(driver, "cancel_confirmation")
+                capture_session_state(driver)
+                return (True, "The requested reservation is cancelled")
+            except TimeoutException:
+                elapsed = time.perf_counter() - overall_start
+                logger.error("Cancel reservation message did not appear after %.4f seconds", elapsed)
+                return (False, "Cancel reservation message did not appear.")
+            except Exception as e:
+                logger.exception("Unexpected error while waiting for time slot elements: %s", str(e))
+                return (False, f"Unexpected error: {str(e)}")
+    except DriverUnavailable as e:
+        logger.exception("WebDriver initialization failed.")
         return (False, f"WebDriver error: {e}")
-    
-    elapsed = time.perf_counter() - start
-    logger.info("Cancel page loaded in %.4f seconds", elapsed)
-    
-    try:
-        cancel_button = WebDriverWait(driver, 10).until(
-            EC.element_to_be_clickable((By.XPATH, "//button[@data-button='true' and .//span[normalize-space()='Cancel']]")),
-        )
-        elapsed = time.perf_counter() - start
-        logger.info("Cancel button became visible in %.4f seconds", elapsed)
-        cancel_button.click()
-        logger.info("The cancel button is clicked")
-    except TimeoutException:
-        elapsed = time.perf_counter() - overall_start
-        logger.error("Cancel button did not appear after %.4f seconds", elapsed)
-        return (False, "Cancel button did not appear.")
-    except Exception as e:
-        logger.exception("Unexpected error while waiting for time slot elements: %s", str(e))
-        return (False, f"Unexpected error: {str(e)}")
-    
-    try:
-        cancel_reservation_button = WebDriverWait(driver, 10).until(
-            EC.element_to_be_clickable((By.XPATH, "//button[@data-button='true' and .//span[normalize-space()='Cancel reservation']]")),
-        )
-        elapsed = time.perf_counter() - start
-        logger.info("Cancel reservation button became visible in %.4f seconds", elapsed)
-        cancel_reservation_button.click()
-        logger.info("The cancel_reservation button is clicked")
-    except TimeoutException:
-        elapsed = time.perf_counter() - overall_start
-        logger.error("Cancel reservation button did not appear after %.4f seconds", elapsed)
-        return (False, "Cancel reservation button did not appear.")
-    except Exception as e:
-        logger.exception("Unexpected error while waiting for time slot elements: %s", str(e))
-        return (False, f"Unexpected error: {str(e)}")
-    
-    try:
-        element = WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.XPATH, "//span[contains(text(), 'Your reservation has been canceled!')]"))
-        )
-        elapsed = time.perf_counter() - start
-        logger.info("Cancel reservation message became visible in %.4f seconds", elapsed)
-        return (True, "The requested reservation is cancelled")
-    except TimeoutException:
-        elapsed = time.perf_counter() - overall_start
-        logger.error("Cancel reservation message did not appear after %.4f seconds", elapsed)
-        return (False, "Cancel reservation message did not appear.")
-    except Exception as e:
-        logger.exception("Unexpected error while waiting for time slot elements: %s", str(e))
-        return (False, f"Unexpected error: {str(e)}")
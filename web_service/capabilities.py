@@ -0,0 +1,326 @@
+import atexit
+import fcntl
+import json
+import math
+import os
+import random
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date as date_cls, datetime, timedelta
+from config import logger
+
+# Shared by every worker process. Resolved once, so the timer and exit flushes
+# write here whatever the working directory is by then.
+CAPABILITIES_PATH = os.path.abspath(os.environ.get("CAPABILITIES_PATH") or
+                                    os.path.join(os.path.dirname(os.path.abspath(__file__)), "capabilities.json"))
+CAPABILITY_MAX_AGE = 24 * 3600            # older profiles are not used to reject requests
+CAPABILITY_REFRESH_AGE = 6 * 3600         # the background refresher re-learns profiles older than this
+CAPABILITY_REFRESH_INTERVAL = 600         # seconds between background refresh passes
+CAPABILITY_REFRESH_BATCH = 20             # profiles refreshed per pass
+CAPABILITY_FLUSH_DELAY = 5                # seconds learned changes are batched before they are written
+HORIZON_REJECTIONS_REQUIRED = 3           # date rejections past the known horizon before it is trusted
+HORIZON_RECHECK_RATE = 0.05               # share of requests past the horizon let through to re-check it
+
+_profiles = None          # (site, restaurant) -> profile dict, loaded on first use
+_profiles_mtime = None    # mtime of the file when _profiles was read or written
+_dirty = set()            # keys changed in memory and not yet written
+_flush_timer = None
+_profiles_lock = threading.Lock()
+
+@contextmanager
+def _locked(exclusive):
+    with open(CAPABILITIES_PATH + ".lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def _read_file():
+    try:
+        with open(CAPABILITIES_PATH, encoding="utf-8") as f:
+            return {(p["site"], p["restaurant"]): p for p in json.load(f).get("profiles", [])}
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        logger.warning("Ignoring unreadable capability file %s: %s", CAPABILITIES_PATH, e)
+        return {}
+
+def _file_mtime():
+    try:
+        return os.stat(CAPABILITIES_PATH).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+def _merge(profiles, changed):
+    # The newer profile for a restaurant wins.
+    for key, profile in changed.items():
+        current = profiles.get(key)
+        if current is None or current.get("updated", 0) <= profile["updated"]:
+            profiles[key] = profile
+    return profiles
+
+def _load():
+    # Re-read when another process wrote the file; changes not yet written here are kept.
+    global _profiles, _profiles_mtime
+    mtime = _file_mtime()
+    if _profiles is None or mtime != _profiles_mtime:
+        with _locked(exclusive=False):
+            mtime = _file_mtime()
+            on_disk = _read_file()
+        pending = {key: _profiles[key] for key in _dirty} if _profiles is not None else {}
+        _profiles = _merge(on_disk, pending)
+        _profiles_mtime = mtime
+    return _profiles
+
+def _save(changed):
+    # Merge with what other processes wrote.
+    with _locked(exclusive=True):
+        on_disk = _merge(_read_file(), changed)
+        directory = os.path.dirname(CAPABILITIES_PATH)
+        fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"version": 1, "profiles": list(on_disk.values())}, f)
+            os.replace(tmp_path, CAPABILITIES_PATH)
+        except Exception:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        return on_disk, _file_mtime()
+
+def flush():
+    """
+    Writes the profiles learned since the last write. Runs CAPABILITY_FLUSH_DELAY
+    seconds after the first unwritten change, and at exit.
+    """
+    global _profiles, _profiles_mtime, _flush_timer
+    with _profiles_lock:
+        _flush_timer = None
+        if not _dirty:
+            return
+        changed = {key: _profiles[key] for key in _dirty}
+        try:
+            _profiles, _profiles_mtime = _save(changed)
+            _dirty.clear()
+        except Exception as e:
+            logger.warning("Failed to write %d capability profile(s): %s", len(changed), e)
+
+atexit.register(flush)
+
+def _update(site, restaurant, changes):
+    global _flush_timer
+    key = (site, str(restaurant))
+    try:
+        with _profiles_lock:
+            profiles = _load()
+            profile = dict(profiles.get(key) or {"site": site, "restaurant": str(restaurant)})
+            changes(profile)
+            profile["updated"] = time.time()
+            profiles[key] = profile
+            _dirty.add(key)
+            if _flush_timer is None:
+                _flush_timer = threading.Timer(CAPABILITY_FLUSH_DELAY, flush)
+                _flush_timer.daemon = True
+                _flush_timer.start()
+    except Exception as e:
+        logger.warning("Failed to update capabilities of %s restaurant %s: %s", site, restaurant, e)
+
+def get_profile(site, restaurant):
+    """Returns the stored capability profile of a restaurant, or None."""
+    with _profiles_lock:
+        profile = _load().get((site, str(restaurant)))
+    return dict(profile) if profile else None
+
+def _days_ahead(date):
+    return (datetime.strptime(date, "%Y-%m-%d").date() - date_cls.today()).days
+
+def _granularity(times):
+    # Greatest common step, in minutes, between 'HH:MM' times.
+    minutes = sorted({int(t[:2]) * 60 + int(t[3:5]) for t in times})
+    step = 0
+    for earlier, later in zip(minutes, minutes[1:]):
+        step = math.gcd(step, later - earlier)
+    return step or None
+
+def _apply_date(profile, days, allowed):
+    # The horizon (min_rejected_days) is only set once HORIZON_REJECTIONS_REQUIRED
+    # rejections past the furthest allowed date agree; a single odd page does not close it.
+    if allowed:
+        profile["max_allowed_days"] = max(days, profile.get("max_allowed_days", -1))
+        candidate = profile.get("rejected_days_candidate")
+        if candidate is not None and candidate <= days:
+            profile.update(rejected_days_candidate=None, horizon_rejections=0)
+        if profile.get("min_rejected_days") is not None and profile["min_rejected_days"] <= days:
+            profile["min_rejected_days"] = None
+    elif days > profile.get("max_allowed_days", -1):
+        candidate = profile.get("rejected_days_candidate")
+        profile["rejected_days_candidate"] = days if candidate is None else min(candidate, days)
+        profile["horizon_rejections"] = profile.get("horizon_rejections", 0) + 1
+        if profile["horizon_rejections"] >= HORIZON_REJECTIONS_REQUIRED:
+            profile["min_rejected_days"] = profile["rejected_days_candidate"]
+
+def _apply_times(profile, time_options, slot_times):
+    if time_options:
+        profile["time_options"] = sorted(set(time_options))
+    granularity = _granularity(time_options or slot_times or [])
+    if granularity:
+        profile["granularity"] = math.gcd(granularity, profile.get("granularity") or 0)
+
+def learn_date(site, restaurant, date, allowed):
+    """
+    Records whether a date could be booked. The horizon is kept in days
+    ahead: the furthest allowed and the nearest rejected future date, the
+    latter once HORIZON_REJECTIONS_REQUIRED rejections corroborate it.
+    """
+    days = _days_ahead(date)
+    if days >= 0:
+        _update(site, restaurant, lambda profile: _apply_date(profile, days, allowed))
+
+def learn_party_sizes(site, restaurant, party_sizes):
+    """Records the full list of party sizes a restaurant's picker offers."""
+    sizes = sorted({int(size) for size in party_sizes})
+    if sizes:
+        _update(site, restaurant, lambda profile: profile.update(party_sizes=sizes, rejected_party_sizes=[]))
+
+def learn_party_size(site, restaurant, party_size, allowed):
+    """Records one party size outcome when the full list is not known."""
+    size = int(party_size)
+
+    def changes(profile):
+        rejected = set(profile.get("rejected_party_sizes", []))
+        if allowed:
+            rejected.discard(size)
+        else:
+            rejected.add(size)
+        profile["rejected_party_sizes"] = sorted(rejected)
+    _update(site, restaurant, changes)
+
+def learn_times(site, restaurant, time_options=None, slot_times=None):
+    """
+    Records the time picker options ('HH:MM') and the slot granularity, from
+    the options themselves or from slot times seen on a results page.
+    """
+    _update(site, restaurant, lambda profile: _apply_times(profile, time_options, slot_times))
+
+def learn_from_yelp_page(restaurant_id, date, page):
+    """Records what a parsed Yelp reservations page shows about the restaurant."""
+    date_obj = datetime.strptime(date, "%Y-%m-%d")
+    days = _days_ahead(date)
+    allowed = (date_obj.strftime("%b ") + str(date_obj.day)) in page.date_value
+    sizes = sorted({int(option.split()[0]) for option in page.party_options if option.split() and option.split()[0].isdigit()})
+    slot_times = []
+    for time_text, _ in page.slots:
+        try:
+            slot_times.append(datetime.strptime(time_text, "%I:%M %p").strftime("%H:%M"))
+        except ValueError:
+            continue
+
+    def changes(profile):
+        if days >= 0:
+            _apply_date(profile, days, allowed)
+        if sizes:
+            profile.update(party_sizes=sizes, rejected_party_sizes=[])
+        _apply_times(profile, None, slot_times)
+    _update("yelp", restaurant_id, changes)
+
+def _fresh(profile):
+    return profile is not None and time.time() - profile.get("updated", 0) <= CAPABILITY_MAX_AGE
+
+def profile_stale(site, restaurant):
+    """Returns True if a restaurant has no profile or it is due for a refresh."""
+    profile = get_profile(site, restaurant)
+    return profile is None or time.time() - profile.get("updated", 0) > CAPABILITY_REFRESH_AGE
+
+def precheck(site, restaurant, date, party_size):
+    """
+    Returns the flow's rejection 4-tuple if a fresh profile shows the request
+    cannot succeed (date past the booking horizon, party size not offered),
+    or None when the flow has to run. HORIZON_RECHECK_RATE of the requests
+    past the horizon run anyway, so a horizon that moved out is noticed.
+    """
+    profile = get_profile(site, restaurant)
+    if not _fresh(profile):
+        return None
+    try:
+        size = int(party_size)
+    except (TypeError, ValueError):
+        return None
+    sizes = profile.get("party_sizes")
+    if (sizes and size not in sizes) or size in profile.get("rejected_party_sizes", []):
+        logger.info("Party size %s rejected from the %s capability profile of %s.", party_size, site, restaurant)
+        if site == "yelp":
+            return (False, None, None, "Party size is not in allowed range." if size < 1 else "The party size is bigger than maximum.")
+        return (False, None, None, f"Error selecting party size: party size {party_size} is not offered.")
+    min_rejected = profile.get("min_rejected_days")
+    if min_rejected is not None and _days_ahead(date) >= min_rejected:
+        if random.random() < HORIZON_RECHECK_RATE:
+            logger.info("Date %s is past the %s booking horizon of %s; running the flow to re-check it.", date, site, restaurant)
+            return None
+        logger.info("Date %s rejected from the %s capability profile of %s.", date, site, restaurant)
+        date_obj = datetime.strptime(date, "%Y-%m-%d")
+        return (False, None, None, f"Reservation date {date_obj.strftime('%b ') + str(date_obj.day)} is not in allowed range.")
+    return None
+
+def nearest_time_option(site, restaurant, requested_time):
+    """
+    Returns the known time picker option nearest to requested_time ('HH:MM'),
+    or None if the profile has no options, so the flow can skip reading them.
+    """
+    profile = get_profile(site, restaurant)
+    if not _fresh(profile) or not profile.get("time_options"):
+        return None
+    requested = int(requested_time[:2]) * 60 + int(requested_time[3:5])
+    return min(profile["time_options"], key=lambda option: abs(int(option[:2]) * 60 + int(option[3:5]) - requested))
+
+def refresh_stale_profiles(proxy_host=None, proxy_port=None, proxy_username=None, proxy_password=None, proxy_scheme="http"):
+    """
+    Re-learns Yelp profiles older than CAPABILITY_REFRESH_AGE over plain HTTP.
+    OpenTable profiles are refreshed by the flows themselves.
+    """
+    # Imported here: yelp_http reports what it sees back to this module.
+    from http_client import get_http_session
+    from yelp_http import fetch_reservation_page
+
+    with _profiles_lock:
+        stale = [p for p in _load().values()
+                 if p["site"] == "yelp" and time.time() - p.get("updated", 0) > CAPABILITY_REFRESH_AGE]
+    session = get_http_session(proxy_host, proxy_port, proxy_username, proxy_password, proxy_scheme)
+    for profile in sorted(stale, key=lambda p: p.get("updated", 0))[:CAPABILITY_REFRESH_BATCH]:
+        probe_days = [1]
+        if profile.get("min_rejected_days") is not None:
+            probe_days.append(profile["min_rejected_days"])
+        for days in probe_days:
+            probe_date = (date_cls.today() + timedelta(days=days)).strftime("%Y-%m-%d")
+            try:
+                fetch_reservation_page(session, profile["restaurant"], probe_date, 19, 0, "2")
+            except Exception as e:
+                logger.info("Capability refresh of %s failed: %s", profile["restaurant"], e)
+                break
+
+_refresher = None
+
+def start_background_refresh(interval=CAPABILITY_REFRESH_INTERVAL, **proxy):
+    """
+    Starts a daemon thread that refreshes stale profiles every interval
+    seconds, through the proxy given as refresh_stale_profiles' arguments.
+    """
+    global _refresher
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                refresh_stale_profiles(**proxy)
+            except Exception as e:
+                logger.error("Capability refresh pass failed: %s", e, exc_info=True)
+
+    with _profiles_lock:
+        if _refresher is None:
+            _refresher = threading.Thread(target=run, name="capability-refresh", daemon=True)
+            _refresher.start()
+    return _refresher
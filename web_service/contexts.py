@@ -0,0 +1,189 @@
+import atexit
+import threading
+import time
+from selenium import webdriver
+from config import logger
+from driver import DEFAULT_LAUNCH_PROFILE, setup_driver, quit_driver, configure_request_blocking
+from procs import driver_service_pid, register_owned_pid
+
+MAX_CONTEXTS_PER_BROWSER = 8   # concurrent flows sharing one Chrome process
+CONTEXT_CHECKOUT_TIMEOUT = 60  # seconds a checkout waits for a free context slot
+
+class SharedBrowser:
+    """
+    One local Chrome process hosting many isolated CDP browser contexts.
+    Each context gets its own chromedriver session attached to the browser
+    through its debugger address, so flows in different contexts can run
+    side by side without sharing a current window.
+    """
+
+    def __init__(self, launch_profile=DEFAULT_LAUNCH_PROFILE, max_contexts=MAX_CONTEXTS_PER_BROWSER):
+        self.launch_profile = launch_profile
+        self.max_contexts = max_contexts
+        self.host_driver = setup_driver(launch_profile=launch_profile)
+        self.debugger_address = self.host_driver.capabilities["goog:chromeOptions"]["debuggerAddress"]
+        self.open_contexts = 0
+        logger.info("Shared browser started at %s (profile '%s').", self.debugger_address, launch_profile)
+
+    def open_context(self, proxy_server=None):
+        """
+        Creates a new browser context (own cookies, storage and cache, and
+        optionally its own unauthenticated proxy) and returns a driver whose
+        current window is a page in that context.
+        """
+        start = time.perf_counter()
+        options = webdriver.ChromeOptions()
+        options.debugger_address = self.debugger_address
+        options.page_load_strategy = "eager"
+        driver = webdriver.Chrome(options=options)
+        register_owned_pid(driver_service_pid(driver))
+        try:
+            params = {"disposeOnDetach": False}
+            if proxy_server:
+                params["proxyServer"] = proxy_server
+            context_id = driver.execute_cdp_cmd("Target.createBrowserContext", params)["browserContextId"]
+            driver.browser_context_id = context_id
+            target_id = driver.execute_cdp_cmd(
+                "Target.createTarget", {"url": "about:blank", "browserContextId": context_id}
+            )["targetId"]
+            driver.switch_to.window(target_id)
+            configure_request_blocking(driver)
+            driver.set_page_load_timeout(20)
+        except Exception:
+            self.close_context(driver)
+            raise
+        driver.shared_browser = self
+        logger.info("Opened browser context %s in %.4f seconds", context_id, time.perf_counter() - start)
+        return driver
+
+    def close_context(self, driver):
+        """
+        Disposes a context (closing its pages and dropping its state) and
+        detaches its chromedriver session. The shared browser keeps running.
+        """
+        context_id = getattr(driver, "browser_context_id", None)
+        if context_id:
+            try:
+                driver.execute_cdp_cmd("Target.disposeBrowserContext", {"browserContextId": context_id})
+            except Exception as e:
+                logger.warning("Failed to dispose browser context %s: %s", context_id, e)
+        quit_driver(driver)
+
+    def is_alive(self):
+        try:
+            self.host_driver.execute_script("return 1;")
+            return True
+        except Exception:
+            return False
+
+    def close(self):
+        quit_driver(self.host_driver)
+
+class ContextPool:
+    """
+    Hands out browser contexts across a small set of shared Chrome processes,
+    starting another process once every running one has max_contexts flows.
+    Checkout and checkin mirror DriverPool so flows can use either.
+    """
+
+    def __init__(self, max_contexts=MAX_CONTEXTS_PER_BROWSER, max_browsers=4, checkout_timeout=CONTEXT_CHECKOUT_TIMEOUT):
+        self.max_contexts = max_contexts
+        self.max_browsers = max_browsers
+        self.checkout_timeout = checkout_timeout
+        self._cond = threading.Condition()
+        self._browsers = {}   # launch_profile -> [SharedBrowser]
+        self._launching = {}  # launch_profile -> browsers being started
+
+    def _reserve(self, launch_profile):
+        deadline = time.monotonic() + self.checkout_timeout
+        with self._cond:
+            while True:
+                browsers = self._browsers.setdefault(launch_profile, [])
+                for browser in list(browsers):
+                    if not browser.is_alive():
+                        logger.warning("Dropping dead shared browser at %s", browser.debugger_address)
+                        browsers.remove(browser)
+                for browser in browsers:
+                    if browser.open_contexts < browser.max_contexts:
+                        browser.open_contexts += 1
+                        return browser
+                launching = self._launching.get(launch_profile, 0)
+                if len(browsers) + launching < self.max_browsers:
+                    self._launching[launch_profile] = launching + 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"No browser context available within {self.checkout_timeout} seconds.")
+                self._cond.wait(remaining)
+
+        try:
+            browser = SharedBrowser(launch_profile, self.max_contexts)
+        except Exception:
+            with self._cond:
+                self._launching[launch_profile] -= 1
+                self._cond.notify_all()
+            raise
+        with self._cond:
+            self._launching[launch_profile] -= 1
+            browser.open_contexts += 1
+            self._browsers[launch_profile].append(browser)
+            self._cond.notify_all()
+        return browser
+
+    def _release(self, browser):
+        with self._cond:
+            browser.open_contexts -= 1
+            self._cond.notify_all()
+
+    def checkout(self,
+                 browser_url="",
+                 proxy_host=None,
+                 proxy_port=None,
+                 proxy_username=None,
+                 proxy_password=None,
+                 proxy_scheme="http",
+                 launch_profile=DEFAULT_LAUNCH_PROFILE,
+                 request_allowlist=None):
+        """
+        Returns a driver bound to a fresh browser context.
+        Contexts only support local browsers and unauthenticated proxies:
+        the proxy-auth and allowlist extension does not run in CDP-created
+        contexts, so authenticated proxies need DriverPool instead.
+        """
+        if browser_url:
+            raise ValueError("Browser contexts require a local Chrome; use the driver pool for remote WebDriver.")
+        if proxy_username or proxy_password:
+            raise ValueError("Browser contexts cannot authenticate to a proxy; use the driver pool for authenticated proxies.")
+        if request_allowlist:
+            logger.info("Request allowlist '%s' is not applied inside browser contexts; using the CDP block list only.", request_allowlist)
+
+        proxy_server = f"{proxy_scheme}://{proxy_host}:{proxy_port}" if proxy_host and proxy_port else None
+        browser = self._reserve(launch_profile)
+        try:
+            return browser.open_context(proxy_server)
+        except Exception:
+            self._release(browser)
+            raise
+
+    def checkin(self, driver, discard=False):
+        """
+        Disposes the driver's context. Contexts are never reused, so there is
+        nothing to reset and discard makes no difference.
+        """
+        browser = getattr(driver, "shared_browser", None)
+        if browser is None:
+            logger.warning("Checked in a driver without a browser context; quitting it.")
+            quit_driver(driver)
+            return
+        browser.close_context(driver)
+        self._release(browser)
+
+    def close(self):
+        with self._cond:
+            browsers = [browser for group in self._browsers.values() for browser in group]
+            self._browsers.clear()
+        for browser in browsers:
+            browser.close()
+
+context_pool = ContextPool()
+atexit.register(context_pool.close)
@@ -0,0 +1,170 @@
+import fcntl
+import hashlib
+import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from config import logger
+
+JAR_DIR = os.path.join(tempfile.gettempdir(), "session_jars")
+JAR_MAX_AGE = 7 * 24 * 3600          # a jar not saved for this long is ignored
+SESSION_COOKIE_MAX_AGE = 12 * 3600   # cookies without an expiry are kept this long after capture
+LOCAL_STORAGE_MAX_BYTES = 256 * 1024 # per origin; larger snapshots are not stored
+
+# Restores saved localStorage items for the page's origin before any page script runs.
+RESTORE_STORAGE_SCRIPT = """
+(function (snapshots) {
+    var items = snapshots[location.origin];
+    if (!items) { return; }
+    try {
+        for (var key in items) {
+            if (window.localStorage.getItem(key) === null) { window.localStorage.setItem(key, items[key]); }
+        }
+    } catch (e) {}
+})(%s);
+"""
+
+def jar_identity(proxy_host=None, proxy_port=None, proxy_username=None, proxy_scheme="http"):
+    """
+    Returns the jar key for a proxy identity. The password is left out so a
+    rotated password keeps the jar; the username carries sticky session ids.
+    """
+    if not proxy_host:
+        return "direct"
+    raw = f"{proxy_scheme}://{proxy_username or ''}@{proxy_host}:{proxy_port}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+def _jar_path(identity):
+    return os.path.join(JAR_DIR, f"{identity}.json")
+
+@contextmanager
+def _locked(identity, exclusive):
+    os.makedirs(JAR_DIR, mode=0o700, exist_ok=True)
+    with open(os.path.join(JAR_DIR, f"{identity}.lock"), "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def _read(identity):
+    try:
+        with open(_jar_path(identity), encoding="utf-8") as f:
+            jar = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning("Ignoring unreadable session jar %s: %s", identity, e)
+        return None
+    if time.time() - jar.get("saved", 0) > JAR_MAX_AGE:
+        return None
+    return jar
+
+def _live_cookies(cookies, now):
+    live = []
+    for cookie in cookies:
+        expires = cookie.get("expires", -1)
+        if expires is None or expires <= 0:
+            if now - cookie.get("captured", now) > SESSION_COOKIE_MAX_AGE:
+                continue
+        elif expires <= now:
+            continue
+        live.append(cookie)
+    return live
+
+def load_jar(identity):
+    """
+    Returns (cookies, local_storage) stored for an identity with expired
+    cookies dropped, or ([], {}) if there is no usable jar.
+    """
+    with _locked(identity, exclusive=False):
+        jar = _read(identity)
+    if not jar:
+        return [], {}
+    return _live_cookies(jar.get("cookies", []), time.time()), jar.get("local_storage", {})
+
+def save_jar(identity, cookies, local_storage):
+    """
+    Merges cookies and localStorage snapshots into an identity's jar. Newer
+    values win; the file is replaced atomically under an exclusive lock.
+    """
+    now = time.time()
+    with _locked(identity, exclusive=True):
+        jar = _read(identity) or {}
+        merged = {(c["name"], c.get("domain"), c.get("path")): c for c in jar.get("cookies", [])}
+        for cookie in cookies:
+            cookie = dict(cookie, captured=now)
+            merged[(cookie["name"], cookie.get("domain"), cookie.get("path"))] = cookie
+        storage = dict(jar.get("local_storage", {}))
+        storage.update(local_storage)
+        data = {"version": 1, "saved": now, "cookies": _live_cookies(list(merged.values()), now), "local_storage": storage}
+
+        fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=JAR_DIR)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, _jar_path(identity))
+        except Exception:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+def _to_cookie_param(cookie):
+    # Network.getAllCookies returns fields Network.setCookies does not accept.
+    param = {key: cookie[key] for key in ("name", "value", "domain", "path", "secure", "httpOnly", "sameSite") if key in cookie}
+    if cookie.get("expires", -1) and cookie.get("expires", -1) > 0:
+        param["expires"] = cookie["expires"]
+    domain = param.get("domain", "")
+    if domain and not domain.startswith("."):
+        # Host-only cookie: setting it by URL keeps it host-only.
+        del param["domain"]
+        param["url"] = f"{'https' if param.get('secure') else 'http'}://{domain}{param.get('path', '/')}"
+    return param
+
+def restore_session_state(driver, identity):
+    """
+    Installs an identity's saved cookies and localStorage into a session
+    before its first navigation. Returns the number of cookies restored.
+    """
+    start = time.perf_counter()
+    cookies, local_storage = load_jar(identity)
+    if cookies:
+        driver.execute_cdp_cmd("Network.setCookies", {"cookies": [_to_cookie_param(c) for c in cookies]})
+    if local_storage:
+        result = driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument",
+                                        {"source": RESTORE_STORAGE_SCRIPT % json.dumps(local_storage)})
+        driver.restore_script_id = result.get("identifier")
+    if cookies or local_storage:
+        logger.info("Restored %d cookie(s) and %d localStorage origin(s) from session jar in %.4f seconds",
+                    len(cookies), len(local_storage), time.perf_counter() - start)
+    return len(cookies)
+
+def capture_session_state(driver):
+    """
+    Saves the session's cookies and the current origin's localStorage to the
+    jar the session was opened with. Call it once a flow has succeeded, so a
+    challenged or broken session never overwrites a good jar.
+    """
+    identity = getattr(driver, "session_jar", None)
+    if not identity:
+        return
+    start = time.perf_counter()
+    try:
+        cookies = driver.execute_cdp_cmd("Network.getAllCookies", {}).get("cookies", [])
+        local_storage = {}
+        origin, items = driver.execute_script(
+            "try { return [location.origin, Object.assign({}, window.localStorage)]; } catch (e) { return [location.origin, {}]; }"
+        )
+        if origin and origin.startswith("http") and items:
+            if len(json.dumps(items)) <= LOCAL_STORAGE_MAX_BYTES:
+                local_storage[origin] = items
+            else:
+                logger.info("localStorage for %s is too large for the session jar; skipping it.", origin)
+        save_jar(identity, cookies, local_storage)
+    except Exception as e:
+        logger.warning("Failed to capture session state: %s", e)
+        return
+    logger.info("Captured %d cookie(s) to session jar in %.4f seconds", len(cookies), time.perf_counter() - start)
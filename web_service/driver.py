@@ -1,123 +1,402 @@
+import hashlib
+import json
 import logging
+import os
 import tempfile
+import threading
 import zipfile
 import time
+from urllib.parse import urlsplit
 from selenium import webdriver
 from selenium.common.exceptions import WebDriverException
 from config import logger
+from procs import driver_service_pid, tree_rss, register_owned_pid, unregister_owned_pid, browser_owner_argument
+from grid import is_grid_url, get_router
+from network import allowed_hosts_for, drain_network_events, enable_performance_log
+from profiles import get_profile_template, clone_profile, remove_profile, EXTENSION_DIR_NAME
 
-def create_proxy_auth_extension(proxy_host, proxy_port, proxy_username, proxy_password, scheme='http'):
+EXTENSION_CACHE_DIR = os.path.join(tempfile.gettempdir(), "proxy_auth_extensions")
+EXTENSION_CACHE_MAX_BYTES = 50 * 1024 * 1024   # total size of cached extension zips
+EXTENSION_CACHE_MAX_AGE = 7 * 24 * 3600        # seconds since last use before a zip is removed
+EXTENSION_CACHE_GC_INTERVAL = 600              # seconds between garbage collection passes
+
+RESET_ORIGINS = ["https://www.yelp.com", "https://www.opentable.com"]
+RESET_STORAGE_TYPES = "local_storage,session_storage,indexeddb,websql,service_workers,cache_storage"
+
+RECYCLE_AFTER_USES = 25                        # flows served before a session is replaced
+RECYCLE_JS_HEAP_BYTES = 256 * 1024 * 1024      # JSHeapUsedSize from Performance.getMetrics
+RECYCLE_RENDERER_RSS_BYTES = 768 * 1024 * 1024 # summed renderer RSS, local drivers only
+
+USE_PROFILE_TEMPLATE = True   # local drivers start from a cloned, pre-warmed user-data-dir
+
+DEFAULT_LAUNCH_PROFILE = "default"
+LAUNCH_PROFILES = {
+    # Windowed Chrome, as the flows have always run.
+    "default": [
+        "--no-sandbox",
+        "--window-size=1920,1080",
+    ],
+    # New headless mode with background services turned off.
+    "lean": [
+        "--no-sandbox",
+        "--headless=new",
+        "--window-size=1920,1080",
+        "--no-first-run",
+        "--no-default-browser-check",
+        "--disable-background-networking",
+        "--disable-component-update",
+        "--disable-sync",
+        "--disable-default-apps",
+        "--disable-features=Translate,OptimizationHints,MediaRouter,InterestFeedContentSuggestions",
+        "--disable-gpu",
+        "--disable-extensions",
+        "--disable-notifications",
+        "--disable-popup-blocking",
+        "--mute-audio",
+    ],
+}
+
+_extension_cache_lock = threading.Lock()
+_extension_cache_last_gc = 0.0
+
+def extension_cache_key(scheme, proxy_host, proxy_port, proxy_username, extension_files):
     """
-    Creates a Chrome extension (as a .zip file) to handle proxy authentication.
-    Returns the file path to the generated extension.
+    Hash identifying a proxy extension artifact. The rendered extension files are
+    hashed along with (scheme, host, port, username) so a changed password or
+    script produces a new artifact instead of reusing a stale one.
+    """
+    digest = hashlib.sha256()
+    for part in (scheme, proxy_host, proxy_port, proxy_username):
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\0")
+    for name in sorted(extension_files):
+        digest.update(name.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(extension_files[name].encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+def collect_extension_cache(max_bytes=EXTENSION_CACHE_MAX_BYTES, max_age=EXTENSION_CACHE_MAX_AGE):
+    """
+    Removes cached extension zips unused for longer than max_age, then the least
+    recently used ones until the cache fits in max_bytes.
     """
     try:
-        logger.info("Starting proxy authentication extension creation.")
+        entries = []
+        for name in os.listdir(EXTENSION_CACHE_DIR):
+            path = os.path.join(EXTENSION_CACHE_DIR, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+    except FileNotFoundError:
+        return 0
+
+    now = time.time()
+    removed = 0
+    kept = []
+    for mtime, size, path in sorted(entries):
+        if now - mtime > max_age:
+            removed += _remove_cached_extension(path)
+        else:
+            kept.append((mtime, size, path))
+
+    total = sum(size for _, size, _ in kept)
+    for mtime, size, path in kept:
+        if total <= max_bytes:
+            break
+        removed += _remove_cached_extension(path)
+        total -= size
 
-        manifest_json = """
-        {
-            "version": "1.0.0",
-            "manifest_version": 2,
-            "name": "Chrome Proxy",
-            "permissions": [
-                "proxy",
-                "tabs",
-                "unlimitedStorage",
-                "storage",
-                "<all_urls>",
-                "webRequest",
-                "webRequestBlocking"
-            ],
-            "background": {
-                "scripts": ["background.js"]
-            }
+    if removed:
+        logger.info("Removed %d cached proxy extension(s) from %s", removed, EXTENSION_CACHE_DIR)
+    return removed
+
+def _remove_cached_extension(path):
+    try:
+        os.remove(path)
+        return 1
+    except FileNotFoundError:
+        return 0
+    except OSError as e:
+        logger.warning("Could not remove cached proxy extension %s: %s", path, e)
+        return 0
+
+def _maybe_collect_extension_cache():
+    global _extension_cache_last_gc
+    with _extension_cache_lock:
+        now = time.monotonic()
+        if _extension_cache_last_gc and now - _extension_cache_last_gc < EXTENSION_CACHE_GC_INTERVAL:
+            return
+        _extension_cache_last_gc = now
+    collect_extension_cache()
+
+def render_proxy_auth_extension(proxy_host, proxy_port, proxy_username, proxy_password, scheme='http', allowed_hosts=None):
+    """
+    Renders the files of the proxy authentication extension.
+    With allowed_hosts it also fails every request to a host outside the list
+    (allowlist mode); without proxy_host it only does the filtering.
+    Returns a dict of file name -> content.
+    """
+    manifest_json = """
+    {
+        "version": "1.0.0",
+        "manifest_version": 2,
+        "name": "Chrome Proxy",
+        "permissions": [
+            "proxy",
+            "tabs",
+            "unlimitedStorage",
+            "storage",
+            "<all_urls>",
+            "webRequest",
+            "webRequestBlocking"
+        ],
+        "background": {
+            "scripts": ["background.js"]
         }
-        """
-        background_js = f"""
-        var config = {{
-            mode: "fixed_servers",
-            rules: {{
-              singleProxy: {{
-                scheme: "{scheme}",
-                host: "{proxy_host}",
-                port: parseInt({proxy_port})
-              }},
-              bypassList: ["localhost"]
+    }
+    """
+    background_js = ""
+    if proxy_host:
+        background_js += f"""
+    var config = {{
+        mode: "fixed_servers",
+        rules: {{
+          singleProxy: {{
+            scheme: "{scheme}",
+            host: "{proxy_host}",
+            port: parseInt({proxy_port})
+          }},
+          bypassList: ["localhost"]
+        }}
+      }};
+
+    chrome.proxy.settings.set({{value: config, scope: "regular"}}, function() {{}});
+
+    function callbackFn(details) {{
+        return {{
+            authCredentials: {{
+                username: "{proxy_username}",
+                password: "{proxy_password}"
             }}
-          }};
+        }};
+    }}
 
-        chrome.proxy.settings.set({{value: config, scope: "regular"}}, function() {{}});
+    chrome.webRequest.onAuthRequired.addListener(
+        callbackFn,
+        {{urls: ["<all_urls>"]}},
+        ["blocking"]
+    );
+    """
+    if allowed_hosts:
+        background_js += f"""
+    var allowedHosts = {json.dumps(sorted(allowed_hosts))};
 
-        function callbackFn(details) {{
-            return {{
-                authCredentials: {{
-                    username: "{proxy_username}",
-                    password: "{proxy_password}"
-                }}
-            }};
+    function isAllowed(url) {{
+        if (!/^(https?|wss?):/.test(url)) {{
+            return true;
         }}
+        var host = new URL(url).hostname;
+        return allowedHosts.some(function(allowed) {{
+            return host === allowed || host.endsWith("." + allowed);
+        }});
+    }}
+
+    chrome.webRequest.onBeforeRequest.addListener(
+        function(details) {{ return {{cancel: !isAllowed(details.url)}}; }},
+        {{urls: ["<all_urls>"]}},
+        ["blocking"]
+    );
+    """
+
+    return {
+        "manifest.json": manifest_json.strip(),
+        "background.js": background_js.strip(),
+    }
+
+def create_proxy_auth_extension(proxy_host, proxy_port, proxy_username, proxy_password, scheme='http', allowed_hosts=None):
+    """
+    Creates a Chrome extension (as a .zip file) to handle proxy authentication
+    and, with allowed_hosts, allowlist request filtering.
+    Returns the file path to the generated extension.
+    The zip is cached in EXTENSION_CACHE_DIR under a hash of its content, so
+    identical proxy settings reuse the same file instead of writing a new one.
+    """
+    try:
+        extension_files = render_proxy_auth_extension(proxy_host, proxy_port, proxy_username, proxy_password, scheme=scheme, allowed_hosts=allowed_hosts)
+        cache_key = extension_cache_key(scheme, proxy_host, proxy_port, proxy_username, extension_files)
+        plugin_path = os.path.join(EXTENSION_CACHE_DIR, f"proxy_auth_{cache_key}.zip")
 
-        chrome.webRequest.onAuthRequired.addListener(
-            callbackFn,
-            {{urls: ["<all_urls>"]}},
-            ["blocking"]
-        );
-        """
+        if os.path.exists(plugin_path):
+            try:
+                os.utime(plugin_path)
+                logger.info("Reusing cached proxy authentication extension at: %s", plugin_path)
+                return plugin_path
+            except FileNotFoundError:
+                pass  # collected between the check and the touch; rebuild it below
 
-        plugin_file = tempfile.NamedTemporaryFile(suffix='.zip', delete=False)
-        with zipfile.ZipFile(plugin_file, 'w') as zp:
-            zp.writestr("manifest.json", manifest_json.strip())
-            zp.writestr("background.js", background_js.strip())
-        plugin_file.close()
+        logger.info("Starting proxy authentication extension creation.")
+        os.makedirs(EXTENSION_CACHE_DIR, mode=0o700, exist_ok=True)
+        plugin_file = tempfile.NamedTemporaryFile(suffix='.zip.tmp', dir=EXTENSION_CACHE_DIR, delete=False)
+        try:
+            with zipfile.ZipFile(plugin_file, 'w') as zp:
+                for name, content in extension_files.items():
+                    zp.writestr(name, content)
+            plugin_file.close()
+            os.replace(plugin_file.name, plugin_path)
+        except Exception:
+            plugin_file.close()
+            _remove_cached_extension(plugin_file.name)
+            raise
 
-        logger.info("Successfully created proxy authentication extension at: %s", plugin_file.name)
-        return plugin_file.name
+        logger.info("Successfully created proxy authentication extension at: %s", plugin_path)
+        _maybe_collect_extension_cache()
+        return plugin_path
 
     except Exception as e:
         logger.critical("Failed to create proxy authentication extension: %s", e, exc_info=True)
         return None
 
+def configure_request_blocking(driver):
+    """
+    Applies the CDP block list (maps, images, fonts, stylesheets, trackers)
+    to the driver's current target.
+    """
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd(
+            "Network.setBlockedURLs",
+            {"urls": [
+                "*googleapis.com/maps*",
+                "*googleapis.com/vt?*",
+                "*maps.gstatic.com*",
+                "*.jpg", "*.jpeg", "*.png", "*.gif",
+                "*.css", "*.woff", "*.woff2", "*.ttf",
+                "*google-analytics.com*", "*adservice.google.com*",
+                "*doubleclick.net*", "*facebook.net*"
+            ]}
+        )
+        logger.info("CDP block list configured successfully.")
+    except Exception as e:
+        logger.warning("Error setting CDP block list: %s", e, exc_info=True)
+
+def start_grid_session(browser_url, options):
+    """
+    Starts a remote session on the least-loaded healthy endpoint of a grid,
+    moving on to the next endpoint if session creation fails.
+    """
+    router = get_router(browser_url)
+    tried = set()
+    while True:
+        try:
+            endpoint = router.acquire(exclude=tried)
+        except RuntimeError as e:
+            raise WebDriverException(str(e))
+        logger.info("Initializing remote WebDriver on grid endpoint: %s", endpoint.url)
+        start = time.perf_counter()
+        try:
+            driver = webdriver.Remote(command_executor=endpoint.url, options=options)
+        except WebDriverException as e:
+            router.release(endpoint)
+            router.record_failure(endpoint, f"session start: {e}")
+            tried.add(endpoint.url)
+            continue
+        router.record_success(endpoint, time.perf_counter() - start)
+        driver.grid_endpoint = (router, endpoint)
+        return driver
+
 def setup_driver(browser_url="",
                  proxy_host=None,
                  proxy_port=None,
                  proxy_username=None,
                  proxy_password=None,
-                 proxy_scheme="http"):
+                 proxy_scheme="http",
+                 launch_profile=DEFAULT_LAUNCH_PROFILE,
+                 use_profile_template=USE_PROFILE_TEMPLATE,
+                 request_allowlist=None):
     """
     Initialize a Chrome webdriver with options optimized for speed.
     If proxy settings are provided, the proxy is configured.
+    launch_profile selects the Chrome flags from LAUNCH_PROFILES.
+    Local drivers start from a clone of a warmed profile template (prefs applied)
+    unless use_profile_template is False; the proxy extension is written into
+    the clone, never into the shared template.
+    request_allowlist names an entry of network.REQUEST_ALLOWLISTS; when set,
+    requests to any other host are failed by the extension.
+    browser_url may also name a grid (see grid.get_router), in which case the
+    session goes to the least-loaded healthy endpoint.
     """
-    logger.info("Starting driver setup.")
+    logger.info("Starting driver setup with launch profile '%s'.", launch_profile)
 
-    options = webdriver.ChromeOptions()
-    options.add_argument("--no-sandbox")
-    options.add_argument("--window-size=1920,1080")
-    options.page_load_strategy = "eager"
+    if launch_profile not in LAUNCH_PROFILES:
+        raise ValueError(f"Unknown launch profile '{launch_profile}'. Expected one of {sorted(LAUNCH_PROFILES)}.")
+    needs_proxy_auth = bool(proxy_host and proxy_port and proxy_username and proxy_password)
+    allowed_hosts = allowed_hosts_for(request_allowlist) if request_allowlist else None
+    needs_extension = needs_proxy_auth or bool(allowed_hosts)
+    if needs_proxy_auth:
+        extension_proxy = (proxy_host, proxy_port, proxy_username, proxy_password)
+    else:
+        extension_proxy = (None, None, None, None)
 
+    launch_arguments = [
+        argument for argument in LAUNCH_PROFILES[launch_profile]
+        # the proxy authentication / request filtering extension has to load
+        if not (needs_extension and argument == "--disable-extensions")
+    ]
     prefs = {
         "profile.managed_default_content_settings.images": 2,
         "profile.managed_default_content_settings.stylesheets": 2,
         "profile.managed_default_content_settings.fonts": 2,
         "profile.managed_default_content_settings.plugins": 2,
     }
+
+    profile_dir = None
+    if use_profile_template and not browser_url:
+        try:
+            extension_files = None
+            if needs_extension:
+                extension_files = render_proxy_auth_extension(*extension_proxy, scheme=proxy_scheme, allowed_hosts=allowed_hosts)
+            profile_dir = clone_profile(get_profile_template(launch_arguments, prefs), extension_files)
+        except Exception as e:
+            logger.warning("Profile template unavailable, starting with a fresh profile: %s", e, exc_info=True)
+
+    options = webdriver.ChromeOptions()
+    for argument in launch_arguments:
+        options.add_argument(argument)
+    options.page_load_strategy = "eager"
     options.add_experimental_option("prefs", prefs)
+    enable_performance_log(options)
+    if profile_dir:
+        options.add_argument(f"--user-data-dir={profile_dir}")
+    if not browser_url:
+        options.add_argument(browser_owner_argument())
 
-    # Configure proxy if details are provided
-    if proxy_host and proxy_port:
+    if needs_extension:
         try:
-            if proxy_username and proxy_password:
-                proxy_extension = create_proxy_auth_extension(proxy_host, proxy_port, proxy_username, proxy_password, scheme=proxy_scheme)
-                options.add_extension(proxy_extension)
-                logger.info("Using proxy authentication extension for %s:%s", proxy_host, proxy_port)
+            if profile_dir:
+                options.add_argument(f"--load-extension={os.path.join(profile_dir, EXTENSION_DIR_NAME)}")
             else:
-                options.add_argument(f"--proxy-server={proxy_scheme}://{proxy_host}:{proxy_port}")
-                logger.info("Configured proxy: %s:%s using scheme %s", proxy_host, proxy_port, proxy_scheme)
+                extension = create_proxy_auth_extension(*extension_proxy, scheme=proxy_scheme, allowed_hosts=allowed_hosts)
+                options.add_extension(extension)
+            if needs_proxy_auth:
+                logger.info("Using proxy authentication extension for %s:%s", proxy_host, proxy_port)
+            if allowed_hosts:
+                logger.info("Request allowlist '%s' active: %s", request_allowlist, ", ".join(allowed_hosts))
         except Exception as e:
-            logger.critical("Failed to configure proxy: %s", e, exc_info=True)
+            logger.critical("Failed to configure browser extension: %s", e, exc_info=True)
             raise
 
+    # Configure an unauthenticated proxy if details are provided
+    if proxy_host and proxy_port and not needs_proxy_auth:
+        options.add_argument(f"--proxy-server={proxy_scheme}://{proxy_host}:{proxy_port}")
+        logger.info("Configured proxy: %s:%s using scheme %s", proxy_host, proxy_port, proxy_scheme)
+
     try:
-        if browser_url:
+        if is_grid_url(browser_url):
+            driver = start_grid_session(browser_url, options)
+        elif browser_url:
             logger.info("Initializing remote WebDriver at URL: %s", browser_url)
             driver = webdriver.Remote(command_executor=browser_url, options=options)
         else:
@@ -126,26 +405,131 @@ def setup_driver(browser_url="",
         logger.info("WebDriver initialized successfully.")
     except WebDriverException as e:
         logger.critical("WebDriver initialization failed.", exc_info=True)
+        if profile_dir:
+            remove_profile(profile_dir)
         raise e
+    driver.profile_dir = profile_dir
+    driver.request_allowlist = request_allowlist
+    register_owned_pid(driver_service_pid(driver))
 
-    try:
-        driver.execute_cdp_cmd("Network.enable", {})
-        driver.execute_cdp_cmd(
-            "Network.setBlockedURLs",
-            {"urls": [
-                "*googleapis.com/maps*",
-                "*googleapis.com/vt?*",
-                "*maps.gstatic.com*",
-                "*.jpg", "*.jpeg", "*.png", "*.gif",
-                "*.css", "*.woff", "*.woff2", "*.ttf",
-                "*google-analytics.com*", "*adservice.google.com*",
-                "*doubleclick.net*", "*facebook.net*"
-            ]}
-        )
-        logger.info("CDP block list configured successfully.")
-    except Exception as e:
-        logger.warning("Error setting CDP block list: %s", e, exc_info=True)
-
+    configure_request_blocking(driver)
     driver.set_page_load_timeout(20)
     logger.info("WebDriver setup completed successfully.")
     return driver
+
+def is_driver_alive(driver):
+    """
+    Cheap health check used before handing a pooled driver to a flow.
+    Returns False if the browser or chromedriver no longer responds.
+    """
+    try:
+        driver.execute_script("return 1;")
+        return True
+    except Exception as e:
+        logger.warning("WebDriver health check failed: %s", e)
+        return False
+
+def quit_driver(driver):
+    """
+    Quits a driver, logging instead of raising if the session is already gone.
+    """
+    service_pid = driver_service_pid(driver)
+    try:
+        driver.quit()
+        logger.info("WebDriver session closed.")
+    except Exception as e:
+        logger.warning("Error while closing WebDriver session: %s", e)
+    unregister_owned_pid(service_pid)
+    profile_dir = getattr(driver, "profile_dir", None)
+    if profile_dir:
+        remove_profile(profile_dir)
+    grid_endpoint = getattr(driver, "grid_endpoint", None)
+    if grid_endpoint:
+        router, endpoint = grid_endpoint
+        router.release(endpoint)
+
+def reset_driver(driver):
+    """
+    Puts a live session back into a clean state so it can serve another flow:
+    closes extra windows, clears cookies and site storage through CDP and
+    navigates to about:blank. Raises if the session cannot be reset.
+    """
+    start = time.perf_counter()
+    handles = driver.window_handles
+    origins = set(RESET_ORIGINS)
+    for handle in reversed(handles):
+        driver.switch_to.window(handle)
+        parts = urlsplit(driver.current_url)
+        if parts.scheme in ("http", "https"):
+            origins.add(f"{parts.scheme}://{parts.netloc}")
+        if handle != handles[0]:
+            driver.close()
+    driver.switch_to.window(handles[0])
+
+    restore_script_id = getattr(driver, "restore_script_id", None)
+    if restore_script_id:
+        # Installed by cookie_jar.restore_session_state for the previous flow's identity.
+        driver.execute_cdp_cmd("Page.removeScriptToEvaluateOnNewDocument", {"identifier": restore_script_id})
+        driver.restore_script_id = None
+    driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+    for origin in origins:
+        try:
+            driver.execute_cdp_cmd("Storage.clearDataForOrigin", {"origin": origin, "storageTypes": RESET_STORAGE_TYPES})
+        except Exception as e:
+            logger.warning("Failed to clear storage for %s: %s", origin, e)
+
+    driver.get("about:blank")
+    drain_network_events(driver)  # so the next flow's network summary starts empty
+    logger.info("Reset session (%d window(s) closed, %d origin(s) cleared) in %.4f seconds",
+                len(handles) - 1, len(origins), time.perf_counter() - start)
+
+def set_browser_cookies(driver, cookies):
+    """
+    Installs cookies (CDP Network.CookieParam dicts) in the browser before
+    the first navigation. Returns False if the browser refused them.
+    """
+    start = time.perf_counter()
+    try:
+        driver.execute_cdp_cmd("Network.setCookies", {"cookies": cookies})
+    except Exception as e:
+        logger.warning("Failed to inject %d cookie(s): %s", len(cookies), e)
+        return False
+    logger.info("Injected %d cookie(s) in %.4f seconds", len(cookies), time.perf_counter() - start)
+    return True
+
+def get_browser_metrics(driver):
+    """
+    Returns memory metrics for a session: the CDP Performance.getMetrics values
+    plus 'RendererRSS' (bytes) for local drivers, read from the process tree.
+    """
+    metrics = {}
+    try:
+        driver.execute_cdp_cmd("Performance.enable", {})
+        result = driver.execute_cdp_cmd("Performance.getMetrics", {})
+        metrics = {m["name"]: m["value"] for m in result.get("metrics", [])}
+    except Exception as e:
+        logger.warning("Failed to read CDP performance metrics: %s", e)
+
+    service_pid = driver_service_pid(driver)
+    if service_pid:
+        metrics["RendererRSS"] = tree_rss(service_pid, cmdline_filter="--type=renderer")
+    return metrics
+
+def should_recycle(driver, uses):
+    """
+    Decides whether a session has served enough flows, or grown large enough,
+    that it should be quit and replaced instead of reset and reused.
+    """
+    if uses >= RECYCLE_AFTER_USES:
+        logger.info("Recycling session after %d uses.", uses)
+        return True
+    metrics = get_browser_metrics(driver)
+    js_heap = metrics.get("JSHeapUsedSize", 0)
+    if js_heap > RECYCLE_JS_HEAP_BYTES:
+        logger.info("Recycling session: JS heap %.1f MB over limit.", js_heap / 1024 / 1024)
+        return True
+    renderer_rss = metrics.get("RendererRSS", 0)
+    if renderer_rss > RECYCLE_RENDERER_RSS_BYTES:
+        logger.info("Recycling session: renderer RSS %.1f MB over limit.", renderer_rss / 1024 / 1024)
+        return True
+    return False
@@ -0,0 +1,150 @@
+import json
+import threading
+import time
+import urllib.request
+from config import logger
+
+GRID_BROWSER_URL = "grid"          # browser_url value that routes through the configured grid
+GRID_DEFAULT_CAPACITY = 4          # concurrent sessions per endpoint when no hint is given
+GRID_PROBE_INTERVAL = 15           # seconds between health probes
+GRID_PROBE_TIMEOUT = 5             # seconds before a probe counts as failed
+GRID_EJECT_AFTER_FAILURES = 3      # consecutive failures before an endpoint stops receiving sessions
+GRID_LATENCY_ALPHA = 0.3           # weight of the newest sample in the latency moving average
+
+class GridEndpoint:
+    """
+    One remote WebDriver endpoint with its capacity hint and health state.
+    """
+
+    def __init__(self, url, capacity=GRID_DEFAULT_CAPACITY):
+        self.url = url.rstrip("/")
+        self.capacity = capacity
+        self.active = 0
+        self.failures = 0
+        self.healthy = True
+        self.latency = None   # moving average of probe / session start seconds
+
+    def record_latency(self, seconds):
+        if self.latency is None:
+            self.latency = seconds
+        else:
+            self.latency = GRID_LATENCY_ALPHA * seconds + (1 - GRID_LATENCY_ALPHA) * self.latency
+
+    def __repr__(self):
+        return f"{self.url} ({self.active}/{self.capacity}, {'healthy' if self.healthy else 'ejected'})"
+
+class GridRouter:
+    """
+    Spreads new sessions over several remote WebDriver endpoints: the healthy
+    endpoint with the lowest load relative to its capacity wins, ties going to
+    the lower latency. Endpoints are ejected after repeated failures and
+    re-admitted when a health probe succeeds again.
+    """
+
+    def __init__(self, endpoints):
+        self._lock = threading.Lock()
+        self.endpoints = []
+        for endpoint in endpoints:
+            if isinstance(endpoint, (tuple, list)):
+                self.endpoints.append(GridEndpoint(*endpoint))
+            else:
+                self.endpoints.append(GridEndpoint(endpoint))
+        if not self.endpoints:
+            raise ValueError("A grid needs at least one endpoint.")
+        self._prober = None
+
+    def acquire(self, exclude=()):
+        """
+        Reserves a session slot on the best endpoint and returns it.
+        Raises RuntimeError if every endpoint is ejected or full.
+        """
+        self.start_probes()
+        with self._lock:
+            candidates = [e for e in self.endpoints if e.healthy and e.active < e.capacity and e.url not in exclude]
+            if not candidates:
+                raise RuntimeError(f"No healthy grid endpoint with free capacity: {self.endpoints}")
+            endpoint = min(candidates, key=lambda e: (e.active / e.capacity, e.latency if e.latency is not None else 0))
+            endpoint.active += 1
+            return endpoint
+
+    def release(self, endpoint):
+        with self._lock:
+            endpoint.active = max(0, endpoint.active - 1)
+
+    def record_success(self, endpoint, seconds):
+        with self._lock:
+            endpoint.record_latency(seconds)
+            endpoint.failures = 0
+            if not endpoint.healthy:
+                endpoint.healthy = True
+                logger.info("Grid endpoint %s re-admitted.", endpoint.url)
+
+    def record_failure(self, endpoint, reason):
+        with self._lock:
+            endpoint.failures += 1
+            logger.warning("Grid endpoint %s failed (%d in a row): %s", endpoint.url, endpoint.failures, reason)
+            if endpoint.healthy and endpoint.failures >= GRID_EJECT_AFTER_FAILURES:
+                endpoint.healthy = False
+                logger.error("Grid endpoint %s ejected after %d consecutive failures.", endpoint.url, endpoint.failures)
+
+    def probe(self, endpoint):
+        """
+        Checks an endpoint's /status and records the result.
+        """
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(f"{endpoint.url}/status", timeout=GRID_PROBE_TIMEOUT) as response:
+                status = json.loads(response.read().decode("utf-8"))
+            if not status.get("value", {}).get("ready", False):
+                raise RuntimeError("endpoint reports not ready")
+        except Exception as e:
+            self.record_failure(endpoint, f"health probe: {e}")
+            return False
+        self.record_success(endpoint, time.perf_counter() - start)
+        return True
+
+    def start_probes(self):
+        with self._lock:
+            if self._prober is not None:
+                return
+            self._prober = threading.Thread(target=self._probe_loop, name="grid-prober", daemon=True)
+            self._prober.start()
+
+    def _probe_loop(self):
+        while True:
+            for endpoint in list(self.endpoints):
+                self.probe(endpoint)
+            time.sleep(GRID_PROBE_INTERVAL)
+
+_routers = {}
+_routers_lock = threading.Lock()
+
+def configure_grid(endpoints):
+    """
+    Registers the endpoints used when browser_url is GRID_BROWSER_URL.
+    endpoints is a list of URLs or (URL, capacity) pairs.
+    """
+    with _routers_lock:
+        _routers[GRID_BROWSER_URL] = GridRouter(endpoints)
+    logger.info("Configured WebDriver grid: %s", ", ".join(repr(e) for e in _routers[GRID_BROWSER_URL].endpoints))
+
+def is_grid_url(browser_url):
+    return bool(browser_url) and (browser_url == GRID_BROWSER_URL or "," in browser_url)
+
+def get_router(browser_url):
+    """
+    Returns the router for a grid browser_url: GRID_BROWSER_URL for the
+    configured grid, or a comma separated list of endpoint URLs, each
+    optionally followed by '|capacity'.
+    """
+    with _routers_lock:
+        router = _routers.get(browser_url)
+        if router is None:
+            if browser_url == GRID_BROWSER_URL:
+                raise RuntimeError("browser_url 'grid' used before configure_grid() was called.")
+            endpoints = []
+            for item in browser_url.split(","):
+                url, _, capacity = item.strip().partition("|")
+                endpoints.append((url, int(capacity)) if capacity else url)
+            router = _routers[browser_url] = GridRouter(endpoints)
+        return router
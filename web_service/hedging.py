@@ -0,0 +1,183 @@
+import collections
+import contextvars
+import itertools
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from config import logger
+from http_client import HTTP_TIMEOUT
+from utils import CancelToken, FlowCancelled, current_cancel_token
+
+HEDGE_INITIAL_DELAY = 20      # seconds before hedging while a stage has too few samples for a p95
+HEDGE_MIN_SAMPLES = 20        # samples a stage needs before its own p95 is used
+HEDGE_MIN_DELAY = 2           # never hedge sooner than this
+HEDGE_WINDOW = 200            # latest latencies kept per stage
+HEDGE_BUDGET_RATIO = 0.1      # hedges earned per primary attempt
+HEDGE_BUDGET_BURST = 5        # most hedges that can be saved up
+HEDGE_POLL = 0.25             # seconds between checks of the caller's cancel token
+# Stages that give up on their own after a timeout. Their hedge fires within
+# this share of the timeout, or a slow attempt would time out before it is hedged.
+HEDGE_STAGE_TIMEOUTS = {"yelp_http_probe": HTTP_TIMEOUT}
+HEDGE_TIMEOUT_SHARE = 0.5
+# Hedges leave through one of these sticky sessions, so they reuse a bounded
+# set of pool keys (warm drivers, built profiles, cached extensions) instead of
+# launching a new Chrome for every hedge.
+HEDGE_SESSIDS = ("hedge1", "hedge2")
+
+SESSID_PATTERN = re.compile(r"-sessid-[A-Za-z0-9]+")
+
+# Attempts run here; a hedged call holds two workers at most.
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="hedge")
+
+class LatencyTracker:
+    """
+    Keeps the latest latencies of each stage and reports their p95.
+    """
+
+    def __init__(self, window=HEDGE_WINDOW):
+        self._samples = collections.defaultdict(lambda: collections.deque(maxlen=window))
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        with self._lock:
+            self._samples[stage].append(seconds)
+
+    def p95(self, stage):
+        """Returns the stage's p95 in seconds, or None with too few samples."""
+        with self._lock:
+            samples = sorted(self._samples[stage])
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+
+    def hedge_delay(self, stage):
+        p95 = self.p95(stage)
+        delay = HEDGE_INITIAL_DELAY if p95 is None else max(p95, HEDGE_MIN_DELAY)
+        if stage in HEDGE_STAGE_TIMEOUTS:
+            delay = min(delay, max(HEDGE_STAGE_TIMEOUTS[stage] * HEDGE_TIMEOUT_SHARE, HEDGE_MIN_DELAY))
+        return delay
+
+class HedgeBudget:
+    """
+    Token bucket shared by all hedged calls: each primary attempt earns
+    HEDGE_BUDGET_RATIO of a hedge, so hedges stay a fixed share of traffic
+    even when every exit is slow.
+    """
+
+    def __init__(self, ratio=HEDGE_BUDGET_RATIO, burst=HEDGE_BUDGET_BURST):
+        self.ratio = ratio
+        self.burst = burst
+        self._tokens = float(burst)
+        self._lock = threading.Lock()
+        self.hedges = 0
+        self.denied = 0
+
+    def earn(self):
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + self.ratio)
+
+    def try_spend(self):
+        with self._lock:
+            if self._tokens >= 1:
+                self._tokens -= 1
+                self.hedges += 1
+                return True
+            self.denied += 1
+            return False
+
+latency_tracker = LatencyTracker()
+hedge_budget = HedgeBudget()
+_hedge_turn = itertools.count()
+
+def with_sessid(proxy_username, sessid):
+    """Returns the username with its Oxylabs sticky session id set to sessid."""
+    if SESSID_PATTERN.search(proxy_username):
+        return SESSID_PATTERN.sub(f"-sessid-{sessid}", proxy_username, count=1)
+    return f"{proxy_username}-sessid-{sessid}"
+
+def hedge_proxy_username(proxy_username, warm=None):
+    """
+    Returns the username a hedge uses: one of HEDGE_SESSIDS other than the
+    primary's own session, so it leaves through a different exit node.
+    warm(username) -> bool, if given, picks a session that already has a
+    warm driver; otherwise the sessions are used in turn.
+    """
+    candidates = [with_sessid(proxy_username, sessid) for sessid in HEDGE_SESSIDS]
+    candidates = [username for username in candidates if username != proxy_username]
+    if warm is not None:
+        for username in candidates:
+            if warm(username):
+                return username
+    return candidates[next(_hedge_turn) % len(candidates)]
+
+def _failed(result):
+    # Flows report infrastructure failures as results, not exceptions; probes return None.
+    return result is None or (isinstance(result, tuple) and isinstance(result[-1], str) and
+                              result[-1].startswith(("WebDriver error", "Unexpected error")))
+
+def _start_attempt(tracker, stage, func, kwargs):
+    token = CancelToken()
+    context = contextvars.copy_context()
+    context.run(current_cancel_token.set, token)
+
+    def attempt():
+        start = time.perf_counter()
+        result = context.run(func, **kwargs)
+        tracker.record(stage, time.perf_counter() - start)
+        return result
+
+    return _executor.submit(attempt), token
+
+def hedged(func, stage, kwargs, tracker=None, budget=None, hedge_kwargs=None, warm=None):
+    """
+    Runs func(**kwargs). If it has not returned within the stage's p95, a second
+    attempt on another proxy session starts (budget permitting) and the first
+    result wins; the other attempt is cancelled and hands its session back.
+    The hedge runs with kwargs updated by hedge_kwargs and a proxy_username
+    from hedge_proxy_username(..., warm). The caller's own cancel token, if
+    any, cancels both attempts. Calls without a proxy_username are never
+    hedged: there is no other session.
+    """
+    tracker = tracker or latency_tracker
+    budget = budget or hedge_budget
+    outer = current_cancel_token.get()
+    budget.earn()
+    delay = tracker.hedge_delay(stage)
+    primary, primary_token = _start_attempt(tracker, stage, func, kwargs)
+    attempts = {primary: (primary_token, "primary")}
+    hedge_at = time.monotonic() + delay
+    hedge_started = False
+
+    try:
+        while True:
+            if outer is not None and outer.is_cancelled():
+                raise FlowCancelled(outer.reason)
+            done, _ = wait(list(attempts), timeout=HEDGE_POLL, return_when=FIRST_COMPLETED)
+            for future in done:
+                token, name = attempts.pop(future)
+                if future.exception() is None:
+                    result = future.result()
+                    if attempts and _failed(result):
+                        logger.warning("The %s attempt of %s failed (%s); waiting for the other.", name, stage, result[3] if result else "no answer")
+                        continue
+                    if name == "hedge":
+                        logger.info("Hedged %s attempt answered first.", stage)
+                    return result
+                logger.warning("The %s attempt of %s failed: %s", name, stage, future.exception())
+                if not attempts:
+                    raise future.exception()
+            if not hedge_started and time.monotonic() >= hedge_at and kwargs.get("proxy_username"):
+                hedge_started = True
+                if budget.try_spend():
+                    logger.info("%s still running after %.2f seconds (p95); hedging on another proxy session.", stage, delay)
+                    attempt_kwargs = dict(kwargs, **(hedge_kwargs or {}))
+                    attempt_kwargs["proxy_username"] = hedge_proxy_username(kwargs["proxy_username"], warm)
+                    hedge, hedge_token = _start_attempt(tracker, stage, func, attempt_kwargs)
+                    attempts[hedge] = (hedge_token, "hedge")
+                else:
+                    logger.info("Hedge budget exhausted; not hedging %s.", stage)
+    finally:
+        for future, (token, name) in attempts.items():
+            token.cancel("lost hedge")
+            logger.info("Cancelled the %s %s attempt.", name, stage)
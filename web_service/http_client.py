@@ -0,0 +1,209 @@
+import base64
+import gzip
+import http.client
+import http.cookiejar
+import threading
+import time
+import urllib.request
+import zlib
+from urllib.parse import urljoin, urlsplit
+from config import logger
+
+HTTP_TIMEOUT = 15            # seconds per request
+HTTP_MAX_REDIRECTS = 5
+HTTP_MAX_IDLE_PER_HOST = 4   # keep-alive connections kept per target host
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9",
+    "Accept-Encoding": "gzip, deflate",
+}
+
+class AvailabilityParseError(Exception):
+    """
+    Raised when a page or API response does not have the expected shape
+    (bot check, client-only render, changed markup or schema). Callers fall
+    back to the browser when they see it.
+    """
+
+class HttpResponse:
+    """
+    A fully read response: status, headers (http.client.HTTPMessage), decoded body and final URL.
+    """
+
+    def __init__(self, status, headers, body, url):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.url = url
+
+    def text(self):
+        charset = self.headers.get_content_charset() or "utf-8"
+        return self.body.decode(charset, "replace")
+
+    def info(self):
+        # Lets http.cookiejar read Set-Cookie headers from this response.
+        return self.headers
+
+class HttpSession:
+    """
+    Keep-alive HTTP client for one proxy identity. Connections are pooled per
+    target host (tunnelled through the proxy with CONNECT for https) and
+    cookies persist across requests, like a browser profile would.
+    """
+
+    def __init__(self, proxy_host=None, proxy_port=None, proxy_username=None, proxy_password=None, proxy_scheme="http"):
+        self.proxy_host = proxy_host
+        self.proxy_port = proxy_port
+        self.proxy_scheme = proxy_scheme
+        # Stable name of the proxy identity (no password), for caches kept per session.
+        self.identity = (proxy_scheme, proxy_host, proxy_port, proxy_username)
+        self.proxy_headers = {}
+        if proxy_username and proxy_password:
+            token = base64.b64encode(f"{proxy_username}:{proxy_password}".encode("utf-8")).decode("ascii")
+            self.proxy_headers["Proxy-Authorization"] = f"Basic {token}"
+        self.cookies = http.cookiejar.CookieJar()
+        self._idle = {}   # (scheme, host, port) -> [connection]
+        self._lock = threading.Lock()
+
+    def _new_connection(self, scheme, host, port):
+        if self.proxy_host:
+            if scheme == "https":
+                conn = http.client.HTTPSConnection(self.proxy_host, self.proxy_port, timeout=HTTP_TIMEOUT)
+                conn.set_tunnel(host, port, headers=self.proxy_headers)
+            else:
+                conn = http.client.HTTPConnection(self.proxy_host, self.proxy_port, timeout=HTTP_TIMEOUT)
+        elif scheme == "https":
+            conn = http.client.HTTPSConnection(host, port, timeout=HTTP_TIMEOUT)
+        else:
+            conn = http.client.HTTPConnection(host, port, timeout=HTTP_TIMEOUT)
+        return conn
+
+    def _take_connection(self, key):
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop(), True
+        return self._new_connection(*key), False
+
+    def _return_connection(self, key, conn):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < HTTP_MAX_IDLE_PER_HOST:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def _send(self, method, url, body, headers):
+        parts = urlsplit(url)
+        scheme = parts.scheme
+        port = parts.port or (443 if scheme == "https" else 80)
+        key = (scheme, parts.hostname, port)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        if self.proxy_host and scheme == "http":
+            path = url  # plain-http requests through a proxy use the absolute URI
+            headers = {**headers, **self.proxy_headers}
+
+        conn, reused = self._take_connection(key)
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            data = response.read()
+        except (http.client.HTTPException, OSError):
+            conn.close()
+            if not reused:
+                raise
+            # A pooled keep-alive connection may have been closed by the server; retry on a fresh one.
+            conn = self._new_connection(*key)
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            data = response.read()
+
+        if response.will_close:
+            conn.close()
+        else:
+            self._return_connection(key, conn)
+
+        encoding = (response.headers.get("Content-Encoding") or "").lower()
+        if encoding == "gzip":
+            data = gzip.decompress(data)
+        elif encoding == "deflate":
+            data = zlib.decompress(data)
+        return HttpResponse(response.status, response.headers, data, url)
+
+    def request(self, method, url, body=None, headers=None):
+        """
+        Sends a request, following redirects and carrying cookies.
+        Returns an HttpResponse.
+        """
+        start = time.perf_counter()
+        for _ in range(HTTP_MAX_REDIRECTS + 1):
+            cookie_request = urllib.request.Request(url, method=method)
+            self.cookies.add_cookie_header(cookie_request)
+            send_headers = {**DEFAULT_HEADERS, **(headers or {})}
+            if cookie_request.has_header("Cookie"):
+                send_headers["Cookie"] = cookie_request.get_header("Cookie")
+
+            response = self._send(method, url, body, send_headers)
+            self.cookies.extract_cookies(response, cookie_request)
+
+            location = response.headers.get("Location")
+            if response.status in (301, 302, 303, 307, 308) and location:
+                url = urljoin(url, location)
+                if response.status in (301, 302, 303):
+                    method, body = "GET", None
+                continue
+            logger.info("HTTP %s %s -> %d (%d bytes) in %.4f seconds", method, url, response.status, len(response.body), time.perf_counter() - start)
+            return response
+        raise http.client.HTTPException(f"Too many redirects fetching {url}")
+
+    def get(self, url, headers=None):
+        return self.request("GET", url, headers=headers)
+
+    def close(self):
+        with self._lock:
+            idle = [conn for conns in self._idle.values() for conn in conns]
+            self._idle.clear()
+        for conn in idle:
+            conn.close()
+
+def cookies_for_cdp(session):
+    """
+    Returns a session's cookies as CDP Network.setCookies parameters, so a
+    browser can continue where the HTTP client left off. Host-only cookies
+    are given as a URL to keep them host-only in the browser.
+    """
+    cookies = []
+    for cookie in session.cookies:
+        param = {
+            "name": cookie.name,
+            "value": cookie.value or "",
+            "path": cookie.path or "/",
+            "secure": bool(cookie.secure),
+        }
+        if cookie.domain_specified:
+            param["domain"] = cookie.domain
+        else:
+            param["url"] = f"{'https' if cookie.secure else 'http'}://{cookie.domain}{param['path']}"
+        if cookie.expires:
+            param["expires"] = cookie.expires
+        if cookie.has_nonstandard_attr("HttpOnly"):
+            param["httpOnly"] = True
+        cookies.append(param)
+    return cookies
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+def get_http_session(proxy_host=None, proxy_port=None, proxy_username=None, proxy_password=None, proxy_scheme="http"):
+    """
+    Returns the shared HttpSession for a proxy identity, creating it on first use.
+    """
+    key = (proxy_scheme, proxy_host, proxy_port, proxy_username, proxy_password)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = _sessions[key] = HttpSession(proxy_host, proxy_port, proxy_username, proxy_password, proxy_scheme)
+        return session
@@ -0,0 +1,159 @@
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from config import logger
+from network import log_network_summary
+from procs import find_orphaned_browser_trees, kill_tree
+from recorder import start_recording, stop_recording
+from cookie_jar import restore_session_state
+from utils import FlowCancelled, current_cancel_token
+
+SESSION_LEAK_SECONDS = 600    # a session held longer than this is reported as leaked
+REAPER_INTERVAL = 60          # seconds between leak checks and orphan sweeps
+
+class DriverUnavailable(Exception):
+    """
+    Raised by driver_session when no driver could be acquired.
+    """
+
+class SessionRecord:
+    """
+    A live session in the registry: the driver, which flow holds it and the
+    call site that opened it.
+    """
+
+    def __init__(self, driver, flow, owner):
+        self.driver = driver
+        self.flow = flow
+        self.owner = owner
+        self.started = time.monotonic()
+        self.leak_reported = False
+
+    def age(self):
+        return time.monotonic() - self.started
+
+_live_sessions = {}   # id(driver) -> SessionRecord
+_live_sessions_lock = threading.Lock()
+_reaper = None
+_reaper_lock = threading.Lock()
+
+def _caller_site():
+    # Skip frames in this module and contextlib to reach the flow that opened the session.
+    for frame in reversed(traceback.extract_stack()[:-1]):
+        if frame.filename != __file__ and not frame.filename.endswith("contextlib.py"):
+            return f"{frame.filename}:{frame.lineno} in {frame.name}"
+    return "unknown"
+
+def live_sessions():
+    """
+    Returns a snapshot of the registry as a list of SessionRecord.
+    """
+    with _live_sessions_lock:
+        return list(_live_sessions.values())
+
+@contextmanager
+def driver_session(pool, *checkout_args, acquired=None, flow=None, record_network=False, session_jar=None, **checkout_kwargs):
+    """
+    The one way flows get a browser. Checks a driver out of `pool` (or takes
+    the result of an acquire_async Future passed as `acquired`), registers it
+    as live, and on exit always logs its network summary and checks it back in.
+    A session left by an exception escaping the flow is discarded rather than
+    reused. Raises DriverUnavailable if no driver could be acquired.
+    With record_network, the flow's traffic is archived (see recorder.py).
+    session_jar names a cookie_jar identity whose saved cookies and storage
+    are restored before the flow navigates anywhere.
+    The cancel token of the calling context (see async_api.py) is attached
+    to the driver; a flow stopped by it is reset and reused, not discarded.
+    """
+    ensure_reaper()
+    owner = _caller_site()
+    token = current_cancel_token.get()
+    try:
+        driver = acquired.result() if acquired is not None else pool.checkout(*checkout_args, **checkout_kwargs)
+    except Exception as e:
+        raise DriverUnavailable(e) from e
+    if token is not None and token.is_cancelled():
+        pool.checkin(driver)
+        token.raise_if_cancelled()
+
+    record = SessionRecord(driver, flow, owner)
+    with _live_sessions_lock:
+        _live_sessions[id(driver)] = record
+    driver.session_jar = session_jar
+    driver.cancel_token = token
+    if session_jar:
+        try:
+            restore_session_state(driver, session_jar)
+        except Exception as e:
+            logger.warning("Could not restore session jar for %s: %s", flow, e)
+    if record_network:
+        try:
+            start_recording(driver, flow or "unnamed")
+        except Exception as e:
+            logger.warning("Could not start network recording for %s: %s", flow, e)
+    discard = False
+    try:
+        yield driver
+    except FlowCancelled:
+        logger.info("%s cancelled by its caller; returning the session.", flow or "Flow")
+        raise
+    except BaseException:
+        discard = True
+        raise
+    finally:
+        with _live_sessions_lock:
+            _live_sessions.pop(id(driver), None)
+        driver.session_jar = None
+        driver.cancel_token = None
+        try:
+            stop_recording(driver)
+            if flow:
+                log_network_summary(driver, flow)
+        finally:
+            pool.checkin(driver, discard=discard)
+        if record.leak_reported:
+            logger.info("Previously reported long-held session from %s returned after %.1f seconds.", owner, record.age())
+
+def report_leaks(threshold=SESSION_LEAK_SECONDS):
+    """
+    Logs every session held longer than threshold, with the call site that
+    opened it. Each session is reported once.
+    """
+    leaked = []
+    for record in live_sessions():
+        if record.age() > threshold and not record.leak_reported:
+            record.leak_reported = True
+            leaked.append(record)
+            logger.error("Possible WebDriver session leak: %s session held for %.1f seconds, opened at %s",
+                         record.flow or "unnamed", record.age(), record.owner)
+    return leaked
+
+def reap_orphans():
+    """
+    Kills chromedriver/Chrome process trees that no live session owns.
+    """
+    orphans = find_orphaned_browser_trees()
+    for pid in orphans:
+        killed = kill_tree(pid)
+        logger.warning("Killed orphaned browser process tree rooted at %d (%d processes).", pid, len(killed))
+    return orphans
+
+def _reaper_loop():
+    while True:
+        time.sleep(REAPER_INTERVAL)
+        try:
+            report_leaks()
+            reap_orphans()
+        except Exception as e:
+            logger.error("Session reaper failed: %s", e, exc_info=True)
+
+def ensure_reaper():
+    """
+    Starts the background leak reporter and orphan reaper once per process.
+    """
+    global _reaper
+    with _reaper_lock:
+        if _reaper is None:
+            _reaper = threading.Thread(target=_reaper_loop, name="session-reaper", daemon=True)
+            _reaper.start()
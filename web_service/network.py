@@ -0,0 +1,134 @@
+import json
+import threading
+from collections import Counter, deque
+from urllib.parse import urlsplit
+from config import logger
+
+# Hosts each flow needs. In allowlist mode every other host is failed in the
+# browser before a byte goes through the proxy. A host also allows its subdomains.
+REQUEST_ALLOWLISTS = {
+    "yelp": ["yelp.com", "yelpcdn.com", "yelp-ir.com"],
+    "opentable": ["opentable.com", "otstatic.com"],
+    # Third-party booking widgets embedded on restaurant sites.
+    "widget": ["opentable.com", "otstatic.com", "resy.com", "exploretock.com", "sevenrooms.com"],
+}
+# Bot checks must still load or the flow stalls on a challenge page.
+BOT_CHECK_HOSTS = ["captcha-delivery.com", "recaptcha.net", "hcaptcha.com"]
+
+BLOCKED_ERROR_TEXT = "net::ERR_BLOCKED_BY_CLIENT"   # cancelled by the filtering extension
+FLOW_BYTES_WINDOW = 50                              # latest runs whose transferred bytes are kept per flow and allowlist
+
+_flow_bytes = {}   # (flow, allowlist or None) -> deque of bytes transferred per run
+_flow_bytes_lock = threading.Lock()
+
+def allowed_hosts_for(allowlist):
+    """
+    Returns the hosts allowed for a REQUEST_ALLOWLISTS entry, including bot checks.
+    """
+    if allowlist not in REQUEST_ALLOWLISTS:
+        raise ValueError(f"Unknown request allowlist '{allowlist}'. Expected one of {sorted(REQUEST_ALLOWLISTS)}.")
+    return sorted(set(REQUEST_ALLOWLISTS[allowlist]) | set(BOT_CHECK_HOSTS))
+
+def enable_performance_log(options):
+    """
+    Asks chromedriver to buffer CDP Network events in the 'performance' log,
+    which is the only way to read CDP events through the plain WebDriver API.
+    """
+    options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    options.add_experimental_option("perfLoggingPrefs", {"enableNetwork": True, "enablePage": False})
+
+def drain_network_events(driver):
+    """
+    Returns (and removes from the driver's buffer) the CDP Network events
+    logged since the last drain, as dicts with 'method' and 'params'.
+    A recorder attached to the driver (see recorder.py) sees every batch, and
+    events a recorder drained early are handed back here on the next drain.
+    """
+    try:
+        entries = driver.get_log("performance")
+    except Exception as e:
+        logger.warning("Could not read the performance log: %s", e)
+        return []
+    events = []
+    for entry in entries:
+        try:
+            message = json.loads(entry["message"])["message"]
+        except (KeyError, ValueError, TypeError):
+            continue
+        if message.get("method", "").startswith("Network."):
+            message["timestamp"] = entry.get("timestamp")
+            events.append(message)
+    recorder = getattr(driver, "network_recorder", None)
+    if recorder is not None:
+        recorder.observe(driver, events)
+    backlog = getattr(driver, "network_event_backlog", None)
+    if backlog:
+        events = backlog + events
+        driver.network_event_backlog = []
+    return events
+
+def summarize_network_events(events):
+    """
+    Counts requests, transferred bytes and blocked requests in a list of
+    Network events. Bytes are the encodedDataLength Chrome reports for each
+    finished load, headers included.
+    """
+    urls = {}
+    summary = {
+        "requests": 0,
+        "allowed_bytes": 0,
+        "blocked_requests": 0,
+        "blocked_hosts": Counter(),
+    }
+    for event in events:
+        method = event.get("method")
+        params = event.get("params", {})
+        request_id = params.get("requestId")
+        if method == "Network.requestWillBeSent":
+            urls[request_id] = params.get("request", {}).get("url", "")
+            summary["requests"] += 1
+        elif method == "Network.loadingFinished":
+            summary["allowed_bytes"] += int(params.get("encodedDataLength", 0))
+        elif method == "Network.loadingFailed":
+            if params.get("errorText") != BLOCKED_ERROR_TEXT and not params.get("blockedReason"):
+                continue
+            summary["blocked_requests"] += 1
+            summary["blocked_hosts"][urlsplit(urls.get(request_id, "")).hostname or "unknown"] += 1
+    return summary
+
+def _record_flow_bytes(flow, allowlist, transferred):
+    # Returns the mean bytes per run of this flow with and without the allowlist, or None without samples.
+    with _flow_bytes_lock:
+        _flow_bytes.setdefault((flow, allowlist), deque(maxlen=FLOW_BYTES_WINDOW)).append(transferred)
+        filtered = _flow_bytes[(flow, allowlist)]
+        baseline = _flow_bytes.get((flow, None))
+        return (sum(filtered) / len(filtered), sum(baseline) / len(baseline) if baseline else None, len(baseline or ()))
+
+def log_network_summary(driver, flow):
+    """
+    Drains the driver's Network events and logs the request counts for one flow.
+    For a driver with a request allowlist, the bytes it saved are measured as
+    the flow's mean transfer on unfiltered sessions minus its mean transfer
+    with the allowlist (saved_bytes is None until an unfiltered run is seen).
+    Returns the summary dict.
+    """
+    summary = summarize_network_events(drain_network_events(driver))
+    allowlist = getattr(driver, "request_allowlist", None)
+    filtered_mean, baseline_mean, baseline_runs = _record_flow_bytes(flow, allowlist, summary["allowed_bytes"])
+    summary["saved_bytes"] = None
+    if allowlist and baseline_mean is not None:
+        summary["saved_bytes"] = baseline_mean - filtered_mean
+    if summary["saved_bytes"] is None:
+        saved = "no unfiltered runs to compare" if allowlist else "allowlist off"
+    else:
+        saved = f"{summary['saved_bytes'] / 1024:.1f} KB saved per run against {baseline_runs} unfiltered run(s)"
+    logger.info(
+        "Network summary for %s: %d requests, %.1f KB transferred, %d blocked (%s). Top blocked hosts: %s",
+        flow,
+        summary["requests"],
+        summary["allowed_bytes"] / 1024,
+        summary["blocked_requests"],
+        saved,
+        ", ".join(f"{host} ({count})" for host, count in summary["blocked_hosts"].most_common(5)) or "none",
+    )
+    return summary
@@ -0,0 +1,205 @@
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from urllib.parse import urljoin, urlsplit, parse_qs
+from config import logger
+from http_client import get_http_session, AvailabilityParseError
+from utils import find_nearest_times
+
+# The availability request the restref widget sends after "Find a table".
+# The persisted query hash changes when OpenTable ships a new widget build.
+# It is taken from the OPENTABLE_AVAILABILITY_QUERY_HASH environment variable
+# (copy it from the RestaurantsAvailability request in DevTools) or, when that
+# is unset, read from the widget's script bundles. Without a hash the
+# browserless check is skipped and the browser flow is used.
+OPENTABLE_AVAILABILITY_URL = "https://www.opentable.com/dapi/fe/gql?optype=query&opname=RestaurantsAvailability"
+OPENTABLE_AVAILABILITY_QUERY_HASH = os.environ.get("OPENTABLE_AVAILABILITY_QUERY_HASH") or None
+OPENTABLE_DATABASE_REGION = "NA"
+QUERY_HASH_TTL = 6 * 3600           # seconds a hash read from the widget bundles is trusted
+QUERY_HASH_RETRY = 600              # seconds before retrying after the bundles had no hash
+QUERY_HASH_MAX_BUNDLES = 10         # widget scripts searched per extraction
+CSRF_TOKEN_TTL = 600    # seconds a widget CSRF token is reused per proxy session
+CSRF_TOKEN_PATTERN = re.compile(r"""__CSRF_TOKEN__['"]?\s*[:=]\s*['"]([^'"]+)['"]""")
+SCRIPT_SRC_PATTERN = re.compile(r"""<script[^>]+src=["']([^"']+\.js[^"']*)["']""")
+QUERY_HASH_PATTERN = re.compile(r"""RestaurantsAvailability['"].{0,300}?['"]([0-9a-f]{64})['"]""", re.S)
+
+_csrf_tokens = {}   # (HttpSession.identity, widget host) -> (token, fetched_at)
+_csrf_tokens_lock = threading.Lock()
+_query_hash = (None, 0.0)   # (hash read from the bundles or None, monotonic time of the attempt)
+_query_hash_lock = threading.Lock()
+
+def restaurant_rid(restref_url):
+    """
+    Returns the numeric restaurant id from a restref widget URL.
+    """
+    query = parse_qs(urlsplit(restref_url).query)
+    rid = (query.get("rid") or query.get("restref") or [None])[0]
+    if not rid or not rid.isdigit():
+        raise ValueError(f"No restaurant id in widget URL: {restref_url}")
+    return int(rid)
+
+def build_availability_payload(rid, date, requested_time, party_size, query_hash):
+    """
+    Builds the JSON body of the widget's RestaurantsAvailability request.
+    """
+    return {
+        "operationName": "RestaurantsAvailability",
+        "variables": {
+            "onlyPop": False,
+            "forwardDays": 0,
+            "requireTimes": False,
+            "requireTypes": [],
+            "restaurantIds": [rid],
+            "date": date,
+            "time": requested_time,
+            "partySize": int(party_size),
+            "databaseRegion": OPENTABLE_DATABASE_REGION,
+            "restaurantAvailabilityTokens": [],
+            "loyaltyRedemptionTiers": [],
+        },
+        "extensions": {"persistedQuery": {"version": 1, "sha256Hash": query_hash}},
+    }
+
+def _csrf_key(session, restref_url):
+    return (session.identity, urlsplit(restref_url).netloc)
+
+def _csrf_token(session, restref_url):
+    # The widget page embeds the token its XHRs send; one page load per proxy session is enough.
+    key = _csrf_key(session, restref_url)
+    with _csrf_tokens_lock:
+        cached = _csrf_tokens.get(key)
+    if cached and time.monotonic() - cached[1] < CSRF_TOKEN_TTL:
+        return cached[0]
+    response = session.get(restref_url)
+    if response.status != 200:
+        raise AvailabilityParseError(f"widget page returned HTTP {response.status}")
+    match = CSRF_TOKEN_PATTERN.search(response.text())
+    if not match:
+        raise AvailabilityParseError("CSRF token not found in widget page")
+    with _csrf_tokens_lock:
+        _csrf_tokens[key] = (match.group(1), time.monotonic())
+    return match.group(1)
+
+def extract_query_hash(session, restref_url):
+    """
+    Reads the RestaurantsAvailability persisted query hash from the script
+    bundles the widget page loads. Returns None if no bundle has it.
+    """
+    response = session.get(restref_url)
+    if response.status != 200:
+        raise AvailabilityParseError(f"widget page returned HTTP {response.status}")
+    page = response.text()
+    match = QUERY_HASH_PATTERN.search(page)
+    if match:
+        return match.group(1)
+    for src in SCRIPT_SRC_PATTERN.findall(page)[:QUERY_HASH_MAX_BUNDLES]:
+        bundle = session.get(urljoin(restref_url, src))
+        if bundle.status != 200:
+            continue
+        match = QUERY_HASH_PATTERN.search(bundle.text())
+        if match:
+            return match.group(1)
+    return None
+
+def _availability_query_hash(session, restref_url):
+    # Configured hash first; otherwise the one read from the bundles, re-read every QUERY_HASH_TTL.
+    # The bundles are fetched outside the lock so other probes are not held up by a slow scan.
+    global _query_hash
+    if OPENTABLE_AVAILABILITY_QUERY_HASH:
+        return OPENTABLE_AVAILABILITY_QUERY_HASH
+    with _query_hash_lock:
+        query_hash, attempted = _query_hash
+        if attempted and time.monotonic() - attempted < (QUERY_HASH_TTL if query_hash else QUERY_HASH_RETRY):
+            return query_hash
+    try:
+        query_hash = extract_query_hash(session, restref_url)
+    except Exception as e:
+        logger.warning("Could not read the OpenTable availability query hash from the widget: %s", e)
+        query_hash = None
+    with _query_hash_lock:
+        _query_hash = (query_hash, time.monotonic())
+    if query_hash:
+        logger.info("Read OpenTable availability query hash %s from the widget bundles.", query_hash)
+    return query_hash
+
+def _forget_query_hash(query_hash):
+    global _query_hash
+    with _query_hash_lock:
+        if _query_hash[0] == query_hash:
+            _query_hash = (None, 0.0)
+
+def parse_available_times(data, requested_time):
+    """
+    Returns the available slot times ('HH:MM') from a RestaurantsAvailability
+    response. Slots are given as minute offsets from the requested time.
+    """
+    try:
+        slots = data["data"]["availability"][0]["availabilityDays"][0]["slots"]
+    except (KeyError, IndexError, TypeError) as e:
+        raise AvailabilityParseError(f"unexpected availability response: {e!r}")
+    base = datetime.strptime(requested_time, "%H:%M")
+    times = []
+    for slot in slots:
+        if slot.get("isAvailable") and "timeOffsetMinutes" in slot:
+            times.append((base + timedelta(minutes=slot["timeOffsetMinutes"])).strftime("%H:%M"))
+    return times
+
+def check_availability_opentable_http(date, hour, minute, party_size, restref_url,
+                                      proxy_host=None, proxy_port=None, proxy_username=None, proxy_password=None,
+                                      proxy_scheme="http", availability_url=None, query_hash=None):
+    """
+    Browserless version of make_reservation_external's availability check:
+    replays the widget's availability request over the proxy session's pooled
+    keep-alive connections. Returns the same 4-tuple as the browser flow, or
+    None if the request could not be made or understood and the caller should
+    use the browser instead.
+    """
+    start = time.perf_counter()
+    requested_time = f"{hour:02d}:{minute:02d}"
+    session = get_http_session(proxy_host, proxy_port, proxy_username, proxy_password, proxy_scheme)
+    query_hash = query_hash or _availability_query_hash(session, restref_url)
+    if not query_hash:
+        logger.info("OpenTable availability query hash not available; using the browser.")
+        return None
+
+    try:
+        rid = restaurant_rid(restref_url)
+        payload = build_availability_payload(rid, date, requested_time, party_size, query_hash)
+        parts = urlsplit(restref_url)
+        headers = {
+            "Content-Type": "application/json",
+            "Accept": "application/json",
+            "Origin": f"{parts.scheme}://{parts.netloc}",
+            "Referer": restref_url,
+            "x-csrf-token": _csrf_token(session, restref_url),
+        }
+        response = session.request("POST", availability_url or OPENTABLE_AVAILABILITY_URL,
+                                   body=json.dumps(payload).encode("utf-8"), headers=headers)
+        if response.status in (401, 403):
+            # A rejected token is usually stale; fetch a new one next time.
+            with _csrf_tokens_lock:
+                _csrf_tokens.pop(_csrf_key(session, restref_url), None)
+        if response.status != 200:
+            raise AvailabilityParseError(f"availability request returned HTTP {response.status}")
+        data = json.loads(response.text())
+        if "PersistedQueryNotFound" in json.dumps(data.get("errors", [])):
+            # The widget shipped a new build; read its hash again next time.
+            _forget_query_hash(query_hash)
+        available_times = parse_available_times(data, requested_time)
+    except Exception as e:
+        logger.warning("OpenTable HTTP availability check failed after %.4f seconds, falling back to the browser: %s",
+                       time.perf_counter() - start, e)
+        return None
+
+    elapsed = time.perf_counter() - start
+    if requested_time in available_times:
+        logger.info("Exact time available (HTTP availability check, %.4f seconds).", elapsed)
+        return (True, None, None, "Exact time available but booking not attempted (make_booking is False).")
+
+    nearestTimeBeforeValue, nearestTimeAfterValue = find_nearest_times(available_times, requested_time)
+    nearestTime_string = f"Closet time before = {nearestTimeBeforeValue}, Closet time after = {nearestTimeAfterValue}"
+    logger.info("Exact time not available. %s (HTTP availability check, %.4f seconds)", nearestTime_string, elapsed)
+    return (False, None, None, f"Exact time not available. {nearestTime_string}")
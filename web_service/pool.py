@@ -0,0 +1,343 @@
+import atexit
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from config import logger
+from driver import DEFAULT_LAUNCH_PROFILE, setup_driver, quit_driver, is_driver_alive, reset_driver, should_recycle
+
+POOL_MIN_SIZE = 1            # warm idle sessions kept per proxy configuration
+POOL_MAX_SIZE = 4            # idle + checked out sessions per proxy configuration
+POOL_MAX_TOTAL = 8           # idle + checked out sessions across all configurations
+POOL_IDLE_TIMEOUT = 300      # seconds an idle session may sit before it is reaped
+POOL_CHECKOUT_TIMEOUT = 60   # seconds a checkout waits for a free slot
+POOL_REAP_INTERVAL = 30      # seconds between reaper passes
+ACQUIRE_WORKERS = 16         # background threads acquiring drivers ahead of use
+
+def pool_key(browser_url="", proxy_host=None, proxy_port=None, proxy_username=None, proxy_password=None, proxy_scheme="http",
+             launch_profile=DEFAULT_LAUNCH_PROFILE, request_allowlist=None):
+    """
+    Builds the key sessions are pooled under. Sessions are only shared between
+    requests that would have built an identical driver.
+    """
+    return (browser_url or "", proxy_scheme, proxy_host, proxy_port, proxy_username, proxy_password, launch_profile, request_allowlist)
+
+def describe_key(key):
+    """
+    Human readable form of a pool key for logging (never includes the password).
+    """
+    browser_url, proxy_scheme, proxy_host, proxy_port, proxy_username, _, launch_profile, request_allowlist = key
+    target = f"{browser_url or 'local'} [{launch_profile}{', allow ' + request_allowlist if request_allowlist else ''}]"
+    if proxy_host:
+        return f"{target} via {proxy_scheme}://{proxy_username + '@' if proxy_username else ''}{proxy_host}:{proxy_port}"
+    return f"{target} (no proxy)"
+
+class DriverPool:
+    """
+    Pool of pre-launched Chrome sessions keyed by proxy configuration.
+    Flows check a driver out instead of calling setup_driver and check it back
+    in instead of calling driver.quit(), so Chrome startup leaves the request path.
+    """
+
+    def __init__(self,
+                 min_size=POOL_MIN_SIZE,
+                 max_size=POOL_MAX_SIZE,
+                 max_total=POOL_MAX_TOTAL,
+                 idle_timeout=POOL_IDLE_TIMEOUT,
+                 checkout_timeout=POOL_CHECKOUT_TIMEOUT,
+                 reap_interval=POOL_REAP_INTERVAL):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_total = max_total
+        self.idle_timeout = idle_timeout
+        self.checkout_timeout = checkout_timeout
+        self.reap_interval = reap_interval
+        self._cond = threading.Condition()
+        self._idle = {}      # key -> deque of (driver, last_used)
+        self._in_use = {}    # key -> number of checked out (or launching) sessions
+        self._owners = {}    # id(driver) -> key
+        self._uses = {}      # id(driver) -> flows served
+        self._last_active = {}   # key -> monotonic time of its last checkout or checkin
+        self._reaper = None
+        self._closed = False
+
+    def idle_count(self, key):
+        """Returns how many warm sessions are waiting under a pool key."""
+        with self._cond:
+            return len(self._idle.get(key, ()))
+
+    def _total(self, key):
+        return len(self._idle.get(key, ())) + self._in_use.get(key, 0)
+
+    def _grand_total(self):
+        return sum(len(idle) for idle in self._idle.values()) + sum(self._in_use.values())
+
+    def _evict_other_idle(self, key):
+        # Frees a global slot by taking the longest idle session of another configuration.
+        oldest = None
+        for other, idle in self._idle.items():
+            if other != key and idle and (oldest is None or idle[0][1] < self._idle[oldest][0][1]):
+                oldest = other
+        if oldest is None:
+            return None
+        driver, _ = self._idle[oldest].popleft()
+        self._owners.pop(id(driver), None)
+        self._uses.pop(id(driver), None)
+        return oldest, driver
+
+    def _launch(self, key):
+        browser_url, proxy_scheme, proxy_host, proxy_port, proxy_username, proxy_password, launch_profile, request_allowlist = key
+        start = time.perf_counter()
+        driver = setup_driver(browser_url, proxy_host, proxy_port, proxy_username, proxy_password, proxy_scheme, launch_profile,
+                              request_allowlist=request_allowlist)
+        logger.info("Pool launched new session for %s in %.4f seconds", describe_key(key), time.perf_counter() - start)
+        return driver
+
+    def checkout(self,
+                 browser_url="",
+                 proxy_host=None,
+                 proxy_port=None,
+                 proxy_username=None,
+                 proxy_password=None,
+                 proxy_scheme="http",
+                 launch_profile=DEFAULT_LAUNCH_PROFILE,
+                 request_allowlist=None):
+        """
+        Borrows a healthy driver for the given configuration, launching one if
+        the pool has room. Blocks up to checkout_timeout when the pool is full.
+        """
+        key = pool_key(browser_url, proxy_host, proxy_port, proxy_username, proxy_password, proxy_scheme, launch_profile, request_allowlist)
+        self._ensure_reaper()
+        deadline = time.monotonic() + self.checkout_timeout
+        start = time.perf_counter()
+
+        while True:
+            driver = None
+            evicted = None
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise RuntimeError("Driver pool is closed.")
+                    idle = self._idle.get(key)
+                    if idle:
+                        driver, _ = idle.pop()
+                        break
+                    if self._total(key) < self.max_size:
+                        if self._grand_total() < self.max_total:
+                            break
+                        evicted = self._evict_other_idle(key)
+                        if evicted is not None:
+                            break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError(f"No pooled driver available for {describe_key(key)} within {self.checkout_timeout} seconds.")
+                    self._cond.wait(remaining)
+                self._in_use[key] = self._in_use.get(key, 0) + 1
+                self._last_active[key] = time.monotonic()
+
+            if evicted is not None:
+                logger.info("Pool is full; quitting idle session for %s to make room.", describe_key(evicted[0]))
+                quit_driver(evicted[1])
+
+            if driver is not None:
+                if is_driver_alive(driver):
+                    logger.info("Checked out pooled session for %s in %.4f seconds", describe_key(key), time.perf_counter() - start)
+                    return driver
+                logger.warning("Discarding unhealthy pooled session for %s", describe_key(key))
+                self._forget(driver, key)
+                quit_driver(driver)
+                continue
+
+            try:
+                driver = self._launch(key)
+            except Exception:
+                with self._cond:
+                    self._in_use[key] -= 1
+                    self._cond.notify_all()
+                raise
+            with self._cond:
+                self._owners[id(driver)] = key
+            return driver
+
+    def checkin(self, driver, discard=False):
+        """
+        Returns a driver to the pool. Broken drivers (or discard=True) are quit
+        and their slot freed instead of being reused.
+        """
+        with self._cond:
+            key = self._owners.get(id(driver))
+        if key is None:
+            logger.warning("Checked in a driver the pool does not own; quitting it.")
+            quit_driver(driver)
+            return
+
+        if not discard:
+            try:
+                with self._cond:
+                    uses = self._uses.get(id(driver), 0) + 1
+                    self._uses[id(driver)] = uses
+                if should_recycle(driver, uses):
+                    discard = True
+                else:
+                    reset_driver(driver)
+            except Exception as e:
+                logger.warning("Failed to reset pooled session: %s", e)
+                discard = True
+
+        if discard:
+            self._forget(driver, key)
+            quit_driver(driver)
+            return
+
+        with self._cond:
+            self._in_use[key] -= 1
+            self._last_active[key] = time.monotonic()
+            if self._closed:
+                self._owners.pop(id(driver), None)
+                self._uses.pop(id(driver), None)
+            else:
+                self._idle.setdefault(key, deque()).append((driver, time.monotonic()))
+                self._cond.notify_all()
+                driver = None
+        if driver is not None:
+            quit_driver(driver)
+        else:
+            logger.info("Session for %s returned to pool.", describe_key(key))
+
+    def _forget(self, driver, key):
+        with self._cond:
+            self._owners.pop(id(driver), None)
+            self._uses.pop(id(driver), None)
+            self._in_use[key] -= 1
+            self._cond.notify_all()
+
+    def warm(self, count=None, **setup_kwargs):
+        """
+        Pre-launches idle sessions for a configuration so the first request
+        does not pay for Chrome startup.
+        """
+        key = pool_key(**setup_kwargs)
+        count = self.min_size if count is None else count
+        self._ensure_reaper()
+        with self._cond:
+            self._last_active[key] = time.monotonic()
+        self._top_up(key, count)
+
+    def _top_up(self, key, target):
+        while True:
+            with self._cond:
+                if (self._closed or len(self._idle.get(key, ())) >= target or self._total(key) >= self.max_size
+                        or self._grand_total() >= self.max_total):
+                    return
+                self._in_use[key] = self._in_use.get(key, 0) + 1
+            try:
+                driver = self._launch(key)
+            except Exception as e:
+                logger.error("Pool failed to pre-launch session for %s: %s", describe_key(key), e)
+                with self._cond:
+                    self._in_use[key] -= 1
+                    self._cond.notify_all()
+                return
+            with self._cond:
+                self._in_use[key] -= 1
+                if self._closed:
+                    self._cond.notify_all()
+                else:
+                    self._owners[id(driver)] = key
+                    self._idle.setdefault(key, deque()).append((driver, time.monotonic()))
+                    self._cond.notify_all()
+                    driver = None
+            if driver is not None:
+                quit_driver(driver)
+                return
+
+    def _ensure_reaper(self):
+        with self._cond:
+            if self._reaper is not None or self._closed:
+                return
+            self._reaper = threading.Thread(target=self._reap_loop, name="driver-pool-reaper", daemon=True)
+            self._reaper.start()
+
+    def _reap_loop(self):
+        while True:
+            time.sleep(self.reap_interval)
+            if self._closed:
+                return
+            try:
+                self.reap()
+            except Exception as e:
+                logger.error("Driver pool reaper failed: %s", e, exc_info=True)
+
+    def reap(self):
+        """
+        Quits sessions idle longer than idle_timeout, keeping min_size warm for
+        configurations used within idle_timeout. A configuration with nothing
+        checked out and no use for idle_timeout is dropped entirely, so each
+        proxy identity ever seen does not keep a Chrome alive.
+        """
+        expired = []
+        active = []
+        now = time.monotonic()
+        with self._cond:
+            for key in list(set(self._idle) | set(self._last_active)):
+                idle = self._idle.get(key, deque())
+                dormant = not self._in_use.get(key) and now - self._last_active.get(key, 0) > self.idle_timeout
+                keep = 0 if dormant else self.min_size
+                while len(idle) > keep and now - idle[0][1] > self.idle_timeout:
+                    driver, _ = idle.popleft()
+                    self._owners.pop(id(driver), None)
+                    self._uses.pop(id(driver), None)
+                    expired.append((key, driver))
+                if dormant and not idle:
+                    self._idle.pop(key, None)
+                    self._in_use.pop(key, None)
+                    self._last_active.pop(key, None)
+                elif not dormant:
+                    active.append(key)
+        for key, driver in expired:
+            logger.info("Reaping idle session for %s", describe_key(key))
+            quit_driver(driver)
+        for key in active:
+            self._top_up(key, self.min_size)
+
+    def close(self):
+        """
+        Quits every idle session. Checked out sessions are quit on checkin.
+        """
+        with self._cond:
+            self._closed = True
+            idle = [driver for drivers in self._idle.values() for driver, _ in drivers]
+            self._idle.clear()
+            for driver in idle:
+                self._owners.pop(id(driver), None)
+                self._uses.pop(id(driver), None)
+            self._cond.notify_all()
+        for driver in idle:
+            quit_driver(driver)
+
+_acquire_executor = ThreadPoolExecutor(max_workers=ACQUIRE_WORKERS, thread_name_prefix="driver-acquire")
+
+def acquire_async(pool, *args, **kwargs):
+    """
+    Starts pool.checkout(*args, **kwargs) in the background so browser startup
+    overlaps with request validation. Returns a Future of the driver.
+    """
+    return _acquire_executor.submit(pool.checkout, *args, **kwargs)
+
+def abandon_acquire(pool, future):
+    """
+    Gives up on a driver started with acquire_async: cancels the checkout if it
+    has not started, otherwise checks the driver back in once it arrives.
+    """
+    if future.cancel():
+        return
+
+    def _return_driver(done):
+        if done.cancelled() or done.exception() is not None:
+            return
+        pool.checkin(done.result())
+
+    future.add_done_callback(_return_driver)
+
+driver_pool = DriverPool()
+atexit.register(driver_pool.close)
@@ -0,0 +1,233 @@
+import atexit
+import collections
+import importlib
+import itertools
+import multiprocessing
+import pickle
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing.connection import wait
+from multiprocessing.reduction import ForkingPickler
+from config import logger
+from procs import kill_tree
+
+PROCESS_POOL_WORKERS = 4        # worker processes, each with its own driver pool
+PROCESS_FLOW_TIMEOUT = 180      # wall-clock seconds before a flow's worker is killed
+PROCESS_MAX_REQUEUES = 1        # times availability work is retried after its worker died
+SUPERVISOR_POLL = 0.5           # seconds between supervisor checks
+
+# Flows a worker can run, by name: (module, function).
+FLOWS = {
+    "make_reservation": ("reservation", "make_reservation"),
+    "cancel_reservation": ("cancellation", "cancel_reservation"),
+    "make_reservation_external": ("working_oxylabs_all_meal", "make_reservation_external"),
+    "cancel_reservation_external": ("working_oxylabs_all_meal", "cancel_reservation"),
+}
+# Flows that only read availability unless make_booking is set, and so are safe to run twice.
+REQUEUEABLE_FLOWS = {"make_reservation", "make_reservation_external"}
+
+class WorkerCrashed(Exception):
+    """
+    Raised for a flow whose worker process died or was killed and which was
+    not re-queued (bookings and cancellations are never run twice).
+    """
+
+def _worker_main(conn):
+    # Runs in the child: one flow at a time, results back over the pipe.
+    flows = {}
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            return
+        if message is None:
+            return
+        job_id, name, kwargs = message
+        try:
+            if name not in flows:
+                module_name, function_name = FLOWS[name]
+                flows[name] = getattr(importlib.import_module(module_name), function_name)
+            conn.send((job_id, True, flows[name](**kwargs)))
+        except Exception as e:
+            logger.exception("Flow %s failed in worker process", name)
+            conn.send((job_id, False, _portable_exception(e)))
+
+def _portable_exception(e):
+    # The caller gets the flow's own exception; one that does not survive pickling becomes a RuntimeError naming its type.
+    try:
+        pickle.loads(pickle.dumps(e))
+        return e
+    except Exception:
+        return RuntimeError(f"{type(e).__name__}: {e}")
+
+class _Job:
+    def __init__(self, job_id, name, kwargs, timeout):
+        self.id = job_id
+        self.name = name
+        self.kwargs = kwargs
+        self.timeout = timeout
+        self.future = Future()
+        self.requeues = 0
+        self.deadline = None
+
+    def requeueable(self):
+        return self.name in REQUEUEABLE_FLOWS and not self.kwargs.get("make_booking", False) and self.requeues < PROCESS_MAX_REQUEUES
+
+class _Worker:
+    def __init__(self, context, index):
+        self.index = index
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn,), name=f"flow-worker-{index}", daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.job = None
+        logger.info("Started flow worker %d (pid %d).", index, self.process.pid)
+
+class FlowProcessPool:
+    """
+    Runs flows in pre-started worker processes, so a wedged chromedriver or a
+    crashed Chrome only takes down one worker. A supervisor thread enforces
+    the wall-clock limit by killing the worker's whole process tree, replaces
+    dead workers, and re-queues availability checks that were lost with them.
+    """
+
+    def __init__(self, workers=PROCESS_POOL_WORKERS, flow_timeout=PROCESS_FLOW_TIMEOUT):
+        methods = multiprocessing.get_all_start_methods()
+        # forkserver/spawn children do not inherit the parent's threads or drivers.
+        self._context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+        self.flow_timeout = flow_timeout
+        self._cond = threading.Condition()
+        self._pending = collections.deque()
+        self._ids = itertools.count(1)
+        self._closed = False
+        self._workers = [_Worker(self._context, i) for i in range(workers)]
+        self._supervisor = threading.Thread(target=self._supervise, name="flow-supervisor", daemon=True)
+        self._supervisor.start()
+
+    def submit(self, flow, timeout=None, **kwargs):
+        """
+        Queues a flow (a FLOWS name) with keyword arguments and returns a
+        Future for its result. timeout overrides the pool's wall-clock limit.
+        """
+        if flow not in FLOWS:
+            raise ValueError(f"Unknown flow '{flow}'. Expected one of {sorted(FLOWS)}.")
+        job = _Job(next(self._ids), flow, kwargs, timeout or self.flow_timeout)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Flow process pool is closed.")
+            self._pending.append(job)
+            self._cond.notify_all()
+        return job.future
+
+    def run(self, flow, timeout=None, **kwargs):
+        return self.submit(flow, timeout=timeout, **kwargs).result()
+
+    def _dispatch(self):
+        with self._cond:
+            for worker in self._workers:
+                if not self._pending:
+                    break
+                if worker.job is None:
+                    job = self._pending.popleft()
+                    try:
+                        message = ForkingPickler.dumps((job.id, job.name, job.kwargs))
+                    except Exception as e:
+                        # Arguments that cannot cross the pipe fail the job, not the worker.
+                        job.future.set_exception(e)
+                        continue
+                    try:
+                        worker.conn.send_bytes(message)
+                    except Exception as e:
+                        self._pending.appendleft(job)
+                        self._replace(worker, f"send failed: {e}")
+                        continue
+                    job.deadline = time.monotonic() + job.timeout
+                    worker.job = job
+
+    def _replace(self, worker, reason):
+        # Kills what is left of a worker, settles its job and starts a fresh process in its place.
+        kill_tree(worker.process.pid, grace=1.0)
+        worker.process.join(1.0)
+        worker.conn.close()
+        job, worker.job = worker.job, None
+        if job is not None:
+            if job.requeueable():
+                job.requeues += 1
+                logger.warning("Re-queuing %s (job %d) after worker %d failed: %s", job.name, job.id, worker.index, reason)
+                with self._cond:
+                    self._pending.appendleft(job)
+            elif reason.startswith("timed out"):
+                job.future.set_exception(TimeoutError(f"{job.name} {reason}"))
+            else:
+                job.future.set_exception(WorkerCrashed(f"{job.name}: {reason}"))
+        if not self._closed:
+            self._workers[worker.index] = _Worker(self._context, worker.index)
+        logger.warning("Replaced flow worker %d: %s", worker.index, reason)
+
+    def _supervise(self):
+        while True:
+            with self._cond:
+                if self._closed:
+                    return
+                if not self._pending and not any(w.job for w in self._workers):
+                    self._cond.wait(SUPERVISOR_POLL)
+                    continue
+            try:
+                self._dispatch()
+                busy = {w.conn: w for w in self._workers if w.job is not None}
+                for conn in wait(list(busy), timeout=SUPERVISOR_POLL):
+                    worker = busy[conn]
+                    try:
+                        job_id, ok, value = conn.recv()
+                    except (EOFError, OSError):
+                        self._replace(worker, "worker process died")
+                        continue
+                    job, worker.job = worker.job, None
+                    if ok:
+                        job.future.set_result(value)
+                    else:
+                        job.future.set_exception(value)
+                now = time.monotonic()
+                for worker in list(self._workers):
+                    if worker.job is not None and now > worker.job.deadline:
+                        self._replace(worker, f"timed out after {worker.job.timeout} seconds")
+                    elif not worker.process.is_alive():
+                        self._replace(worker, f"worker process exited with code {worker.process.exitcode}")
+            except Exception as e:
+                logger.error("Flow supervisor error: %s", e, exc_info=True)
+
+    def close(self):
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            pending, self._pending = list(self._pending), collections.deque()
+            self._cond.notify_all()
+        for job in pending:
+            job.future.set_exception(RuntimeError("Flow process pool closed."))
+        for worker in self._workers:
+            try:
+                worker.conn.send(None)
+            except (OSError, ValueError):
+                pass
+        for worker in self._workers:
+            worker.process.join(5)
+            if worker.process.is_alive():
+                kill_tree(worker.process.pid)
+            if worker.job is not None and not worker.job.future.done():
+                worker.job.future.set_exception(RuntimeError("Flow process pool closed."))
+
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+def get_process_pool():
+    """
+    Returns the shared FlowProcessPool, starting its workers on first use.
+    """
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            _process_pool = FlowProcessPool()
+            atexit.register(_process_pool.close)
+        return _process_pool
@@ -0,0 +1,192 @@
+import os
+import signal
+import threading
+import time
+from config import logger
+
+PROC_DIR = "/proc"
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+# Local Chrome instances are launched with OWNER_SWITCH=<tag> (Chrome ignores
+# unknown switches) so orphan cleanup only touches browsers this service started.
+# The tag is set by the first process and inherited by worker processes, so a
+# supervisor also reaps browsers left behind by its dead workers.
+OWNER_ENV = "RESERVATION_BROWSER_OWNER"
+OWNER_SWITCH = "--reservation-browser-owner"
+
+def list_pids():
+    """
+    Returns the pids of all running processes (empty where /proc is unavailable).
+    """
+    try:
+        return [int(name) for name in os.listdir(PROC_DIR) if name.isdigit()]
+    except OSError:
+        return []
+
+def parent_pid(pid):
+    """
+    Returns the parent pid of a process, or None if it has exited.
+    """
+    try:
+        with open(os.path.join(PROC_DIR, str(pid), "stat"), "rb") as f:
+            stat = f.read().decode("utf-8", "replace")
+        # The command name may contain spaces and parentheses, so split after the last ')'
+        return int(stat.rsplit(")", 1)[1].split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+
+def process_cmdline(pid):
+    """
+    Returns the argument list of a process, or an empty list if it has exited.
+    """
+    try:
+        with open(os.path.join(PROC_DIR, str(pid), "cmdline"), "rb") as f:
+            return [arg.decode("utf-8", "replace") for arg in f.read().split(b"\0") if arg]
+    except OSError:
+        return []
+
+def process_rss(pid):
+    """
+    Returns the resident set size of a process in bytes (0 if it has exited).
+    """
+    try:
+        with open(os.path.join(PROC_DIR, str(pid), "statm"), "rb") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return 0
+
+def process_age(pid):
+    """
+    Returns how many seconds ago a process started, or None if it has exited.
+    """
+    try:
+        with open(os.path.join(PROC_DIR, str(pid), "stat"), "rb") as f:
+            stat = f.read().decode("utf-8", "replace")
+        start_ticks = int(stat.rsplit(")", 1)[1].split()[19])
+        with open(os.path.join(PROC_DIR, "uptime"), "rb") as f:
+            uptime = float(f.read().split()[0])
+        return uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, IndexError, ValueError):
+        return None
+
+def process_tree(root_pid):
+    """
+    Returns root_pid and all of its descendants.
+    """
+    children = {}
+    for pid in list_pids():
+        ppid = parent_pid(pid)
+        if ppid is not None:
+            children.setdefault(ppid, []).append(pid)
+    tree = []
+    stack = [root_pid]
+    while stack:
+        pid = stack.pop()
+        tree.append(pid)
+        stack.extend(children.get(pid, ()))
+    return tree
+
+def tree_rss(root_pid, cmdline_filter=None):
+    """
+    Sums the RSS of a process tree. If cmdline_filter is given, only processes
+    with that argument in their command line (e.g. '--type=renderer') count.
+    """
+    total = 0
+    for pid in process_tree(root_pid):
+        if cmdline_filter and cmdline_filter not in process_cmdline(pid):
+            continue
+        total += process_rss(pid)
+    return total
+
+def driver_service_pid(driver):
+    """
+    Returns the chromedriver pid of a local driver, or None for remote sessions.
+    """
+    try:
+        return driver.service.process.pid
+    except AttributeError:
+        return None
+    except Exception as e:
+        logger.warning("Could not determine chromedriver pid: %s", e)
+        return None
+
+_owned_pids = set()   # chromedriver pids of sessions this process has not quit yet
+_owned_pids_lock = threading.Lock()
+
+def register_owned_pid(pid):
+    """
+    Records a chromedriver pid as belonging to a live session of this process.
+    """
+    if pid:
+        with _owned_pids_lock:
+            _owned_pids.add(pid)
+
+def unregister_owned_pid(pid):
+    with _owned_pids_lock:
+        _owned_pids.discard(pid)
+
+def owned_pids():
+    with _owned_pids_lock:
+        return set(_owned_pids)
+
+def browser_owner_argument():
+    """
+    Returns the Chrome argument that marks a browser as launched by this service.
+    """
+    return f"{OWNER_SWITCH}={os.environ.setdefault(OWNER_ENV, str(os.getpid()))}"
+
+def kill_tree(root_pid, grace=3.0):
+    """
+    Terminates a process and all of its descendants: SIGTERM first, SIGKILL for
+    anything still alive after `grace` seconds. Returns the pids signalled.
+    """
+    pids = process_tree(root_pid)
+    for pid in pids:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except (ProcessLookupError, PermissionError):
+            pass
+    deadline = time.monotonic() + grace
+    while time.monotonic() < deadline and any(parent_pid(pid) is not None for pid in pids):
+        time.sleep(0.1)
+    for pid in pids:
+        if parent_pid(pid) is not None:
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except (ProcessLookupError, PermissionError):
+                pass
+    return pids
+
+def find_orphaned_browser_trees(min_age=120):
+    """
+    Returns root pids of browser process trees nobody will ever quit:
+    chromedriver processes started by this process that no live session owns,
+    and Chrome processes marked with this service's browser_owner_argument()
+    whose chromedriver is gone (re-parented to init). Browsers of other
+    services and users on the host are never returned. Processes younger than min_age seconds are skipped so a driver that is
+    still starting up is never mistaken for an orphan.
+    """
+    me = os.getpid()
+    uid = os.getuid()
+    owned = owned_pids()
+    owner_argument = browser_owner_argument()
+    orphans = []
+    for pid in list_pids():
+        cmdline = process_cmdline(pid)
+        if not cmdline:
+            continue
+        try:
+            if os.stat(os.path.join(PROC_DIR, str(pid))).st_uid != uid:
+                continue
+        except OSError:
+            continue
+        age = process_age(pid)
+        if age is None or age < min_age:
+            continue
+        ppid = parent_pid(pid)
+        executable = os.path.basename(cmdline[0])
+        if "chromedriver" in executable and ppid == me and pid not in owned:
+            orphans.append(pid)
+        elif ppid == 1 and owner_argument in cmdline and not any(arg.startswith("--type=") for arg in cmdline):
+            orphans.append(pid)
+    return orphans
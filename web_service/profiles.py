@@ -0,0 +1,175 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from selenium import webdriver
+from config import logger
+from procs import browser_owner_argument
+
+# tmpfs keeps template clones in memory; fall back to the regular temp dir elsewhere.
+PROFILE_ROOT = os.path.join("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(), "chrome_profiles")
+TEMPLATE_READY_MARKER = ".template_ready"   # its mtime is the template's last use
+EXTENSION_DIR_NAME = "proxy_extension"
+PROFILE_TEMPLATE_MAX_AGE = 3 * 24 * 3600     # seconds since last use before a template is removed
+PROFILE_TEMPLATE_GC_INTERVAL = 600           # seconds between garbage collection passes
+
+SKIPPED_FILES = {"SingletonLock", "SingletonSocket", "SingletonCookie", "lockfile", TEMPLATE_READY_MARKER}
+
+_template_locks = {}
+_template_locks_guard = threading.Lock()
+_template_last_gc = 0.0
+
+def template_key(launch_arguments, prefs):
+    """
+    Hash of everything that ends up in a template, so a changed flag or pref
+    builds a new template instead of reusing a stale one. Templates never hold
+    the proxy extension or its credentials; clone_profile writes those.
+    """
+    payload = json.dumps({"arguments": list(launch_arguments), "prefs": prefs}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+def _template_lock(key):
+    with _template_locks_guard:
+        return _template_locks.setdefault(key, threading.Lock())
+
+def _touch_template(template_dir):
+    # Marks the template as used now; False if it is missing or was just collected.
+    try:
+        os.utime(os.path.join(template_dir, TEMPLATE_READY_MARKER))
+        return True
+    except FileNotFoundError:
+        return False
+
+def get_profile_template(launch_arguments, prefs):
+    """
+    Returns the path of a warmed Chrome user-data-dir for this configuration,
+    building it on first use: Chrome is started once against the directory so
+    first-run state and prefs are written, then quit.
+    """
+    key = template_key(launch_arguments, prefs)
+    template_dir = os.path.join(PROFILE_ROOT, f"template_{key}")
+    if _touch_template(template_dir):
+        return template_dir
+
+    with _template_lock(key):
+        if _touch_template(template_dir):
+            return template_dir
+
+        start = time.perf_counter()
+        os.makedirs(PROFILE_ROOT, mode=0o700, exist_ok=True)
+        build_dir = tempfile.mkdtemp(prefix=f"building_{key}_", dir=PROFILE_ROOT)
+        try:
+            options = webdriver.ChromeOptions()
+            for argument in launch_arguments:
+                options.add_argument(argument)
+            options.add_argument(f"--user-data-dir={build_dir}")
+            options.add_argument(browser_owner_argument())
+            options.add_experimental_option("prefs", prefs)
+
+            driver = webdriver.Chrome(options=options)
+            try:
+                driver.get("about:blank")
+            finally:
+                driver.quit()
+
+            open(os.path.join(build_dir, TEMPLATE_READY_MARKER), "w").close()
+            try:
+                os.rename(build_dir, template_dir)
+            except OSError:
+                # Another process finished the same template first; use theirs.
+                shutil.rmtree(build_dir, ignore_errors=True)
+        except Exception:
+            shutil.rmtree(build_dir, ignore_errors=True)
+            raise
+
+        logger.info("Built Chrome profile template %s in %.4f seconds", template_dir, time.perf_counter() - start)
+    _maybe_collect_profile_templates()
+    return template_dir
+
+def collect_profile_templates(max_age=PROFILE_TEMPLATE_MAX_AGE):
+    """
+    Removes profile templates unused for longer than max_age, so templates of
+    retired flags or prefs do not pile up in PROFILE_ROOT, and any template
+    that still carries a proxy extension.
+    """
+    try:
+        names = os.listdir(PROFILE_ROOT)
+    except FileNotFoundError:
+        return 0
+
+    now = time.time()
+    removed = 0
+    for name in names:
+        if not name.startswith("template_"):
+            continue
+        template_dir = os.path.join(PROFILE_ROOT, name)
+        try:
+            last_used = os.stat(os.path.join(template_dir, TEMPLATE_READY_MARKER)).st_mtime
+        except FileNotFoundError:
+            continue
+        # Templates built before credentials moved into the clones still hold them.
+        if now - last_used <= max_age and not os.path.isdir(os.path.join(template_dir, EXTENSION_DIR_NAME)):
+            continue
+        # Renamed first so no new clone starts from a half-deleted template.
+        retired_dir = os.path.join(PROFILE_ROOT, f"retired_{name}_{os.getpid()}")
+        try:
+            os.rename(template_dir, retired_dir)
+        except OSError:
+            continue
+        shutil.rmtree(retired_dir, ignore_errors=True)
+        removed += 1
+
+    if removed:
+        logger.info("Removed %d unused Chrome profile template(s) from %s", removed, PROFILE_ROOT)
+    return removed
+
+def _maybe_collect_profile_templates():
+    global _template_last_gc
+    with _template_locks_guard:
+        now = time.monotonic()
+        if _template_last_gc and now - _template_last_gc < PROFILE_TEMPLATE_GC_INTERVAL:
+            return
+        _template_last_gc = now
+    collect_profile_templates()
+
+def clone_profile(template_dir, extension_files=None):
+    """
+    Makes a per-session copy of a profile template. With extension_files the
+    rendered proxy extension is written into the copy's EXTENSION_DIR_NAME,
+    readable by the owner only. Returns the new user-data-dir.
+    """
+    start = time.perf_counter()
+    clone_dir = tempfile.mkdtemp(prefix="session_", dir=PROFILE_ROOT)
+    try:
+        for root, dirs, files in os.walk(template_dir):
+            relative = os.path.relpath(root, template_dir)
+            target_root = clone_dir if relative == "." else os.path.join(clone_dir, relative)
+            os.makedirs(target_root, exist_ok=True)
+            for name in files:
+                if name in SKIPPED_FILES:
+                    continue
+                source = os.path.join(root, name)
+                if os.path.islink(source):
+                    continue
+                shutil.copy2(source, os.path.join(target_root, name))
+        if extension_files:
+            extension_dir = os.path.join(clone_dir, EXTENSION_DIR_NAME)
+            os.makedirs(extension_dir, mode=0o700)
+            for name, content in extension_files.items():
+                fd = os.open(os.path.join(extension_dir, name), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+                with os.fdopen(fd, "w") as f:
+                    f.write(content)
+    except Exception:
+        shutil.rmtree(clone_dir, ignore_errors=True)
+        raise
+    logger.info("Cloned Chrome profile template into %s in %.4f seconds", clone_dir, time.perf_counter() - start)
+    return clone_dir
+
+def remove_profile(profile_dir):
+    """
+    Deletes a session's cloned user-data-dir.
+    """
+    shutil.rmtree(profile_dir, ignore_errors=True)
@@ -0,0 +1,224 @@
+import base64
+import gzip
+import json
+import os
+import time
+import re
+import uuid
+from urllib.parse import parse_qsl, urlencode
+from config import logger
+from network import drain_network_events
+
+RECORDINGS_DIR = "recordings"                      # archives go here, next to app.log
+RECORD_BODY_TYPES = {"XHR", "Fetch", "Document"}   # resource types whose response bodies are kept
+RECORD_MAX_BODY_BYTES = 2 * 1024 * 1024            # larger bodies are recorded without content
+REDACTED_HEADERS = {"cookie", "set-cookie", "authorization", "proxy-authorization"}
+# Guest details in request bodies, matched on the field name lower-cased with
+# separators removed (first_name, firstName and first-name all match).
+REDACTED_FIELDS = {
+    "firstname", "lastname", "fullname", "name", "guestname",
+    "email", "emailaddress", "phone", "phonenumber", "mobile", "mobilenumber", "telephone",
+    "specialrequests", "notes", "cardnumber", "creditcard", "cvv", "cvc",
+}
+
+def _redact(headers):
+    return {name: ("<redacted>" if name.lower() in REDACTED_HEADERS else value) for name, value in (headers or {}).items()}
+
+def _pii_field(name):
+    return re.sub(r"[^a-z0-9]", "", str(name).lower()) in REDACTED_FIELDS
+
+def _redact_json(value):
+    if isinstance(value, dict):
+        return {key: ("<redacted>" if _pii_field(key) else _redact_json(item)) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_redact_json(item) for item in value]
+    return value
+
+def _redact_post_data(post_data, headers):
+    """
+    Returns a request body with guest details replaced by '<redacted>'. JSON
+    and form-encoded bodies keep their other fields; any other body is dropped.
+    """
+    if not post_data:
+        return post_data
+    content_type = next((value for name, value in (headers or {}).items() if name.lower() == "content-type"), "").lower()
+    if "json" in content_type or post_data.lstrip().startswith(("{", "[")):
+        try:
+            return json.dumps(_redact_json(json.loads(post_data)), separators=(",", ":"))
+        except ValueError:
+            pass
+    if "x-www-form-urlencoded" in content_type or (not content_type and "=" in post_data):
+        fields = parse_qsl(post_data, keep_blank_values=True)
+        if fields:
+            return urlencode([(name, "<redacted>" if _pii_field(name) else value) for name, value in fields])
+    return "<redacted>"
+
+class NetworkRecorder:
+    """
+    Archives the requests and responses of one flow: URL, method, headers,
+    the request body with guest details redacted, CDP timing, status and
+    (for XHR/fetch/document) the response body.
+    Records are appended to a gzip JSON-lines file and index.json maps each
+    flow step to its range of records.
+    """
+
+    def __init__(self, flow, root=RECORDINGS_DIR):
+        self.flow = flow
+        self.path = os.path.join(root, f"{time.strftime('%Y%m%d-%H%M%S')}-{flow}-{uuid.uuid4().hex[:8]}")
+        os.makedirs(self.path, exist_ok=True)
+        self._archive = gzip.open(os.path.join(self.path, "requests.jsonl.gz"), "wt", encoding="utf-8")
+        self._open = {}      # CDP requestId -> record still waiting for its response
+        self._done = []      # finished records not yet assigned to a step
+        self._written = 0
+        self._step_started = time.time()
+        self.steps = []
+
+    def observe(self, driver, events):
+        """
+        Folds a batch of CDP Network events into records.
+        """
+        for event in events:
+            method = event.get("method")
+            params = event.get("params", {})
+            request_id = params.get("requestId")
+            if method == "Network.requestWillBeSent":
+                previous = self._open.pop(request_id, None)
+                if previous is not None and params.get("redirectResponse"):
+                    self._set_response(previous, params["redirectResponse"])
+                    self._done.append(previous)
+                request = params.get("request", {})
+                self._open[request_id] = {
+                    "request_id": request_id,
+                    "type": params.get("type"),
+                    "url": request.get("url"),
+                    "method": request.get("method"),
+                    "request_headers": _redact(request.get("headers")),
+                    "post_data": _redact_post_data(request.get("postData"), request.get("headers")),
+                    "wall_time": params.get("wallTime"),
+                    "started": params.get("timestamp"),
+                }
+            elif method == "Network.responseReceived" and request_id in self._open:
+                self._set_response(self._open[request_id], params.get("response", {}))
+            elif method == "Network.loadingFinished" and request_id in self._open:
+                record = self._open.pop(request_id)
+                record["encoded_bytes"] = params.get("encodedDataLength")
+                record["duration"] = self._duration(record, params)
+                if record.get("type") in RECORD_BODY_TYPES:
+                    self._fetch_body(driver, record)
+                self._done.append(record)
+            elif method == "Network.loadingFailed" and request_id in self._open:
+                record = self._open.pop(request_id)
+                record["error"] = params.get("errorText") or params.get("blockedReason")
+                record["duration"] = self._duration(record, params)
+                self._done.append(record)
+
+    @staticmethod
+    def _set_response(record, response):
+        record["status"] = response.get("status")
+        record["response_headers"] = _redact(response.get("headers"))
+        record["mime_type"] = response.get("mimeType")
+        record["timing"] = response.get("timing")
+
+    @staticmethod
+    def _duration(record, params):
+        if record.get("started") is None or params.get("timestamp") is None:
+            return None
+        return params["timestamp"] - record["started"]
+
+    @staticmethod
+    def _fetch_body(driver, record):
+        if (record.get("encoded_bytes") or 0) > RECORD_MAX_BODY_BYTES:
+            record["body_skipped"] = "too large"
+            return
+        try:
+            result = driver.execute_cdp_cmd("Network.getResponseBody", {"requestId": record["request_id"]})
+        except Exception as e:
+            # The renderer only keeps bodies for a while; a miss is recorded rather than fatal.
+            record["body_skipped"] = str(e).splitlines()[0] if str(e) else "unavailable"
+            return
+        record["body"] = result.get("body")
+        record["base64_encoded"] = result.get("base64Encoded", False)
+
+    def mark_step(self, driver, name, final=False):
+        """
+        Labels every request finished since the previous step as `name` and
+        writes them out. With final, requests still in flight are written too.
+        """
+        events = drain_network_events(driver)
+        # Keep the drained events for the flow's network summary.
+        driver.network_event_backlog = events
+        records = self._done
+        self._done = []
+        if final:
+            records.extend(self._open.values())
+            self._open.clear()
+        first = self._written
+        for record in records:
+            record["step"] = name
+            self._archive.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self._written += len(records)
+        ended = time.time()
+        self.steps.append({"name": name, "first_record": first, "records": len(records),
+                           "started": self._step_started, "ended": ended})
+        self._step_started = ended
+
+    def close(self, driver):
+        self.mark_step(driver, "end", final=True)
+        self._archive.close()
+        with open(os.path.join(self.path, "index.json"), "w", encoding="utf-8") as f:
+            json.dump({"flow": self.flow, "records": self._written, "steps": self.steps}, f, indent=2)
+        logger.info("Recorded %d requests for %s in %s", self._written, self.flow, self.path)
+
+def start_recording(driver, flow):
+    """
+    Attaches a NetworkRecorder to a driver for the duration of one flow.
+    """
+    drain_network_events(driver)   # drop traffic from before the flow started
+    driver.network_recorder = NetworkRecorder(flow)
+    return driver.network_recorder
+
+def record_step(driver, name):
+    """
+    Marks the end of a flow step in the driver's recording. Does nothing when
+    the flow is not being recorded.
+    """
+    recorder = getattr(driver, "network_recorder", None)
+    if recorder is None:
+        return
+    try:
+        recorder.mark_step(driver, name)
+    except Exception as e:
+        logger.warning("Failed to record network step '%s': %s", name, e)
+
+def stop_recording(driver):
+    """
+    Writes out the rest of the recording and detaches the recorder.
+    """
+    recorder = getattr(driver, "network_recorder", None)
+    if recorder is None:
+        return
+    try:
+        recorder.close(driver)
+    except Exception as e:
+        logger.warning("Failed to finish network recording in %s: %s", recorder.path, e)
+    finally:
+        driver.network_recorder = None
+
+def load_recording(path):
+    """
+    Reads an archive back as (index, records). Text bodies the browser
+    returned base64 encoded are decoded; binary bodies are left as they are.
+    """
+    with open(os.path.join(path, "index.json"), encoding="utf-8") as f:
+        index = json.load(f)
+    records = []
+    with gzip.open(os.path.join(path, "requests.jsonl.gz"), "rt", encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            mime_type = record.get("mime_type") or ""
+            is_text = mime_type.startswith("text/") or any(kind in mime_type for kind in ("json", "javascript", "xml"))
+            if record.get("base64_encoded") and record.get("body") is not None and is_text:
+                record["body"] = base64.b64decode(record["body"]).decode("utf-8", "replace")
+                record["base64_encoded"] = False
+            records.append(record)
+    return index, records
@@ -1,7 +1,6 @@
 import time
 from datetime import datetime
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, NoSuchElementException, InvalidElementStateException
 from selenium.webdriver.common.keys import Keys
@@ -11,9 +10,22 @@ from utils import (
     find_elements_with_timing,
     convert_to_am_pm,
     validate_date,
-    validate_reservation_date
+    validate_reservation_date,
+    select_time_slot,
+    format_alternatives,
+    CancellableWait
 )
-from driver import setup_driver
+from driver import DEFAULT_LAUNCH_PROFILE, set_browser_cookies
+from lifecycle import driver_session, DriverUnavailable
+from pool import driver_pool, pool_key, acquire_async, abandon_acquire
+from contexts import context_pool
+from yelp_http import check_availability_http
+from http_client import get_http_session, cookies_for_cdp
+from recorder import record_step
+from cookie_jar import jar_identity, capture_session_state
+from cache import cached_availability
+from capabilities import precheck, learn_date, learn_party_size
+from hedging import hedged
 
 def receiving_reservation(driver_local, first_name_local, last_name_local, mobil_number_local, email_local, special_requests_local=None):
     overall_start = time.perf_counter()
@@ -21,11 +33,12 @@ def receiving_reservation(driver_local, first_name_local, last_name_local, mobil
 
     try:
         start = time.perf_counter()
-        WebDriverWait(driver_local, 10).until(
+        CancellableWait(driver_local, 10).until(
             EC.visibility_of_element_located((By.XPATH, "//h5[contains(text(), 'Your Information')]"))
         )
         elapsed = time.perf_counter() - start
         logger.info("Reservation form loaded in %.4f seconds", elapsed)
+        record_step(driver_local, "reservation_form")
     except TimeoutException:
         msg = "Reservation form did not load in time."
         logger.error(msg)
@@ -72,7 +85,7 @@ def receiving_reservation(driver_local, first_name_local, last_name_local, mobil
 
     for field, error_xpath in error_messages.items():
         try:
-            error_elements = WebDriverWait(driver_local, 1).until(
+            error_elements = CancellableWait(driver_local, 1).until(
                 EC.presence_of_all_elements_located((By.XPATH, error_xpath))
             )
             for error_element in error_elements:
@@ -97,7 +110,7 @@ def receiving_reservation(driver_local, first_name_local, last_name_local, mobil
 
     try:
         start = time.perf_counter()
-        confirm_box = WebDriverWait(driver_local, 10).until(
+        confirm_box = CancellableWait(driver_local, 10).until(
             EC.element_to_be_clickable((By.XPATH, "//button[@data-button='true' and .//span[normalize-space()='Confirm']]"))
         )
         elapsed = time.perf_counter() - start
@@ -113,7 +126,7 @@ def receiving_reservation(driver_local, first_name_local, last_name_local, mobil
 
     try:
         start = time.perf_counter()
-        WebDriverWait(driver_local, 10).until(
+        CancellableWait(driver_local, 10).until(
             EC.any_of(
                 EC.presence_of_element_located(CANCEL_BUTTON_LOCATOR),
                 EC.presence_of_element_located(ERROR_MESSAGE_LOCATOR)
@@ -121,6 +134,7 @@ def receiving_reservation(driver_local, first_name_local, last_name_local, mobil
         )
         elapsed = time.perf_counter() - start
         logger.info("Detected confirmation elements (Cancel button or Error) in %.4f seconds", elapsed)
+        record_step(driver_local, "confirmation")
     except TimeoutException:
         msg = "Timed out waiting for confirmation or error indicator."
         logger.error(msg)
@@ -142,6 +156,7 @@ def receiving_reservation(driver_local, first_name_local, last_name_local, mobil
         logger.info("Total time in receiving_reservation: %.4f seconds", total_elapsed)
         return False, error_text
 
+@cached_availability("yelp", lambda restaurant_id: restaurant_id)
 def make_reservation(
     date: str = '2025-02-14',
     hour: int = 19,
@@ -159,19 +174,41 @@ def make_reservation(
     proxy_password: str = None,
     proxy_scheme: str = "http",
     make_booking: bool = False,
-    special_requests: str = None
+    special_requests: str = None,
+    launch_profile: str = DEFAULT_LAUNCH_PROFILE,
+    request_allowlist: str = None,
+    use_browser_context: bool = False,
+    use_http_probe: bool = True,
+    record_network: bool = False,
+    hybrid_checkout: bool = False,
+    use_session_jar: bool = True,
+    use_cache: bool = True,
+    hedge: bool = False
 ):
+    flow_kwargs = dict(locals())
     overall_start = time.perf_counter()
-    driver = None
+    pool = context_pool if use_browser_context else driver_pool
     booked = False
     confirmation_url = None
     alt_times_str = None
     error_msg = None
+    checkout_cookies = None
+
+    acquire_args = (browser_url, proxy_host, proxy_port, proxy_username, proxy_password, proxy_scheme, launch_profile, request_allowlist)
+    http_probe = use_http_probe and not make_booking
+    # Availability checks with hedge race a second proxy session when a stage runs past its p95.
+    hedge_browser = hedge and not make_booking
+
+    # Start getting a browser now; validation below runs while it launches.
+    # Availability checks try plain HTTP first and only need a browser as a fallback.
+    driver_future = None if http_probe or hedge_browser else acquire_async(pool, *acquire_args)
 
     try:
         validate_date(date)
         requested_am_pm = convert_to_am_pm(hour, minute)
     except ValueError as e:
+        if driver_future:
+            abandon_acquire(pool, driver_future)
         return (False, None, None, str(e))
     
     requested_24 = f"{hour:02d}{minute:02d}"
@@ -180,248 +217,254 @@ def make_reservation(
         logger.info("Valid reservation date and time.")
     else:
         logger.error("Invalid reservation: Date and time is in the past.")
+        if driver_future:
+            abandon_acquire(pool, driver_future)
         return (False, None, None, "Invalid reservation: Date and time is in the past.")
 
+    rejection = precheck("yelp", restaurant_id, date, party_size)
+    if rejection is not None:
+        if driver_future:
+            abandon_acquire(pool, driver_future)
+        return rejection
+
     logger.info(
         "Attempting reservation with details: Date: %s, Time: %02d:%02d (%s), Party Size: %s, First Name: %s, Last Name: %s, Phone: %s, Email: %s, Restaurant ID: %s, Special Requests: %s",
         date, hour, minute, requested_am_pm, party_size, first_name, last_name, phone_number, email, restaurant_id, special_requests
     )
-    
-    try:
-        driver = setup_driver(browser_url, proxy_host, proxy_port, proxy_username, proxy_password, proxy_scheme)
-        logger.info("WebDriver initialized successfully.")
-    except Exception as e:
-        logger.exception("WebDriver initialization failed.")
-        return (False, None, None, f"WebDriver error: {e}")
-    
+
+    if http_probe:
+        probe_kwargs = dict(date=date, hour=hour, minute=minute, party_size=party_size, restaurant_id=restaurant_id,
+                            proxy_host=proxy_host, proxy_port=proxy_port, proxy_username=proxy_username,
+                            proxy_password=proxy_password, proxy_scheme=proxy_scheme)
+        if hedge:
+            result = hedged(check_availability_http, "yelp_http_probe", probe_kwargs)
+        else:
+            result = check_availability_http(**probe_kwargs)
+        if result is not None:
+            logger.info("Total process time: %.4f seconds", time.perf_counter() - overall_start)
+            return result
+        if not hedge_browser:
+            driver_future = acquire_async(pool, *acquire_args)
+    elif make_booking and hybrid_checkout:
+        # Discovery over HTTP while the browser starts; the browser is only needed for the checkout form.
+        result = check_availability_http(date, hour, minute, party_size, restaurant_id,
+                                         proxy_host, proxy_port, proxy_username, proxy_password, proxy_scheme)
+        if result is not None and not result[0]:
+            logger.info("Requested time cannot be booked; skipping checkout.")
+            abandon_acquire(pool, driver_future)
+            return result
+        if result is not None:
+            checkout_cookies = cookies_for_cdp(get_http_session(proxy_host, proxy_port, proxy_username, proxy_password, proxy_scheme))
+
+    if hedge_browser:
+        # Each attempt is this check in the browser on its own pooled session; use_cache=False
+        # keeps the attempts from coalescing onto each other.
+        warm = None
+        if pool is driver_pool:
+            warm = lambda username: driver_pool.idle_count(pool_key(browser_url, proxy_host, proxy_port, username, proxy_password,
+                                                                    proxy_scheme, launch_profile, request_allowlist)) > 0
+        result = hedged(make_reservation, "yelp_browser_availability",
+                        dict(flow_kwargs, use_http_probe=False, use_cache=False, hedge=False), warm=warm)
+        logger.info("Total process time: %.4f seconds", time.perf_counter() - overall_start)
+        return result
+
     try:
-        if make_booking:
-            checkout_url = f"https://www.yelp.com/reservations/{restaurant_id}/checkout/{date}/{requested_24}/{party_size}"
-            logger.info("Starting booking process. Navigating to checkout URL: %s", checkout_url)
-        
-            start = time.perf_counter()
+        with driver_session(pool, acquired=driver_future, flow="make_reservation", record_network=record_network,
+                            session_jar=jar_identity(proxy_host, proxy_port, proxy_username, proxy_scheme) if use_session_jar else None) as driver:
+            logger.info("WebDriver initialized successfully.")
             try:
-                driver.get(checkout_url)
-            except Exception as e:
-                logger.exception("WebDriver failed to navigate to checkout URL: %s", checkout_url)
-                return (False, None, None, f"WebDriver error: {e}")
+                if make_booking:
+                    checkout_url = f"https://www.yelp.com/reservations/{restaurant_id}/checkout/{date}/{requested_24}/{party_size}"
+                    logger.info("Starting booking process. Navigating to checkout URL: %s", checkout_url)
+                    if checkout_cookies:
+                        set_browser_cookies(driver, checkout_cookies)
         
-            elapsed = time.perf_counter() - start
-            logger.info("Checkout page loaded in %.4f seconds", elapsed)
+                    start = time.perf_counter()
+                    try:
+                        driver.get(checkout_url)
+                    except Exception as e:
+                        logger.exception("WebDriver failed to navigate to checkout URL: %s", checkout_url)
+                        return (False, None, None, f"WebDriver error: {e}")
         
-            try:
-                WebDriverWait(driver, 15).until(
-                    EC.any_of(
-                        EC.presence_of_element_located((By.XPATH, "//div[@aria-label='Error' and @role='alert']")),
-                        EC.presence_of_element_located((By.XPATH, "//h2[contains(text(),'Confirm Reservation')]"))
-                    )
-                )
-            except TimeoutException:
-                elapsed = time.perf_counter() - overall_start
-                logger.error("Checkout page did not load properly after %.4f seconds", elapsed)
-                return (False, None, None, "Checkout page did not load properly.")
+                    elapsed = time.perf_counter() - start
+                    logger.info("Checkout page loaded in %.4f seconds", elapsed)
         
-            error_elements = driver.find_elements(By.XPATH, "//div[@aria-label='Error' and @role='alert']")
-            if error_elements:
-                error_text = error_elements[0].text.strip()
-                logger.error("Checkout error detected: %s", error_text)
-                return (False, None, None, error_text)
+                    try:
+                        CancellableWait(driver, 15).until(
+                            EC.any_of(
+                                EC.presence_of_element_located((By.XPATH, "//div[@aria-label='Error' and @role='alert']")),
+                                EC.presence_of_element_located((By.XPATH, "//h2[contains(text(),'Confirm Reservation')]"))
+                            )
+                        )
+                    except TimeoutException:
+                        elapsed = time.perf_counter() - overall_start
+                        logger.error("Checkout page did not load properly after %.4f seconds", elapsed)
+                        return (False, None, None, "Checkout page did not load properly.")
+                    record_step(driver, "checkout_page")
         
-            logger.info("No errors found on checkout page. Proceeding with reservation.")
+                    error_elements = driver.find_elements(By.XPATH, "//div[@aria-label='Error' and @role='alert']")
+                    if error_elements:
+                        error_text = error_elements[0].text.strip()
+                        logger.error("Checkout error detected: %s", error_text)
+                        return (False, None, None, error_text)
         
-            try:
-                booking_result, booking_info = receiving_reservation(driver, first_name, last_name, phone_number, email, special_requests)
-                if booking_result:
-                    booked = True
-                    confirmation_url = booking_info
-                    logger.info("Booking successful. Confirmation URL: %s", confirmation_url)
-                else:
-                    error_msg = booking_info
-                    logger.error("Booking failed: %s", error_msg)
-            except Exception as e:
-                logger.exception("Unexpected error during reservation process")
-                return (False, None, None, f"Unexpected error: {e}")
+                    logger.info("No errors found on checkout page. Proceeding with reservation.")
         
-            total_elapsed = time.perf_counter() - overall_start
-            logger.info("Total booking process time: %.4f seconds", total_elapsed)
+                    try:
+                        booking_result, booking_info = receiving_reservation(driver, first_name, last_name, phone_number, email, special_requests)
+                        if booking_result:
+                            booked = True
+                            confirmation_url = booking_info
+                            logger.info("Booking successful. Confirmation URL: %s", confirmation_url)
+                            capture_session_state(driver)
+                        else:
+                            error_msg = booking_info
+                            logger.error("Booking failed: %s", error_msg)
+                    except Exception as e:
+                        logger.exception("Unexpected error during reservation process")
+                        return (False, None, None, f"Unexpected error: {e}")
         
-            return (booked, confirmation_url if booked else None, None, error_msg)
-
-        else:
-            logger.info("Checking reservation availability... ")
-            reservation_link = f"https://www.yelp.com/reservations/{restaurant_id}?date={date}&time={requested_24}&covers={party_size}"
-            logger.info("Navigating to reservation link: %s", reservation_link)
+                    total_elapsed = time.perf_counter() - overall_start
+                    logger.info("Total booking process time: %.4f seconds", total_elapsed)
         
-            start = time.perf_counter()
-            driver.get(reservation_link)
-            elapsed = time.perf_counter() - start
-            logger.info("Navigation completed in %.4f seconds", elapsed)
+                    return (booked, confirmation_url if booked else None, None, error_msg)
 
-            try:
-                date_obj = datetime.strptime(date, "%Y-%m-%d")
-                formatted_date_win = date_obj.strftime("%b ") + str(date_obj.day)
-                input_xpath = "//input[@aria-label='Select a date']"
-                element = WebDriverWait(driver, 10).until(
-                    EC.presence_of_element_located((By.XPATH, input_xpath))
-                )
-                value = element.get_attribute("value")
-                if formatted_date_win in value:
-                    logger.info(f"Reservation date {formatted_date_win} is in allowed range.")
                 else:
-                    logger.error(f"Reservation date {formatted_date_win} is not in allowed range.")
-                    return (False, None, None, f"Reservation date {formatted_date_win} is not in allowed range.")
+                    logger.info("Checking reservation availability... ")
+                    reservation_link = f"https://www.yelp.com/reservations/{restaurant_id}?date={date}&time={requested_24}&covers={party_size}"
+                    logger.info("Navigating to reservation link: %s", reservation_link)
         
-            except TimeoutException:
-                logger.error("Timeout: Date input field was not found within the given time.")
-                return (False, None, None, "Timeout: Date input field was not found within the given time.")
-            except NoSuchElementException:
-                logger.error("Date input field does not exist on the page.")
-                return (False, None, None, "Date input field does not exist on the page.")
-            except Exception as e:
-                return (False, None, None, f"Unexpected error: {str(e)}")
+                    start = time.perf_counter()
+                    driver.get(reservation_link)
+                    elapsed = time.perf_counter() - start
+                    logger.info("Navigation completed in %.4f seconds", elapsed)
 
-            try:
-                time.sleep(2) # Fix fixed sleep
-                if int(party_size) > 1:
-                    option = driver.find_element(By.XPATH, f"//option[text()='{party_size} people']")
-                elif int(party_size) == 1:
-                    option = driver.find_element(By.XPATH, f"//option[text()='1 person']")
-                else:
-                    logger.error("Party size is invalid.")
-                    return (False, None, None, "Party size is not in allowed range.")
-                logger.info(f"The party size {party_size} is in allowed range.")
-            except TimeoutException:
-                logger.error(f"The party size {party_size} is bigger than maximum.")
-                return (False, None, None, "The party size is bigger than maximum.")
-            except NoSuchElementException:
-                logger.error(f"The party size {party_size} is bigger than maximum.")
-                return (False, None, None, "The party size is bigger than maximum.")
-            except Exception as e:
-                logger.exception("Unexpected error while checking the party size")
-                return (False, None, None, f"Unexpected error: {str(e)}")
-            
-            xpath = ("//button[@data-button='true' and not(.//span[normalize-space()='Confirm']) and "
-                     "(.//span[contains(text(),'am')] or .//span[contains(text(),'pm')])]")
-        
-            start = time.perf_counter()
-            try:
-                WebDriverWait(driver, 10).until(
-                    EC.any_of(
-                        EC.visibility_of_element_located((By.XPATH, xpath)),
-                        EC.presence_of_element_located((By.XPATH, "//p[text()='No Availability']"))
-                    )
-                )
-                elapsed = time.perf_counter() - start
-                logger.info("Time slot elements became visible in %.4f seconds", elapsed)
-            except TimeoutException:
-                logger.error("Time slot elements did not appear after %.4f seconds", time.perf_counter() - overall_start)
-                return (False, None, None, "Time slot elements did not appear.")
-            except NoSuchElementException:
-                logger.info("Time slot elements could not be found on the page.")
-                return (False, None, None, "Sorry, that spot is no longer available. Feel free to check back later, or search for a different date.")
-            except Exception as e:
-                logger.exception("Unexpected error while waiting for time slot elements: %s", str(e))
-                return (False, None, None, f"Unexpected error: {str(e)}")
-        
-            time_slot_buttons = find_elements_with_timing(driver, By.XPATH, xpath, "time slot button")
-            if not time_slot_buttons:
-                logger.error("No time slot buttons found on the page.")
-                return (False, None, None, "No time slot buttons found on the page.")
-        
-            requested_dt = datetime.strptime(requested_am_pm, "%I:%M %p")
-            base_index = 3
+                    try:
+                        date_obj = datetime.strptime(date, "%Y-%m-%d")
+                        formatted_date_win = date_obj.strftime("%b ") + str(date_obj.day)
+                        input_xpath = "//input[@aria-label='Select a date']"
+                        element = CancellableWait(driver, 10).until(
+                            EC.presence_of_element_located((By.XPATH, input_xpath))
+                        )
+                        value = element.get_attribute("value")
+                        learn_date("yelp", restaurant_id, date, formatted_date_win in value)
+                        if formatted_date_win in value:
+                            logger.info(f"Reservation date {formatted_date_win} is in allowed range.")
+                        else:
+                            logger.error(f"Reservation date {formatted_date_win} is not in allowed range.")
+                            return (False, None, None, f"Reservation date {formatted_date_win} is not in allowed range.")
         
-            if base_index < len(time_slot_buttons):
-                base_time_text = driver.execute_script("return arguments[0].innerText;", time_slot_buttons[base_index]).strip()
-                try:
-                    base_time = datetime.strptime(base_time_text, "%I:%M %p")
-                except ValueError as e:
-                    logger.warning("Could not parse base time text '%s': %s", base_time_text, e)
-                    base_time = None
-            else:
-                base_time = None
-        
-            order = [3, 2, 4, 1, 5, 0, 6] if base_time and base_time > requested_dt else [3, 4, 2, 5, 1, 6, 0]
-            order = [i for i in order if i < len(time_slot_buttons)]
-        
-            exact_slot = None
-            candidate_left = None
-            candidate_right = None
-        
-            for idx in order:
-                button = time_slot_buttons[idx]
-                start = time.perf_counter()
-                time_text = driver.execute_script("return arguments[0].innerText;", button).strip()
-                extraction_time = time.perf_counter() - start
-                logger.info("Extracted time_text '%s' from button %d in %.4f seconds", time_text, idx+1, extraction_time)
-        
-                try:
-                    slot_time = datetime.strptime(time_text, "%I:%M %p")
-                except ValueError as e:
-                    logger.warning("Could not parse time_text '%s' from button %d: %s", time_text, idx+1, e)
-                    continue
-        
-                available = button.get_attribute("disabled") is None
-                logger.info("Button %d: time_text='%s', available=%s", idx+1, time_text, available)
+                    except TimeoutException:
+                        logger.error("Timeout: Date input field was not found within the given time.")
+                        return (False, None, None, "Timeout: Date input field was not found within the given time.")
+                    except NoSuchElementException:
+                        logger.error("Date input field does not exist on the page.")
+                        return (False, None, None, "Date input field does not exist on the page.")
+                    except Exception as e:
+                        return (False, None, None, f"Unexpected error: {str(e)}")
+
+                    try:
+                        time.sleep(2) # Fix fixed sleep
+                        if int(party_size) > 1:
+                            option = driver.find_element(By.XPATH, f"//option[text()='{party_size} people']")
+                        elif int(party_size) == 1:
+                            option = driver.find_element(By.XPATH, f"//option[text()='1 person']")
+                        else:
+                            logger.error("Party size is invalid.")
+                            return (False, None, None, "Party size is not in allowed range.")
+                        logger.info(f"The party size {party_size} is in allowed range.")
+                        learn_party_size("yelp", restaurant_id, party_size, True)
+                    except TimeoutException:
+                        logger.error(f"The party size {party_size} is bigger than maximum.")
+                        return (False, None, None, "The party size is bigger than maximum.")
+                    except NoSuchElementException:
+                        logger.error(f"The party size {party_size} is bigger than maximum.")
+                        learn_party_size("yelp", restaurant_id, party_size, False)
+                        return (False, None, None, "The party size is bigger than maximum.")
+                    except Exception as e:
+                        logger.exception("Unexpected error while checking the party size")
+                        return (False, None, None, f"Unexpected error: {str(e)}")
+            
+                    xpath = ("//button[@data-button='true' and not(.//span[normalize-space()='Confirm']) and "
+                             "(.//span[contains(text(),'am')] or .//span[contains(text(),'pm')])]")
         
-                if not available:
-                    continue
+                    start = time.perf_counter()
+                    try:
+                        CancellableWait(driver, 10).until(
+                            EC.any_of(
+                                EC.visibility_of_element_located((By.XPATH, xpath)),
+                                EC.presence_of_element_located((By.XPATH, "//p[text()='No Availability']"))
+                            )
+                        )
+                        elapsed = time.perf_counter() - start
+                        logger.info("Time slot elements became visible in %.4f seconds", elapsed)
+                        record_step(driver, "availability_page")
+                        capture_session_state(driver)
+                    except TimeoutException:
+                        logger.error("Time slot elements did not appear after %.4f seconds", time.perf_counter() - overall_start)
+                        return (False, None, None, "Time slot elements did not appear.")
+                    except NoSuchElementException:
+                        logger.info("Time slot elements could not be found on the page.")
+                        return (False, None, None, "Sorry, that spot is no longer available. Feel free to check back later, or search for a different date.")
+                    except Exception as e:
+                        logger.exception("Unexpected error while waiting for time slot elements: %s", str(e))
+                        return (False, None, None, f"Unexpected error: {str(e)}")
         
-                if slot_time == requested_dt:
-                    exact_slot = button
-                    logger.info("Exact requested time (%s) found at button %d and available.", requested_am_pm, idx+1)
-                    break
-                elif slot_time < requested_dt and candidate_left is None:
-                    candidate_left = (time_text, button, slot_time)
-                    logger.info("Found left alternative: %s at button %d", time_text, idx+1)
-                elif slot_time > requested_dt and candidate_right is None:
-                    candidate_right = (time_text, button, slot_time)
-                    logger.info("Found right alternative: %s at button %d", time_text, idx+1)
+                    time_slot_buttons = find_elements_with_timing(driver, By.XPATH, xpath, "time slot button")
+                    if not time_slot_buttons:
+                        logger.error("No time slot buttons found on the page.")
+                        return (False, None, None, "No time slot buttons found on the page.")
         
-                if candidate_left and candidate_right:
-                    break
+                    requested_dt = datetime.strptime(requested_am_pm, "%I:%M %p")
+                    slot_cache = {}
+
+                    def read_slot(idx):
+                        if idx not in slot_cache:
+                            button = time_slot_buttons[idx]
+                            start = time.perf_counter()
+                            time_text = driver.execute_script("return arguments[0].innerText;", button).strip()
+                            logger.info("Extracted time_text '%s' from button %d in %.4f seconds", time_text, idx+1, time.perf_counter() - start)
+                            slot_cache[idx] = (time_text, button.get_attribute("disabled") is None)
+                        return slot_cache[idx]
+
+                    exact_index, candidate_left, candidate_right = select_time_slot(len(time_slot_buttons), read_slot, requested_dt)
+                    exact_slot = time_slot_buttons[exact_index] if exact_index is not None else None
+
+                    if exact_slot:
+                        if make_booking:
+                            start = time.perf_counter()
+                            exact_slot.click()
+                            click_elapsed = time.perf_counter() - start
+                            logger.info("Clicked exact time button in %.4f seconds", click_elapsed)
         
-            if exact_slot:
-                if make_booking:
-                    start = time.perf_counter()
-                    exact_slot.click()
-                    click_elapsed = time.perf_counter() - start
-                    logger.info("Clicked exact time button in %.4f seconds", click_elapsed)
+                            booking_result, booking_info = receiving_reservation(driver, first_name, last_name, phone_number, email, special_requests)
+                            if booking_result:
+                                logger.info("Booking successful. Confirmation URL: %s", booking_info)
+                                booked = True
+                                confirmation_url = booking_info
+                            else:
+                                logger.error("Booking failed: %s", booking_info)
+                                error_msg = booking_info
         
-                    booking_result, booking_info = receiving_reservation(driver, first_name, last_name, phone_number, email, special_requests)
-                    if booking_result:
-                        logger.info("Booking successful. Confirmation URL: %s", booking_info)
-                        booked = True
-                        confirmation_url = booking_info
+                            total_elapsed = time.perf_counter() - overall_start
+                            logger.info("Total booking time: %.4f seconds", total_elapsed)
+                            return (booked, confirmation_url if booked else None, None, error_msg)
+                        else:
+                            logger.info("Exact time available but booking not attempted (make_booking is False).")
+                            return (True, None, None, None)
                     else:
-                        logger.error("Booking failed: %s", booking_info)
-                        error_msg = booking_info
-        
-                    total_elapsed = time.perf_counter() - overall_start
-                    logger.info("Total booking time: %.4f seconds", total_elapsed)
-                    return (booked, confirmation_url if booked else None, None, error_msg)
-                else:
-                    logger.info("Exact time available but booking not attempted (make_booking is False).")
-                    return (True, None, None, None)
-            else:
-                alternatives = []
-                if candidate_left:
-                    alternatives.append(candidate_left[0].upper().replace(":00", ""))
-                if candidate_right:
-                    alternatives.append(candidate_right[0].upper().replace(":00", ""))
-                alt_times_str = " or ".join(alternatives) if alternatives else "No alternative times available"
-                logger.info("Alternative times: %s", alt_times_str)
+                        alt_times_str = format_alternatives(candidate_left, candidate_right)
+                        logger.info("Alternative times: %s", alt_times_str)
         
-                total_elapsed = time.perf_counter() - overall_start
-                logger.info("Total process time: %.4f seconds", total_elapsed)
-                return (False, None, alt_times_str, None)
+                        total_elapsed = time.perf_counter() - overall_start
+                        logger.info("Total process time: %.4f seconds", total_elapsed)
+                        return (False, None, alt_times_str, None)
             
-    except KeyboardInterrupt:
-        raise
-    except Exception as e:
-        logger.exception("Unexpected error during reservation process:")
-        return (False, None, None, f"Unexpected error: {e}")
-    finally:
-        if driver is not None:
-            driver.quit()
-            logger.info("WebDriver session closed.")
+            except KeyboardInterrupt:
+                raise
+            except Exception as e:
+                logger.exception("Unexpected error during reservation process:")
+                return (False, None, None, f"Unexpected error: {e}")
+    except DriverUnavailable as e:
+        logger.exception("WebDriver initialization failed.")
+        return (False, None, None, f"WebDriver error: {e}")
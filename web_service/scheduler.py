@@ -0,0 +1,192 @@
+import atexit
+import collections
+import heapq
+import importlib
+import itertools
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+from config import logger
+from process_pool import FLOWS
+from utils import FlowCancelled
+
+SCHEDULER_WORKERS = 4          # flows run at once; match the driver pool's POOL_MAX_SIZE
+METRICS_WINDOW = 500           # latest queue waits kept per priority class
+
+# Priority classes, most urgent first. Bookings and cancellations change state
+# for a guest and always run ahead of queued availability checks.
+PRIORITY_BOOKING = 0
+PRIORITY_AVAILABILITY = 1
+PRIORITY_NAMES = {PRIORITY_BOOKING: "booking", PRIORITY_AVAILABILITY: "availability"}
+
+# Deadline used when a job has neither a caller SLA nor a reservation time.
+DEFAULT_SLA = {
+    PRIORITY_BOOKING: 60,
+    PRIORITY_AVAILABILITY: 300,
+}
+
+def job_priority(flow, kwargs):
+    """Returns the priority class of a flow call."""
+    if flow.startswith("cancel_reservation") or kwargs.get("make_booking", False):
+        return PRIORITY_BOOKING
+    return PRIORITY_AVAILABILITY
+
+def job_deadline(priority, kwargs, sla=None, now=None):
+    """
+    Returns a job's deadline as a time.time() timestamp: now + sla when the
+    caller gives one, else the requested reservation time if it is still
+    ahead, else now + the class's DEFAULT_SLA.
+    """
+    now = time.time() if now is None else now
+    if sla is not None:
+        return now + sla
+    if "date" in kwargs and "hour" in kwargs:
+        try:
+            reservation_at = datetime.strptime(kwargs["date"], "%Y-%m-%d").replace(
+                hour=int(kwargs["hour"]), minute=int(kwargs.get("minute", 0)))
+            if reservation_at.timestamp() > now:
+                return reservation_at.timestamp()
+        except (TypeError, ValueError):
+            pass
+    return now + DEFAULT_SLA[priority]
+
+def run_flow_in_thread(flow, **kwargs):
+    """Runs a FLOWS entry in the calling thread."""
+    module_name, function_name = FLOWS[flow]
+    return getattr(importlib.import_module(module_name), function_name)(**kwargs)
+
+class _ScheduledJob:
+    def __init__(self, flow, kwargs, priority, deadline):
+        self.flow = flow
+        self.kwargs = kwargs
+        self.priority = priority
+        self.deadline = deadline
+        self.queued = time.monotonic()
+        self.future = Future()
+
+class FlowScheduler:
+    """
+    Queues flow calls and starts them by priority class, then earliest
+    deadline first, on a fixed number of worker threads. A booking submitted
+    behind queued availability checks starts at the next free worker.
+    Jobs whose deadline passes while queued fail with TimeoutError instead
+    of taking a browser. run(flow, **kwargs) executes a job; pass
+    get_process_pool().run to run flows in the supervised worker processes.
+    """
+
+    def __init__(self, workers=SCHEDULER_WORKERS, run=run_flow_in_thread):
+        self._run = run
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._running = 0
+        self._waits = {priority: collections.deque(maxlen=METRICS_WINDOW) for priority in PRIORITY_NAMES}
+        self._started = collections.Counter()
+        self._expired = collections.Counter()
+        self._threads = [threading.Thread(target=self._work, name=f"flow-scheduler-{i}", daemon=True) for i in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, flow, sla=None, deadline=None, priority=None, **kwargs):
+        """
+        Queues a flow (a FLOWS name) and returns a Future for its result.
+        sla is seconds from now; deadline is an absolute time.time(). If
+        neither is given the deadline comes from the reservation time.
+        """
+        if flow not in FLOWS:
+            raise ValueError(f"Unknown flow '{flow}'. Expected one of {sorted(FLOWS)}.")
+        priority = job_priority(flow, kwargs) if priority is None else priority
+        if deadline is None:
+            deadline = job_deadline(priority, kwargs, sla)
+        job = _ScheduledJob(flow, kwargs, priority, deadline)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Flow scheduler is closed.")
+            heapq.heappush(self._heap, (priority, deadline, next(self._seq), job))
+            self._cond.notify()
+        return job.future
+
+    def run(self, flow, sla=None, deadline=None, priority=None, **kwargs):
+        return self.submit(flow, sla=sla, deadline=deadline, priority=priority, **kwargs).result()
+
+    def _next_job(self):
+        with self._cond:
+            while True:
+                while not self._heap and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return None
+                _, _, _, job = heapq.heappop(self._heap)
+                waited = time.monotonic() - job.queued
+                self._waits[job.priority].append(waited)
+                if not job.future.set_running_or_notify_cancel():
+                    continue
+                if time.time() > job.deadline:
+                    self._expired[job.priority] += 1
+                    job.future.set_exception(TimeoutError(f"{job.flow} missed its deadline after {waited:.1f} seconds in the queue"))
+                    continue
+                self._started[job.priority] += 1
+                self._running += 1
+                return job, waited
+
+    def _work(self):
+        while True:
+            picked = self._next_job()
+            if picked is None:
+                return
+            job, waited = picked
+            logger.info("Starting %s (%s) after %.4f seconds in the queue", job.flow, PRIORITY_NAMES[job.priority], waited)
+            try:
+                job.future.set_result(self._run(job.flow, **job.kwargs))
+            except (Exception, FlowCancelled) as e:
+                job.future.set_exception(e)
+            finally:
+                with self._cond:
+                    self._running -= 1
+
+    def metrics(self):
+        """
+        Returns queue depth and queue-wait statistics (seconds) per priority class.
+        """
+        with self._cond:
+            queued = collections.Counter(job.priority for _, _, _, job in self._heap)
+            snapshot = {}
+            for priority, name in PRIORITY_NAMES.items():
+                waits = sorted(self._waits[priority])
+                snapshot[name] = {
+                    "queued": queued[priority],
+                    "started": self._started[priority],
+                    "expired": self._expired[priority],
+                    "wait_mean": sum(waits) / len(waits) if waits else 0.0,
+                    "wait_p95": waits[min(len(waits) - 1, int(len(waits) * 0.95))] if waits else 0.0,
+                    "wait_max": waits[-1] if waits else 0.0,
+                }
+            snapshot["running"] = self._running
+        return snapshot
+
+    def close(self):
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            pending, self._heap = self._heap, []
+            self._cond.notify_all()
+        for _, _, _, job in pending:
+            if job.future.set_running_or_notify_cancel():
+                job.future.set_exception(RuntimeError("Flow scheduler closed."))
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler():
+    """
+    Returns the shared FlowScheduler, starting its workers on first use.
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = FlowScheduler()
+            atexit.register(_scheduler.close)
+        return _scheduler
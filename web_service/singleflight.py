@@ -0,0 +1,83 @@
+import collections
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from config import logger
+from utils import FlowCancelled, current_cancel_token
+
+SINGLEFLIGHT_POLL = 0.25   # seconds between a waiting caller's checks of its own cancel token
+
+class SingleFlight:
+    """
+    Coalesces identical calls: while a call for a key is running, later
+    callers with the same key wait for it and get its result (or exception)
+    instead of starting their own. If the running call was cancelled by its
+    own caller, the waiters start over and one of them runs it instead.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}                        # key -> Future of the running call
+        self.executions = 0
+        self.saved = collections.Counter()      # key[0] (site) -> calls answered by another's execution
+
+    def do(self, key, fn):
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = Future()
+                    self.executions += 1
+            if leader:
+                return self._run(key, call, fn)
+            try:
+                result = self._wait(call)
+            except FlowCancelled:
+                own = current_cancel_token.get()
+                if own is not None and own.is_cancelled():
+                    raise
+                logger.info("Shared %s call for %s was cancelled; running it again.", self.name, key)
+                continue
+            with self._lock:
+                self.saved[key[0]] += 1
+            logger.info("%s call for %s shared an in-flight execution.", self.name.capitalize(), key)
+            return result
+
+    def _run(self, key, call, fn):
+        try:
+            result = fn()
+        except BaseException as e:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.set_exception(e)
+            raise
+        with self._lock:
+            self._calls.pop(key, None)
+        call.set_result(result)
+        return result
+
+    @staticmethod
+    def _wait(call):
+        # Waiters still honour their own cancel token; the shared call keeps running.
+        token = current_cancel_token.get()
+        while True:
+            if token is not None:
+                token.raise_if_cancelled()
+            try:
+                return call.result(timeout=SINGLEFLIGHT_POLL)
+            except FutureTimeout:
+                continue
+
+    def stats(self):
+        with self._lock:
+            saved = sum(self.saved.values())
+            return {
+                "executions": self.executions,
+                "sessions_saved": saved,
+                "saved_by_site": dict(self.saved),
+                "in_flight": len(self._calls),
+            }
+
+# Availability questions (make_reservation, make_reservation_external, batch pages and day slot sets).
+availability_flights = SingleFlight("availability")
@@ -0,0 +1,27 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# The modules import each other by bare name and write app.log to the working
+# directory; keep it out of the tree.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(tempfile.mkdtemp(prefix="web_service_tests_"))
+
+import capabilities
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+@pytest.fixture(autouse=True)
+def capability_file(tmp_path, monkeypatch):
+    """Keeps the profiles any test learns in tmp_path, written out before it is removed."""
+    monkeypatch.setattr(capabilities, "CAPABILITIES_PATH", str(tmp_path / "capabilities.json"))
+    monkeypatch.setattr(capabilities, "_profiles", None)
+    monkeypatch.setattr(capabilities, "_dirty", set())
+    yield tmp_path / "capabilities.json"
+    capabilities.flush()
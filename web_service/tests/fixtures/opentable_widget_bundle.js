@@ -0,0 +1 @@
+!function(){"use strict";var e={};e.queries={RestaurantsAvailability:{operationName:"RestaurantsAvailability",sha256Hash:"e6b87021ed6e865a7778aa39d35d09864c1be29c683c707602dd3de43c854d86"},Autocomplete:{operationName:"Autocomplete",sha256Hash:"fe1d118abd4c227750693027c2414d43014c2493f64f49bcef5a65274ce9c3c3"}};window.__otWidget=e}();
@@ -0,0 +1,31 @@
+from cache import availability_cache, cached_availability, opentable_restaurant_from_url
+
+def _flow(calls):
+    @cached_availability("opentable", opentable_restaurant_from_url)
+    def check(date="2099-01-01", hour=19, minute=0, party_size="2", restaurant_id="", make_booking=False, use_cache=True):
+        calls.append(restaurant_id)
+        return (False, None, None, "No availability available")
+    return check
+
+def test_opentable_restaurant_from_url():
+    assert opentable_restaurant_from_url("https://www.opentable.com/restref/client?rid=1234&lang=en-US") == 1234
+    assert opentable_restaurant_from_url("https://www.opentable.com/r/some-restaurant") is None
+    assert opentable_restaurant_from_url(None) is None
+
+def test_answers_cached_per_restaurant():
+    availability_cache.clear()
+    calls = []
+    check = _flow(calls)
+    url = "https://www.opentable.com/restref/client?rid=1234"
+    assert check(restaurant_id=url) == check(restaurant_id=url)
+    assert calls == [url]
+
+def test_unkeyed_restaurants_are_not_cached():
+    availability_cache.clear()
+    calls = []
+    check = _flow(calls)
+    url = "https://www.opentable.com/r/some-restaurant"
+    check(restaurant_id=url)
+    check(restaurant_id=url)
+    assert calls == [url, url]
+    assert len(availability_cache) == 0
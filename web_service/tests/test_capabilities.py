@@ -0,0 +1,54 @@
+import json
+import os
+from datetime import date as date_cls, timedelta
+
+import pytest
+
+import capabilities
+
+def _ahead(days):
+    return (date_cls.today() + timedelta(days=days)).strftime("%Y-%m-%d")
+
+def test_horizon_needs_corroborating_rejections(monkeypatch):
+    monkeypatch.setattr(capabilities, "HORIZON_RECHECK_RATE", 0)
+    capabilities.learn_date("yelp", "bistro", _ahead(10), True)
+    for _ in range(capabilities.HORIZON_REJECTIONS_REQUIRED - 1):
+        capabilities.learn_date("yelp", "bistro", _ahead(40), False)
+    assert capabilities.get_profile("yelp", "bistro").get("min_rejected_days") is None
+    assert capabilities.precheck("yelp", "bistro", _ahead(45), "2") is None
+
+    capabilities.learn_date("yelp", "bistro", _ahead(35), False)
+    assert capabilities.get_profile("yelp", "bistro")["min_rejected_days"] == 35
+    assert capabilities.precheck("yelp", "bistro", _ahead(45), "2")[3].endswith("is not in allowed range.")
+
+def test_allowed_date_reopens_horizon(monkeypatch):
+    monkeypatch.setattr(capabilities, "HORIZON_RECHECK_RATE", 0)
+    for _ in range(capabilities.HORIZON_REJECTIONS_REQUIRED):
+        capabilities.learn_date("yelp", "bistro", _ahead(30), False)
+    capabilities.learn_date("yelp", "bistro", _ahead(60), True)
+    profile = capabilities.get_profile("yelp", "bistro")
+    assert profile["min_rejected_days"] is None
+    assert profile["horizon_rejections"] == 0
+
+def test_requests_past_horizon_sometimes_recheck(monkeypatch):
+    for _ in range(capabilities.HORIZON_REJECTIONS_REQUIRED):
+        capabilities.learn_date("yelp", "bistro", _ahead(30), False)
+    monkeypatch.setattr(capabilities, "HORIZON_RECHECK_RATE", 1)
+    assert capabilities.precheck("yelp", "bistro", _ahead(45), "2") is None
+
+def test_changes_are_batched_until_flush(capability_file):
+    capabilities.learn_party_sizes("yelp", "bistro", [1, 2, 3])
+    capabilities.learn_party_size("opentable", "1234", 9, False)
+    assert not capability_file.exists()
+    capabilities.flush()
+    stored = {(p["site"], p["restaurant"]) for p in json.loads(capability_file.read_text())["profiles"]}
+    assert stored == {("yelp", "bistro"), ("opentable", "1234")}
+
+def test_reloads_when_another_process_writes(capability_file):
+    capabilities.learn_party_sizes("yelp", "bistro", [1, 2])
+    capabilities.flush()
+    data = json.loads(capability_file.read_text())
+    data["profiles"][0]["party_sizes"] = [1, 2, 3, 4]
+    capability_file.write_text(json.dumps(data))
+    os.utime(capability_file, ns=(0, 1))
+    assert capabilities.get_profile("yelp", "bistro")["party_sizes"] == [1, 2, 3, 4]
@@ -0,0 +1,20 @@
+from http_client import HTTP_TIMEOUT
+from hedging import LatencyTracker, HEDGE_INITIAL_DELAY, HEDGE_MIN_SAMPLES, hedge_proxy_username
+
+def test_http_probe_hedges_before_it_times_out():
+    tracker = LatencyTracker()
+    assert tracker.hedge_delay("yelp_http_probe") < HTTP_TIMEOUT
+    for _ in range(HEDGE_MIN_SAMPLES):
+        tracker.record("yelp_http_probe", HTTP_TIMEOUT)
+    assert tracker.hedge_delay("yelp_http_probe") < HTTP_TIMEOUT
+
+def test_other_stages_use_initial_delay_then_p95():
+    tracker = LatencyTracker()
+    assert tracker.hedge_delay("yelp_browser_availability") == HEDGE_INITIAL_DELAY
+    for _ in range(HEDGE_MIN_SAMPLES):
+        tracker.record("yelp_browser_availability", 8.0)
+    assert tracker.hedge_delay("yelp_browser_availability") == 8.0
+
+def test_hedge_sessions_are_fixed_and_differ_from_primary():
+    assert hedge_proxy_username("customer-x-sessid-hedge1") == "customer-x-sessid-hedge2"
+    assert hedge_proxy_username("customer-x", warm=lambda username: username.endswith("hedge2")) == "customer-x-sessid-hedge2"
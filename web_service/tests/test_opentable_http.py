@@ -0,0 +1,121 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from conftest import read_fixture
+import opentable_http
+from http_client import AvailabilityParseError, get_http_session
+from opentable_http import restaurant_rid, build_availability_payload, parse_available_times, extract_query_hash, check_availability_opentable_http
+
+QUERY_HASH = "fixture-query-hash"
+BUNDLE_QUERY_HASH = "e6b87021ed6e865a7778aa39d35d09864c1be29c683c707602dd3de43c854d86"
+
+def test_restaurant_rid():
+    assert restaurant_rid("https://www.opentable.com/restref/client?rid=1234&restref=1234&lang=en-US") == 1234
+    assert restaurant_rid("https://www.opentable.com/booking/restref/availability?restref=987") == 987
+    with pytest.raises(ValueError):
+        restaurant_rid("https://www.opentable.com/r/some-restaurant-chicago")
+
+def test_build_availability_payload():
+    payload = build_availability_payload(1234, "2026-11-02", "19:00", "4", QUERY_HASH)
+    assert payload["variables"]["restaurantIds"] == [1234]
+    assert payload["variables"]["partySize"] == 4
+    assert payload["extensions"]["persistedQuery"]["sha256Hash"] == QUERY_HASH
+
+def test_parse_available_times():
+    data = json.loads(read_fixture("opentable_availability.json"))
+    assert parse_available_times(data, "19:00") == ["18:30", "19:00", "19:45"]
+
+def test_parse_available_times_rejects_other_shapes():
+    with pytest.raises(AvailabilityParseError):
+        parse_available_times({"errors": [{"message": "PersistedQueryNotFound"}]}, "19:00")
+
+@pytest.fixture
+def opentable_server():
+    """Serves the restref widget page and answers its availability request."""
+    widget = read_fixture("opentable_widget.html").encode("utf-8")
+    bundle = read_fixture("opentable_widget_bundle.js").encode("utf-8")
+    state = {"availability": json.loads(read_fixture("opentable_availability.json")), "requests": []}
+    opentable_http._csrf_tokens.clear()
+    opentable_http._query_hash = (None, 0.0)
+
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status, body, content_type):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path.startswith("/restref/client?"):
+                self._send(200, widget, "text/html; charset=utf-8")
+            elif self.path == "/static/widget-bundle.js":
+                self._send(200, bundle, "application/javascript")
+            else:
+                self.send_error(404)
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            state["requests"].append((self.headers.get("x-csrf-token"), body))
+            if self.headers.get("x-csrf-token") != "fixture-csrf-token-123":
+                self.send_error(403)
+            else:
+                self._send(200, json.dumps(state["availability"]).encode("utf-8"), "application/json")
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield base_url, state
+    server.shutdown()
+    server.server_close()
+
+def _check(base_url, hour, minute):
+    return check_availability_opentable_http("2026-11-02", hour, minute, "2", f"{base_url}/restref/client?rid=1234",
+                                             availability_url=f"{base_url}/dapi/fe/gql", query_hash=QUERY_HASH)
+
+def test_check_availability_opentable_http_exact_time(opentable_server):
+    base_url, state = opentable_server
+    result = _check(base_url, 19, 0)
+    assert result is not None
+    assert result[0] is True
+    token, body = state["requests"][-1]
+    assert token == "fixture-csrf-token-123"
+    assert body["variables"]["time"] == "19:00"
+
+def test_check_availability_opentable_http_nearest_times(opentable_server):
+    base_url, state = opentable_server
+    for slot in state["availability"]["data"]["availability"][0]["availabilityDays"][0]["slots"]:
+        if slot.get("timeOffsetMinutes") == 0:
+            slot["isAvailable"] = False
+    assert _check(base_url, 19, 0) == (False, None, None, "Exact time not available. Closet time before = 18:30, Closet time after = 19:45")
+
+def test_check_availability_opentable_http_falls_back_without_widget(opentable_server):
+    base_url, _ = opentable_server
+    result = check_availability_opentable_http("2026-11-02", 19, 0, "2", f"{base_url}/missing?rid=1234",
+                                               availability_url=f"{base_url}/dapi/fe/gql", query_hash=QUERY_HASH)
+    assert result is None
+
+def test_extract_query_hash_from_widget_bundle(opentable_server):
+    base_url, _ = opentable_server
+    session = get_http_session()
+    assert extract_query_hash(session, f"{base_url}/restref/client?rid=1234") == BUNDLE_QUERY_HASH
+
+def test_check_availability_opentable_http_uses_bundle_hash(opentable_server, monkeypatch):
+    base_url, state = opentable_server
+    monkeypatch.setattr(opentable_http, "OPENTABLE_AVAILABILITY_QUERY_HASH", None)
+    result = check_availability_opentable_http("2026-11-02", 19, 0, "2", f"{base_url}/restref/client?rid=1234",
+                                               availability_url=f"{base_url}/dapi/fe/gql")
+    assert result is not None
+    assert state["requests"][-1][1]["extensions"]["persistedQuery"]["sha256Hash"] == BUNDLE_QUERY_HASH
+
+def test_csrf_tokens_cached_per_proxy_identity(opentable_server):
+    base_url, _ = opentable_server
+    assert _check(base_url, 19, 0) is not None
+    assert list(opentable_http._csrf_tokens) == [(get_http_session().identity, base_url.split("//")[1])]
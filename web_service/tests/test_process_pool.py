@@ -0,0 +1,21 @@
+import threading
+
+import pytest
+
+from process_pool import FlowProcessPool
+
+@pytest.fixture(scope="module")
+def flow_pool():
+    pool = FlowProcessPool(workers=1, flow_timeout=60)
+    yield pool
+    pool.close()
+
+def test_unpicklable_arguments_fail_the_job(flow_pool):
+    future = flow_pool.submit("cancel_reservation", cancel_url=threading.Lock())
+    with pytest.raises(TypeError):
+        future.result(timeout=30)
+
+def test_flow_exception_type_is_kept(flow_pool):
+    future = flow_pool.submit("cancel_reservation", no_such_argument=1)
+    with pytest.raises(TypeError, match="no_such_argument"):
+        future.result(timeout=60)
@@ -0,0 +1,26 @@
+import json
+from urllib.parse import parse_qs
+
+from recorder import _redact_post_data
+
+def test_json_body_guest_details_redacted():
+    body = json.dumps({"operationName": "BookDetailsStandard", "variables": {
+        "firstName": "Ann", "lastName": "Lee", "email": "ann@example.com", "partySize": 2,
+        "diner": {"phoneNumber": "+13125550100", "country_code": "US"}}})
+    redacted = json.loads(_redact_post_data(body, {"Content-Type": "application/json"}))
+    variables = redacted["variables"]
+    assert redacted["operationName"] == "BookDetailsStandard"
+    assert variables["firstName"] == variables["lastName"] == variables["email"] == "<redacted>"
+    assert variables["diner"] == {"phoneNumber": "<redacted>", "country_code": "US"}
+    assert variables["partySize"] == 2
+
+def test_form_body_guest_details_redacted():
+    body = "first_name=Ann&last_name=Lee&mobile_number=3125550100&email=ann%40example.com&covers=2"
+    fields = parse_qs(_redact_post_data(body, {"content-type": "application/x-www-form-urlencoded"}))
+    assert fields["first_name"] == fields["last_name"] == fields["mobile_number"] == fields["email"] == ["<redacted>"]
+    assert fields["covers"] == ["2"]
+
+def test_other_bodies_dropped():
+    body = '--b\r\nContent-Disposition: form-data; name="email"\r\n\r\nann@example.com\r\n--b--'
+    assert _redact_post_data(body, {"Content-Type": "multipart/form-data; boundary=b"}) == "<redacted>"
+    assert _redact_post_data(None, {}) is None
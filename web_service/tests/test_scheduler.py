@@ -0,0 +1,38 @@
+import time
+
+import pytest
+
+from scheduler import FlowScheduler, job_deadline, DEFAULT_SLA, PRIORITY_AVAILABILITY, PRIORITY_BOOKING
+from utils import FlowCancelled
+
+def test_job_deadline_uses_reservation_time_ahead():
+    now = time.time()
+    deadline = job_deadline(PRIORITY_AVAILABILITY, {"date": "2099-01-01", "hour": 19, "minute": 30}, now=now)
+    assert deadline > now + DEFAULT_SLA[PRIORITY_AVAILABILITY]
+
+def test_job_deadline_past_reservation_time_falls_back_to_sla():
+    now = time.time()
+    deadline = job_deadline(PRIORITY_BOOKING, {"date": "2020-01-01", "hour": 19}, now=now)
+    assert deadline == now + DEFAULT_SLA[PRIORITY_BOOKING]
+
+def test_job_deadline_caller_sla_wins():
+    now = time.time()
+    assert job_deadline(PRIORITY_AVAILABILITY, {"date": "2099-01-01", "hour": 19}, sla=5, now=now) == now + 5
+
+def test_worker_survives_failed_and_cancelled_flows():
+    def run(flow, outcome):
+        if outcome == "cancelled":
+            raise FlowCancelled("caller went away")
+        if outcome == "error":
+            raise RuntimeError("flow failed")
+        return outcome
+
+    scheduler = FlowScheduler(workers=1, run=run)
+    try:
+        with pytest.raises(FlowCancelled):
+            scheduler.submit("make_reservation", sla=30, outcome="cancelled").result(timeout=5)
+        with pytest.raises(RuntimeError):
+            scheduler.submit("make_reservation", sla=30, outcome="error").result(timeout=5)
+        assert scheduler.submit("make_reservation", sla=30, outcome="done").result(timeout=5) == "done"
+    finally:
+        scheduler.close()
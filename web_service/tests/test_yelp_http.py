@@ -0,0 +1,100 @@
+import threading
+from datetime import date as date_cls, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from conftest import read_fixture
+import capabilities
+from http_client import AvailabilityParseError
+from yelp_http import parse_reservation_page, availability_from_page, exact_slot_available, check_availability_http
+
+RESTAURANT_ID = "fixture-bistro-chicago"
+
+def _booking_date():
+    day = date_cls.today() + timedelta(days=7)
+    return day.strftime("%Y-%m-%d"), day.strftime("%b ") + str(day.day)
+
+def _fixture_page(name):
+    date, date_value = _booking_date()
+    return date, parse_reservation_page(read_fixture(name).replace("__DATE__", date_value))
+
+def test_parse_reservation_page_reads_widget():
+    _, page = _fixture_page("yelp_reservations.html")
+    assert page.party_options == ["1 person", "2 people", "3 people", "4 people"]
+    assert page.slots == [("6:30 pm", True), ("6:45 pm", False), ("7:00 pm", True), ("7:30 pm", True)]
+    assert not page.no_availability
+
+def test_parse_reservation_page_no_availability():
+    _, page = _fixture_page("yelp_no_availability.html")
+    assert page.slots == []
+    assert page.no_availability
+
+def test_parse_reservation_page_rejects_other_pages():
+    with pytest.raises(AvailabilityParseError):
+        parse_reservation_page(read_fixture("yelp_bot_check.html"))
+
+def test_exact_slot_available_skips_disabled_slots():
+    _, page = _fixture_page("yelp_reservations.html")
+    assert exact_slot_available(page, 19, 0)
+    assert not exact_slot_available(page, 18, 45)
+
+def test_availability_from_page_alternatives():
+    date, page = _fixture_page("yelp_reservations.html")
+    assert availability_from_page(page, date, 19, 15, "2") == (False, None, "7 PM or 7:30 PM", None)
+
+def test_availability_from_page_rejections():
+    date, page = _fixture_page("yelp_reservations.html")
+    assert availability_from_page(page, date, 19, 0, "6") == (False, None, None, "The party size is bigger than maximum.")
+    assert availability_from_page(page, date, 19, 0, "0") == (False, None, None, "Party size is not in allowed range.")
+    assert availability_from_page(page, date, 19, 0, "two")[3].startswith("Unexpected error: ")
+    other_date = (date_cls.today() + timedelta(days=40)).strftime("%Y-%m-%d")
+    assert availability_from_page(page, other_date, 19, 0, "2")[3].endswith("is not in allowed range.")
+
+def test_availability_from_page_no_slots():
+    date, page = _fixture_page("yelp_no_availability.html")
+    assert availability_from_page(page, date, 19, 0, "2") == (False, None, None, "No time slot buttons found on the page.")
+
+@pytest.fixture
+def yelp_server():
+    """Serves the reservations fixture page for RESTAURANT_ID on a local port."""
+    _, date_value = _booking_date()
+    page = read_fixture("yelp_reservations.html").replace("__DATE__", date_value).encode("utf-8")
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.startswith(f"/reservations/{RESTAURANT_ID}?"):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(page)))
+                self.end_headers()
+                self.wfile.write(page)
+            else:
+                self.send_error(404)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+def test_check_availability_http_exact_slot(yelp_server):
+    date, _ = _booking_date()
+    result = check_availability_http(date, 19, 0, "2", RESTAURANT_ID, base_url=yelp_server)
+    assert result is not None
+    assert result == (True, None, None, None)
+
+def test_check_availability_http_learns_capabilities(yelp_server):
+    date, _ = _booking_date()
+    assert check_availability_http(date, 19, 0, "2", RESTAURANT_ID, base_url=yelp_server) is not None
+    profile = capabilities.get_profile("yelp", RESTAURANT_ID)
+    assert profile["party_sizes"] == [1, 2, 3, 4]
+    assert profile["max_allowed_days"] == 7
+
+def test_check_availability_http_falls_back_on_missing_page(yelp_server):
+    date, _ = _booking_date()
+    assert check_availability_http(date, 19, 0, "2", "unknown-restaurant", base_url=yelp_server) is None
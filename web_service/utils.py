@@ -1,9 +1,64 @@
+import contextvars
+import threading
 import time
 from datetime import datetime
 from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
 from selenium.common.exceptions import NoSuchElementException, TimeoutException
 from config import logger
 
+class FlowCancelled(BaseException):
+    """
+    Raised inside a flow whose caller has cancelled it. Like KeyboardInterrupt
+    it is not an Exception, so the flows' catch-all handlers let it through.
+    """
+
+class CancelToken:
+    """
+    Cooperative cancellation flag shared between an async caller and the
+    worker thread running a flow.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self.reason = None
+
+    def cancel(self, reason="cancelled"):
+        self.reason = reason
+        self._event.set()
+
+    def is_cancelled(self):
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise FlowCancelled(self.reason)
+
+# The token of the flow running in this context; driver_session attaches it to the driver.
+current_cancel_token = contextvars.ContextVar("current_cancel_token", default=None)
+
+class CancellableWait(WebDriverWait):
+    """
+    WebDriverWait that checks the driver's cancel token on every poll and
+    raises FlowCancelled once it is set, instead of waiting out the timeout.
+    """
+
+    def _cancellable(self, method):
+        token = getattr(self._driver, "cancel_token", None)
+        if token is None:
+            return method
+
+        def check(driver):
+            token.raise_if_cancelled()
+            return method(driver)
+        return check
+
+    def until(self, method, message=""):
+        return super().until(self._cancellable(method), message)
+
+    def until_not(self, method, message=""):
+        return super().until_not(self._cancellable(method), message)
+
 def find_element_with_timing(driver, by, xpath, description):
     """
     Attempts to find an element with timing and logs the process.
@@ -94,3 +149,90 @@ def validate_reservation_date(date: str, hour: int, minute: int) -> bool:
     input_datetime = datetime.strptime(date, "%Y-%m-%d").replace(hour=hour, minute=minute)
     now = datetime.now()
     return input_datetime > now
+
+def select_time_slot(slot_count, read_slot, requested_dt, base_index=3):
+    """
+    Picks the requested time or its nearest alternatives from the first seven
+    time slots, probing outward from base_index. read_slot(idx) returns
+    (time_text, available) and is only called for the slots actually checked.
+    Returns (exact_index, left_text, right_text).
+    """
+    base_time = None
+    if base_index < slot_count:
+        base_time_text = read_slot(base_index)[0]
+        try:
+            base_time = datetime.strptime(base_time_text, "%I:%M %p")
+        except ValueError as e:
+            logger.warning("Could not parse base time text '%s': %s", base_time_text, e)
+
+    order = [3, 2, 4, 1, 5, 0, 6] if base_time and base_time > requested_dt else [3, 4, 2, 5, 1, 6, 0]
+    order = [i for i in order if i < slot_count]
+
+    candidate_left = None
+    candidate_right = None
+    for idx in order:
+        time_text, available = read_slot(idx)
+        try:
+            slot_time = datetime.strptime(time_text, "%I:%M %p")
+        except ValueError as e:
+            logger.warning("Could not parse time_text '%s' from button %d: %s", time_text, idx+1, e)
+            continue
+
+        logger.info("Button %d: time_text='%s', available=%s", idx+1, time_text, available)
+        if not available:
+            continue
+
+        if slot_time == requested_dt:
+            logger.info("Exact requested time found at button %d and available.", idx+1)
+            return idx, None, None
+        elif slot_time < requested_dt and candidate_left is None:
+            candidate_left = time_text
+            logger.info("Found left alternative: %s at button %d", time_text, idx+1)
+        elif slot_time > requested_dt and candidate_right is None:
+            candidate_right = time_text
+            logger.info("Found right alternative: %s at button %d", time_text, idx+1)
+
+        if candidate_left and candidate_right:
+            break
+    return None, candidate_left, candidate_right
+
+def format_alternatives(candidate_left, candidate_right):
+    """
+    Formats the alternative times the way callers expect, e.g. '6:30 PM or 8 PM'.
+    """
+    alternatives = []
+    if candidate_left:
+        alternatives.append(candidate_left.upper().replace(":00", ""))
+    if candidate_right:
+        alternatives.append(candidate_right.upper().replace(":00", ""))
+    return " or ".join(alternatives) if alternatives else "No alternative times available"
+
+def time_difference_in_minutes(time1, time2):
+    """
+    Returns the absolute difference in minutes between two 'HH:MM' times.
+    """
+    fmt = "%H:%M"
+    t1 = datetime.strptime(time1, fmt)
+    t2 = datetime.strptime(time2, fmt)
+
+    diff = abs((t2 - t1).total_seconds()) // 60
+    return int(diff)
+
+def find_nearest_times(date_arr, date_cur):
+    """
+    Returns the closest 'HH:MM' times at or before and after date_cur (None where there is none).
+    """
+    date_cur = datetime.strptime(date_cur, "%H:%M")
+    date_arr = sorted([datetime.strptime(t, "%H:%M") for t in date_arr])
+    
+    before = None
+    after = None
+    
+    for time in date_arr:
+        if time <= date_cur:
+            before = time.strftime("%H:%M")
+        elif time > date_cur and after is None:
+            after = time.strftime("%H:%M")
+            break
+    
+    return before, after
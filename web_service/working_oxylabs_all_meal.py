@@ -3,32 +3,31 @@ import logging
 import time
 import random
 import string
-import tempfile
-import zipfile
-import pytz
 from datetime import datetime
 from zoneinfo import ZoneInfo
-from logging.handlers import RotatingFileHandler
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import Select
 from selenium.common.exceptions import TimeoutException, NoSuchElementException, WebDriverException, InvalidElementStateException
-from selenium import webdriver
 from selenium.webdriver.common.keys import Keys
-from webdriver_manager.chrome import ChromeDriverManager
+from config import logger
+from driver import DEFAULT_LAUNCH_PROFILE
+from lifecycle import driver_session, DriverUnavailable
+from pool import driver_pool
+from utils import find_nearest_times, time_difference_in_minutes, CancellableWait
+from opentable_http import check_availability_opentable_http, restaurant_rid
+from recorder import record_step
+from cookie_jar import jar_identity, capture_session_state
+from capabilities import precheck, nearest_time_option, learn_times, learn_party_sizes, profile_stale
+from singleflight import availability_flights
+from cache import day_slot_cache, cached_availability, invalidates_restaurant, opentable_restaurant_from_url
+
+AVAILABILITY_LIST_XPATH = "//ul[contains(@class, 'styled__Wrapper-sc-1q1dpdt-5 hqigaV')]"
+ALL_MEALS_PROBE_SPACING = 120   # minutes between time picker probes; each search lists the slots around its time
+ALL_MEALS_REFRESH_WAIT = 3      # seconds to wait for the results list to re-render after another search
+# Reads every option value of a <select> in one round trip.
+OPTION_VALUES_SCRIPT = "return Array.from(arguments[0].options).map(function (o) { return o.value; });"
 
-# Define Mexico City timezone
-MEXICO_TZ = pytz.timezone("America/Mexico_City")
-
-class MexicoTimeFormatter(logging.Formatter):
-    """Custom formatter to log times in Mexico City time zone."""
-    def formatTime(self, record, datefmt=None):
-        dt = datetime.fromtimestamp(record.created, tz=MEXICO_TZ)
-        return dt.strftime(datefmt or "%Y-%m-%d %H:%M:%S %Z")
-    
 def get_ordinal_suffix(day: int) -> str:
     """Returns the ordinal suffix for a given day."""
     if 11 <= day <= 13:  # Handle 11th, 12th, 13th as special cases
@@ -36,30 +35,6 @@ def get_ordinal_suffix(day: int) -> str:
     last_digit = day % 10
     return {1: "st", 2: "nd", 3: "rd"}.get(last_digit, "th")
 
-# Log format and date format
-log_format = "%(asctime)s %(levelname)s: %(message)s"
-date_format = "%Y-%m-%d %H:%M:%S %Z"
-
-# Create log file handler with rotation (5MB per file, keeping last 3 logs)
-log_file = "app.log"
-file_handler = RotatingFileHandler(log_file, maxBytes=5*1024*1024, backupCount=3)
-file_formatter = MexicoTimeFormatter(fmt=log_format, datefmt=date_format)
-file_handler.setFormatter(file_formatter)
-
-# Create console handler
-console_handler = logging.StreamHandler()
-console_formatter = MexicoTimeFormatter(fmt=log_format, datefmt=date_format)
-console_handler.setFormatter(console_formatter)
-
-# Configure root logger
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)  # Change to DEBUG for detailed logs
-logger.addHandler(file_handler)
-logger.addHandler(console_handler)
-
-# Example log to test
-logger.info("This log should show Mexico City time.")
-
 def generate_random_email():
     domains = ["gmail.com", "yahoo.com", "outlook.com", "example.com"]
     
@@ -69,185 +44,6 @@ def generate_random_email():
     domain = random.choice(domains)    
     return f"{username}@{domain}"
 
-def time_difference_in_minutes(time1, time2):
-    fmt = "%H:%M"
-    t1 = datetime.strptime(time1, fmt)
-    t2 = datetime.strptime(time2, fmt)
-
-    diff = abs((t2 - t1).total_seconds()) // 60
-    return int(diff)
-
-def find_nearest_times(date_arr, date_cur):
-    date_cur = datetime.strptime(date_cur, "%H:%M")
-    date_arr = sorted([datetime.strptime(t, "%H:%M") for t in date_arr])
-    
-    before = None
-    after = None
-    
-    for time in date_arr:
-        if time <= date_cur:
-            before = time.strftime("%H:%M")
-        elif time > date_cur and after is None:
-            after = time.strftime("%H:%M")
-            break
-    
-    return before, after
-
-def create_proxy_auth_extension(proxy_host, proxy_port, proxy_username, proxy_password, scheme='http'):
-    """
-    Creates a Chrome extension (as a .zip file) to handle proxy authentication.
-    Returns the file path to the generated extension.
-    """
-    try:
-        logger.info("Starting proxy authentication extension creation.")
-
-        manifest_json = """
-        {
-            "version": "1.0.0",
-            "manifest_version": 2,
-            "name": "Chrome Proxy",
-            "permissions": [
-                "proxy",
-                "tabs",
-                "unlimitedStorage",
-                "storage",
-                "<all_urls>",
-                "webRequest",
-                "webRequestBlocking"
-            ],
-            "background": {
-                "scripts": ["background.js"]
-            }
-        }
-        """
-        background_js = f"""
-        var config = {{
-            mode: "fixed_servers",
-            rules: {{
-              singleProxy: {{
-                scheme: "{scheme}",
-                host: "{proxy_host}",
-                port: parseInt({proxy_port})
-              }},
-              bypassList: ["localhost"]
-            }}
-          }};
-
-        chrome.proxy.settings.set({{value: config, scope: "regular"}}, function() {{}});
-
-        function callbackFn(details) {{
-            return {{
-                authCredentials: {{
-                    username: "{proxy_username}",
-                    password: "{proxy_password}"
-                }}
-            }};
-        }}
-
-        chrome.webRequest.onAuthRequired.addListener(
-            callbackFn,
-            {{urls: ["<all_urls>"]}},
-            ["blocking"]
-        );
-        """
-
-        plugin_file = tempfile.NamedTemporaryFile(suffix='.zip', delete=False)
-
-        with zipfile.ZipFile(plugin_file, 'w') as zp:
-            zp.writestr("manifest.json", manifest_json.strip())
-            zp.writestr("background.js", background_js.strip())
-
-        plugin_file.close()
-
-        logger.info("Successfully created proxy authentication extension at: %s", plugin_file.name)
-        return plugin_file.name
-
-    except Exception as e:
-        logger.critical("Failed to create proxy authentication extension: %s", e, exc_info=True)
-        return None
-
-def setup_driver(browser_url="",
-                 proxy_host=None,
-                 proxy_port=None,
-                 proxy_username=None,
-                 proxy_password=None,
-                 proxy_scheme="http"):
-    """
-    Initialize a Chrome webdriver with options optimized for speed.
-    If proxy settings are provided (using Oxylabs), the proxy is configured.
-    """
-    logger.info("Starting driver setup.")
-
-    options = webdriver.ChromeOptions()
-    options.add_argument("--no-sandbox")
-    options.add_argument("--window-size=1920,1080")
-    options.page_load_strategy = "eager"
-
-    prefs = {
-        "profile.managed_default_content_settings.images": 2,
-        "profile.managed_default_content_settings.stylesheets": 2,
-        "profile.managed_default_content_settings.fonts": 2,
-        "profile.managed_default_content_settings.plugins": 2,
-    }
-    options.add_experimental_option("prefs", prefs)
-
-    # Configure proxy if details are provided
-    if proxy_host and proxy_port:
-        try:
-            if proxy_username and proxy_password:
-                proxy_extension = create_proxy_auth_extension(proxy_host, proxy_port, proxy_username, proxy_password, scheme=proxy_scheme)
-                options.add_extension(proxy_extension)
-                logger.info("Using proxy authentication extension for %s:%s", proxy_host, proxy_port)
-            else:
-                options.add_argument(f"--proxy-server={proxy_scheme}://{proxy_host}:{proxy_port}")
-                logger.info("Configured proxy: %s:%s using scheme %s", proxy_host, proxy_port, proxy_scheme)
-        except Exception as e:
-            logger.critical("Failed to configure proxy: %s", e, exc_info=True)
-            raise
-
-    # Initialize WebDriver
-    try:
-        if browser_url:
-            logger.info("Initializing remote WebDriver at URL: %s", browser_url)
-            driver = webdriver.Remote(command_executor=browser_url, options=options)
-        else:
-            logger.info("Initializing local Chrome WebDriver.")
-            driver = webdriver.Chrome(options=options)
-        logger.info("WebDriver initialized successfully.")
-    except WebDriverException as e:
-        logger.critical("WebDriver initialization failed.", exc_info=True)
-        raise e
-
-    # Configure Chrome DevTools Protocol (CDP) to block unnecessary resources
-    try:
-        driver.execute_cdp_cmd("Network.enable", {})
-        driver.execute_cdp_cmd(
-            "Network.setBlockedURLs",
-            {"urls": [
-                "*googleapis.com/maps*",
-                "*googleapis.com/vt?*",
-                "*maps.gstatic.com*",
-                "*.jpg", "*.jpeg", "*.png", "*.gif",
-                "*.css", "*.woff", "*.woff2", "*.ttf",
-                "*google-analytics.com*", "*adservice.google.com*",
-                "*doubleclick.net*", "*facebook.net*"
-            ]}
-        )
-        logger.info("CDP block list configured successfully.")
-    except Exception as e:
-        logger.warning("Error setting CDP block list: %s", e, exc_info=True)
-
-    driver.set_page_load_timeout(20)
-    # try:
-    #     logger.info("Checking public IP address...")
-    #     driver.get("https://api.ipify.org")
-    #     ip_address = driver.find_element(By.TAG_NAME, "body").text
-    #     logger.info("Public IP address: %s", ip_address)
-    # except Exception as e:
-    #     logger.error("Failed to retrieve public IP address: %s", e)
-    logger.info("WebDriver setup completed successfully.")
-    return driver
-
 def find_element_with_timing(driver, by, xpath, description):
     """
     Attempts to find an element with timing and detailed logging.
@@ -432,7 +228,7 @@ def receiving_reservation(driver_local, first_name_local, last_name_local, mobil
         logger.error(msg)
         return False, msg
     try:
-        confirmReservationButton = WebDriverWait(driver_local, 5).until(
+        confirmReservationButton = CancellableWait(driver_local, 5).until(
             EC.element_to_be_clickable((By.XPATH, "//button[@type='submit']"))
         )
         confirmReservationButton.click()
@@ -442,7 +238,7 @@ def receiving_reservation(driver_local, first_name_local, last_name_local, mobil
         logger.error(msg)
         return False, msg
     try:
-        timeConformButton = WebDriverWait(driver_local, 10).until(
+        timeConformButton = CancellableWait(driver_local, 10).until(
             EC.element_to_be_clickable((By.XPATH, "//button[@role='link']"))
         )
         timeConformButton.click()
@@ -452,7 +248,7 @@ def receiving_reservation(driver_local, first_name_local, last_name_local, mobil
         logger.error(msg)
         return False, msg
     
-    cancelReservationLinkTag = WebDriverWait(driver_local, 3).until(
+    cancelReservationLinkTag = CancellableWait(driver_local, 3).until(
         EC.element_to_be_clickable((By.XPATH, "//a[contains(@data-auto, 'cancelReservationLink')]"))
     )
     cancelReservationLink = cancelReservationLinkTag.get_attribute("href")
@@ -471,7 +267,7 @@ def receiving_reservation(driver_local, first_name_local, last_name_local, mobil
     )
 
     logger.info("Captured cancel reservation URL successfully. URL: %s", cancelReservationURL)
-    modifyReservationLinkTag = WebDriverWait(driver_local, 3).until(
+    modifyReservationLinkTag = CancellableWait(driver_local, 3).until(
         EC.element_to_be_clickable((By.XPATH, "//a[contains(@data-auto, 'modifyReservationLink')]"))
     )
     modifyReservationLink = modifyReservationLinkTag.get_attribute("href")
@@ -496,11 +292,114 @@ def receiving_reservation(driver_local, first_name_local, last_name_local, mobil
         logger.error("Failed to capture modify reservation URL. Error: %s", e)
         return False, f"Error: {e}"
     confirmation_url = cancelReservationURL
+    record_step(driver_local, "confirmation")
     logger.info("Reservation created successfully. CancelReservation URL: %s", confirmation_url)
     total_elapsed = time.perf_counter() - overall_start
     logger.info("Total time in receiving_reservation: %.4f seconds", total_elapsed)
     return True, confirmation_url
 
+def _calendar_shows(header_text, target):
+    # The header normally reads "March 2025"; without a year only the month can be matched.
+    return target.strftime("%B") in header_text and (str(target.year) in header_text or not any(c.isdigit() for c in header_text))
+
+def select_widget_date(driver, date):
+    """
+    Picks a date in the widget's react-datepicker, clicking Next Month only
+    as often as needed from the month the calendar currently shows.
+    """
+    start = time.perf_counter()
+    datePicker = CancellableWait(driver, 15).until(
+        EC.presence_of_element_located((By.XPATH, "//input[contains(@data-auto, 'calendarDatePicker')]"))
+    )
+    datePicker.click()
+    target = datetime.strptime(date, "%Y-%m-%d")
+    monthName = target.strftime("%B")
+    month_clicks = 0
+    calendarHeader = driver.find_element(By.CLASS_NAME, "react-datepicker__current-month")
+    while not _calendar_shows(calendarHeader.text, target):
+        if month_clicks >= 24:
+            raise NoSuchElementException(f"Calendar never reached {monthName} {target.year}.")
+        driver.find_element(By.XPATH, "//button[contains(@aria-label, 'Next Month')]").click()
+        month_clicks += 1
+        calendarHeader = driver.find_element(By.CLASS_NAME, "react-datepicker__current-month")
+
+    day = target.day
+    ordinal_suffix = get_ordinal_suffix(day)
+    dayButton = driver.find_element(By.XPATH, f"//div[contains(@aria-label, '{monthName} {day}{ordinal_suffix}, {target.year}')]")
+    dayButton.click()
+    logger.info("Date %s selected in %.4f seconds (%d month click(s))", date, time.perf_counter() - start, month_clicks)
+
+def day_slot_key(restaurant_id, date, party_size):
+    """Returns the day slot cache key for a widget URL, date and party size."""
+    try:
+        restaurant = restaurant_rid(restaurant_id)
+    except ValueError:
+        restaurant = restaurant_id
+    return (restaurant, date, str(party_size))
+
+def availability_from_day_slots(day_slots, hour, minute):
+    """
+    Answers a requested time from a full day's slot set, in the same form
+    as make_reservation_external's availability result.
+    """
+    requested_time = f"{hour:02d}:{minute:02d}"
+    if requested_time in day_slots:
+        return (True, None, None, "Exact time available but booking not attempted (make_booking is False).")
+    nearestTimeBeforeValue, nearestTimeAfterValue = find_nearest_times(day_slots, requested_time)
+    nearestTime_string = f"Closet time before = {nearestTimeBeforeValue}, Closet time after = {nearestTimeAfterValue}"
+    return (False, None, None, f"Exact time not available. {nearestTime_string}")
+
+def collect_day_slots(driver):
+    """
+    Collects every bookable slot ('HH:MM') for the party size and date already
+    set in the widget by stepping the time picker through the day, one search
+    per ALL_MEALS_PROBE_SPACING minutes, without reloading the page.
+    """
+    start = time.perf_counter()
+    timePicker = CancellableWait(driver, 15).until(
+        EC.presence_of_element_located((By.XPATH, "//select[contains(@data-auto, 'timePicker')]"))
+    )
+    probes = []
+    last_probe = None
+    for value in driver.execute_script(OPTION_VALUES_SCRIPT, timePicker):
+        try:
+            option_minutes = int(value.split(":")[0]) * 60 + int(value.split(":")[1])
+        except (AttributeError, IndexError, ValueError):
+            continue
+        if last_probe is None or option_minutes - last_probe >= ALL_MEALS_PROBE_SPACING:
+            probes.append(value)
+            last_probe = option_minutes
+
+    slots = set()
+    previous_list = None
+    for value in probes:
+        Select(driver.find_element(By.XPATH, "//select[contains(@data-auto, 'timePicker')]")).select_by_value(value)
+        CancellableWait(driver, 10).until(
+            EC.element_to_be_clickable((By.XPATH, "//button[@type='submit']"))
+        ).click()
+        if previous_list is not None:
+            try:
+                CancellableWait(driver, ALL_MEALS_REFRESH_WAIT).until(EC.staleness_of(previous_list))
+            except TimeoutException:
+                pass
+        try:
+            previous_list = CancellableWait(driver, 10).until(
+                EC.presence_of_element_located((By.XPATH, AVAILABILITY_LIST_XPATH))
+            )
+            buttons = previous_list.find_elements(By.XPATH, ".//button[contains(@role, 'link')]")
+        except TimeoutException:
+            logger.info("No availability listed around %s.", value)
+            continue
+        for button in buttons:
+            if button.text != "" and "tify" not in button.text:
+                try:
+                    slots.add(datetime.strptime(button.text, "%I:%M %p").strftime("%H:%M"))
+                except ValueError:
+                    continue
+    logger.info("Collected %d slots from %d searches in %.4f seconds", len(slots), len(probes), time.perf_counter() - start)
+    return sorted(slots)
+
+@cached_availability("opentable", opentable_restaurant_from_url)
 def make_reservation_external(
     date: str = '2025-03-04',
     hour: int = 19,
@@ -518,293 +417,442 @@ def make_reservation_external(
     proxy_password: str = None,
     proxy_scheme: str = "http",
     make_booking: bool = False,
-    special_requests: str = None
+    special_requests: str = None,
+    launch_profile: str = DEFAULT_LAUNCH_PROFILE,
+    request_allowlist: str = None,
+    use_http_probe: bool = True,
+    record_network: bool = False,
+    use_session_jar: bool = True,
+    all_meals: bool = False,
+    use_cache: bool = True
 ):
     overall_start = time.perf_counter()
-    driver = None
     try:
-        try:
-            validate_date(date)
-            requested_am_pm = convert_to_am_pm(hour, minute)
-        except ValueError as e:
-            return (False, None, None, str(e))
-        
-        if validate_reservation_date(date, hour, minute):
-            logger.info("Valid reservation date and time.")
-        else:
-            logger.error("Invalid reservation: Date and time is in the past.")
-            return (False, None, None, "Invalid reservation: Date and time is in the past.")
-        
-        logger.info(
-            "Attempting reservation with details: Date: %s, Time: %02d:%02d (%s), Party Size: %s, First Name: %s, Last Name: %s, Phone: %s, Email: %s, Restaurant ID: %s, Special Requests: %s",
-            date, hour, minute, requested_am_pm, party_size, first_name, last_name, phone_number, email, restaurant_id, special_requests
-        )
-        
-        try:
-            # driver = setup_driver(browser_url, proxy_host, proxy_port, proxy_username, proxy_password, proxy_scheme)
-            chrome_options = webdriver.ChromeOptions()
-            chrome_options.add_argument("--disable-popup-blocking")
-            chrome_options.add_argument("--disable-notifications")
-            chrome_options.add_argument("--disable-infobars")
-            driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=chrome_options)
-            driver.set_window_size(1300, 1070)
-            logger.info("WebDriver initialized successfully.")
-        except WebDriverException as e:
-            logger.exception("WebDriver initialization failed.")
-            return (False, None, None, f"WebDriver error: {e}")
+        validate_date(date)
+        requested_am_pm = convert_to_am_pm(hour, minute)
+    except ValueError as e:
+        return (False, None, None, str(e))
+    
+    if validate_reservation_date(date, hour, minute):
+        logger.info("Valid reservation date and time.")
+    else:
+        logger.error("Invalid reservation: Date and time is in the past.")
+        return (False, None, None, "Invalid reservation: Date and time is in the past.")
+    
+    logger.info(
+        "Attempting reservation with details: Date: %s, Time: %02d:%02d (%s), Party Size: %s, First Name: %s, Last Name: %s, Phone: %s, Email: %s, Restaurant ID: %s, Special Requests: %s",
+        date, hour, minute, requested_am_pm, party_size, first_name, last_name, phone_number, email, restaurant_id, special_requests
+    )
 
-        try:
-            if make_booking:
-                logger.info("Checking reservation availability for booking...")
-            else:
-                logger.info("Checking reservation availability (no booking attempt)...")
-            reservation_link = restaurant_id
-            logger.info("Navigating to reservation link: %s", reservation_link)
-            start = time.perf_counter()
-            driver.get(reservation_link)
-            elapsed = time.perf_counter() - start
-            logger.info("Navigation completed in %.4f seconds", elapsed)
-            logger.info("Setting up party size... ")
-            start = time.perf_counter()
+    capability_key = opentable_restaurant_from_url(restaurant_id) or restaurant_id
+    rejection = precheck("opentable", capability_key, date, party_size)
+    if rejection is not None:
+        return rejection
+
+    if not make_booking:
+        day_slots = day_slot_cache.get(day_slot_key(restaurant_id, date, party_size))
+        if day_slots is not None:
+            logger.info("Answered from the cached slots for %s.", date)
+            return availability_from_day_slots(day_slots, hour, minute)
+
+    if use_http_probe and not make_booking and not all_meals:
+        result = check_availability_opentable_http(date, hour, minute, party_size, restaurant_id,
+                                                   proxy_host, proxy_port, proxy_username, proxy_password, proxy_scheme)
+        if result is not None:
+            logger.info("Total process time: %.4f seconds", time.perf_counter() - overall_start)
+            return result
+
+    try:
+        with driver_session(driver_pool, browser_url, proxy_host, proxy_port, proxy_username, proxy_password, proxy_scheme,
+                            launch_profile, request_allowlist, flow="make_reservation_external",
+                            record_network=record_network, session_jar=jar_identity(proxy_host, proxy_port, proxy_username, proxy_scheme) if use_session_jar else None) as driver:
+            logger.info("WebDriver initialized successfully.")
             try:
-                partySizePicker = driver.find_element(By.XPATH, "//select[contains(@data-auto, 'partySizePicker')]")
-            except TimeoutException:
-                logger.error("Party size picker not found within the timeout period.")
-                return (False, None, None, "Party size picker not found.")
+                driver.set_window_size(1300, 1070)
+                if make_booking:
+                    logger.info("Checking reservation availability for booking...")
+                else:
+                    logger.info("Checking reservation availability (no booking attempt)...")
+                reservation_link = restaurant_id
+                logger.info("Navigating to reservation link: %s", reservation_link)
+                start = time.perf_counter()
+                driver.get(reservation_link)
+                elapsed = time.perf_counter() - start
+                logger.info("Navigation completed in %.4f seconds", elapsed)
+                record_step(driver, "widget_page")
+                logger.info("Setting up party size... ")
+                start = time.perf_counter()
+                try:
+                    partySizePicker = driver.find_element(By.XPATH, "//select[contains(@data-auto, 'partySizePicker')]")
+                except TimeoutException:
+                    logger.error("Party size picker not found within the timeout period.")
+                    return (False, None, None, "Party size picker not found.")
                         
-            try:
-                select_partySize = Select(partySizePicker)
-                select_partySize.select_by_value(f"{party_size}")
-            except Exception as e:
-                logger.error("Error selecting party size: %s", e)
-                return (False, None, None, f"Error selecting party size: {e}")  
-            
-            elapsed = time.perf_counter() - start
-            logger.info("Party size set up in %.4f seconds", elapsed)
+                if profile_stale("opentable", capability_key):
+                    try:
+                        learn_party_sizes("opentable", capability_key,
+                                          [v for v in driver.execute_script(OPTION_VALUES_SCRIPT, partySizePicker) if str(v).isdigit()])
+                    except WebDriverException as e:
+                        logger.info("Could not read party size options: %s", e)
+                try:
+                    select_partySize = Select(partySizePicker)
+                    select_partySize.select_by_value(f"{party_size}")
+                except Exception as e:
+                    logger.error("Error selecting party size: %s", e)
+                    return (False, None, None, f"Error selecting party size: {e}")  
             
+                elapsed = time.perf_counter() - start
+                logger.info("Party size set up in %.4f seconds", elapsed)
             
-            logger.info("Setting up party date: %s", date)
-            start = time.perf_counter()
-            try:
-                datePicker = WebDriverWait(driver, 15).until(
-                    EC.presence_of_element_located((By.XPATH, "//input[contains(@data-auto, 'calendarDatePicker')]"))
-                )
-                datePicker.click()                    
-                calendarHeader = driver.find_element(By.CLASS_NAME, "react-datepicker__current-month")
-                monthName = datetime.strptime(date, "%Y-%m-%d").strftime("%B")
-                while monthName not in calendarHeader.text:
-                    nextMonthButton = driver.find_element(By.XPATH, "//button[contains(@aria-label, 'Next Month')]")
-                    nextMonthButton.click()
-                    calendarHeader = driver.find_element(By.CLASS_NAME, "react-datepicker__current-month")
-                
-                day = datetime.strptime(date, "%Y-%m-%d").day
-                ordinal_suffix = get_ordinal_suffix(day)
-                dayButton = driver.find_element(By.XPATH, f"//div[contains(@aria-label, '{monthName} {day}{ordinal_suffix}, {datetime.strptime(date, '%Y-%m-%d').year}')]")
-                dayButton.click()
             
-            except TimeoutException:
-                logger.error("Date picker not found within the timeout period.")
-                return (False, None, None, "Date picker not found.")
+                logger.info("Setting up party date: %s", date)
+                try:
+                    select_widget_date(driver, date)
+                except TimeoutException:
+                    logger.error("Date picker not found within the timeout period.")
+                    return (False, None, None, "Date picker not found.")
+
+                if all_meals and not make_booking:
+                    try:
+                        day_slots = collect_day_slots(driver)
+                    except TimeoutException:
+                        logger.error("Time picker not found within the timeout period.")
+                        return (False, None, None, "Time picker not found.")
+                    record_step(driver, "availability_results")
+                    capture_session_state(driver)
+                    if day_slots:
+                        # An empty set may be a results list that never rendered; do not remember it.
+                        day_slot_cache.set(day_slot_key(restaurant_id, date, party_size), day_slots)
+                    logger.info("Total process time: %.4f seconds", time.perf_counter() - overall_start)
+                    return availability_from_day_slots(day_slots, hour, minute)
             
-            requested_time = f"{hour:02d}:{minute:02d}"
+                requested_time = f"{hour:02d}:{minute:02d}"
             
-            logger.info("Setting up party time: %s", requested_time)
-            start = time.perf_counter()
-            try:
-                timePicker = WebDriverWait(driver, 15).until(
-                    EC.presence_of_element_located((By.XPATH, "//select[contains(@data-auto, 'timePicker')]"))
-                )
-            except TimeoutException:
-                logger.error("Time picker not found within the timeout period.")
-                return (False, None, None, "Time picker not found.")
+                logger.info("Setting up party time: %s", requested_time)
+                start = time.perf_counter()
+                try:
+                    timePicker = CancellableWait(driver, 15).until(
+                        EC.presence_of_element_located((By.XPATH, "//select[contains(@data-auto, 'timePicker')]"))
+                    )
+                except TimeoutException:
+                    logger.error("Time picker not found within the timeout period.")
+                    return (False, None, None, "Time picker not found.")
             
-            nearestTimeBeforeValue = None
-            nearestTimeAfterValue = None
-            min_diff = int(99999999)
-            cur_idx = -1
-            total_idx = -1
-            nearestTime_option = None
-            isExactTimeAvailable = False
-            try:    
-                select_partyTime = Select(timePicker)
-                available_values = [option.get_attribute("value") for option in select_partyTime.options]
-                option_exists = requested_time in available_values
-                nearestTime_option = available_values[0]
-                if option_exists == True:
-                    select_partyTime.select_by_value(f"{requested_time}")
-                    isExactTimeAvailable = True
-                else:
-                    for option in available_values:
-                        total_idx += 1
-                        if time_difference_in_minutes(requested_time, option) < min_diff:
-                            nearestTime_option = option
-                            min_diff = time_difference_in_minutes(requested_time, option)
-                            cur_idx = total_idx
+                nearestTimeBeforeValue = None
+                nearestTimeAfterValue = None
+                min_diff = int(99999999)
+                cur_idx = -1
+                total_idx = -1
+                nearestTime_option = None
+                isExactTimeAvailable = False
+                try:    
+                    select_partyTime = Select(timePicker)
+                    # The picker's options rarely change; the profile saves reading every one of them.
+                    known_option = nearest_time_option("opentable", capability_key, requested_time)
+                    if known_option is not None:
+                        try:
+                            select_partyTime.select_by_value(known_option)
+                            isExactTimeAvailable = known_option == requested_time
+                        except NoSuchElementException:
+                            logger.info("Known time options are out of date; reading the time picker.")
+                            known_option = None
+                    if known_option is None:
+                        available_values = driver.execute_script(OPTION_VALUES_SCRIPT, timePicker)
+                        learn_times("opentable", capability_key, time_options=available_values)
+                        option_exists = requested_time in available_values
+                        nearestTime_option = available_values[0]
+                        if option_exists == True:
+                            select_partyTime.select_by_value(f"{requested_time}")
+                            isExactTimeAvailable = True
+                        else:
+                            for option in available_values:
+                                total_idx += 1
+                                if time_difference_in_minutes(requested_time, option) < min_diff:
+                                    nearestTime_option = option
+                                    min_diff = time_difference_in_minutes(requested_time, option)
+                                    cur_idx = total_idx
                             
-                    print(f"cur_idx = {cur_idx}, nearestTime_option = {nearestTime_option}")
-                    select_partyTime.select_by_value(f"{nearestTime_option}")
-            except Exception as e:
-                logger.error("Error selecting party time: %s", e)
-                return (False, None, None, f"Error selecting party time: {e}")
+                            logger.debug("cur_idx = %s, nearestTime_option = %s", cur_idx, nearestTime_option)
+                            select_partyTime.select_by_value(f"{nearestTime_option}")
+                except Exception as e:
+                    logger.error("Error selecting party time: %s", e)
+                    return (False, None, None, f"Error selecting party time: {e}")
             
-            elapsed = time.perf_counter() - start
-            logger.info("Party time set up in %.4f seconds", elapsed)
+                elapsed = time.perf_counter() - start
+                logger.info("Party time set up in %.4f seconds", elapsed)
             
-            logger.info("Locating availability button... ")
-            start = time.perf_counter()
-            findingTable_button = WebDriverWait(driver, 10).until(
-                EC.element_to_be_clickable((By.XPATH, "//button[@type='submit']"))
-            )
-            findingTable_button.click()
-            elapsed = time.perf_counter() - start
-            logger.info("Clicked finding table button in %.4f seconds", elapsed)
+                logger.info("Locating availability button... ")
+                start = time.perf_counter()
+                findingTable_button = CancellableWait(driver, 10).until(
+                    EC.element_to_be_clickable((By.XPATH, "//button[@type='submit']"))
+                )
+                findingTable_button.click()
+                elapsed = time.perf_counter() - start
+                logger.info("Clicked finding table button in %.4f seconds", elapsed)
             
-            availabilityButtons = []
+                availabilityButtons = []
             
-            try:
-                div_buttons = WebDriverWait(driver, 10).until(
-                    EC.presence_of_element_located((By.XPATH, "//ul[contains(@class, 'styled__Wrapper-sc-1q1dpdt-5 hqigaV')]"))
-                )
+                try:
+                    div_buttons = CancellableWait(driver, 10).until(
+                        EC.presence_of_element_located((By.XPATH, AVAILABILITY_LIST_XPATH))
+                    )
                 
-                WebDriverWait(driver, 20).until(
-                    EC.presence_of_element_located((By.XPATH, ".//button[contains(@role, 'link')]"))
-                )
+                    CancellableWait(driver, 20).until(
+                        EC.presence_of_element_located((By.XPATH, ".//button[contains(@role, 'link')]"))
+                    )
                 
-                availabilityButtons = div_buttons.find_elements(By.XPATH, ".//button[contains(@role, 'link')]")
-                logger.info("Found %d availability buttons.", len(availabilityButtons))
-            except Exception as e:
-                logger.error("Availability buttons not found within the wait period.")
-                return (False, None, None, "Availability buttons not found.")
+                    availabilityButtons = div_buttons.find_elements(By.XPATH, ".//button[contains(@role, 'link')]")
+                    logger.info("Found %d availability buttons.", len(availabilityButtons))
+                    record_step(driver, "availability_results")
+                    capture_session_state(driver)
+                except Exception as e:
+                    logger.error("Availability buttons not found within the wait period.")
+                    return (False, None, None, "Availability buttons not found.")
             
-            exact_slot = None
-            isExact = False
-            isEmptyTimeButton = True
+                exact_slot = None
+                isExact = False
+                isEmptyTimeButton = True
     
-            allAvailabilityTimes = []
+                allAvailabilityTimes = []
 
-            exactTime = convert_to_am_pm( int(requested_time.split(":")[0]), int(requested_time.split(":")[1]) )
+                exactTime = convert_to_am_pm( int(requested_time.split(":")[0]), int(requested_time.split(":")[1]) )
             
-            for button in availabilityButtons:
-                if button.text == exactTime:
-                    exact_slot = button
-                    isEmptyTimeButton = False
-                    isExact = True
-                    break
-            if isExact == False:
-                isExactTimeAvailable = False
-    
-            #   ===== isExactTimeAvailable = False =========
-            if isExactTimeAvailable == False:
                 for button in availabilityButtons:
-                    if button.text != "" and "tify" not in button.text:
-                        time_button = datetime.strptime(button.text, "%I:%M %p").strftime("%H:%M")
-                        allAvailabilityTimes.append(time_button)
+                    if button.text == exactTime:
+                        exact_slot = button
+                        isEmptyTimeButton = False
+                        isExact = True
+                        break
+                if isExact == False:
+                    isExactTimeAvailable = False
+    
+                #   ===== isExactTimeAvailable = False =========
+                if isExactTimeAvailable == False:
+                    for button in availabilityButtons:
+                        if button.text != "" and "tify" not in button.text:
+                            time_button = datetime.strptime(button.text, "%I:%M %p").strftime("%H:%M")
+                            allAvailabilityTimes.append(time_button)
                         
-                nearestTimeBeforeValue, nearestTimeAfterValue = find_nearest_times(allAvailabilityTimes, requested_time)
+                    nearestTimeBeforeValue, nearestTimeAfterValue = find_nearest_times(allAvailabilityTimes, requested_time)
                         
-                nearestTime_string = f"Closet time before = {nearestTimeBeforeValue}, Closet time after = {nearestTimeAfterValue}"
-                return (False, None, None, f"Exact time not available. {nearestTime_string}")
-            #   ============================================
+                    nearestTime_string = f"Closet time before = {nearestTimeBeforeValue}, Closet time after = {nearestTimeAfterValue}"
+                    return (False, None, None, f"Exact time not available. {nearestTime_string}")
+                #   ============================================
             
-            if make_booking == False:
-                total_elapsed = time.perf_counter() - overall_start
-                logger.info("Total process time: %.4f seconds", total_elapsed)
-                return (True, None, None, "Exact time available but booking not attempted (make_booking is False).")
+                if make_booking == False:
+                    total_elapsed = time.perf_counter() - overall_start
+                    logger.info("Total process time: %.4f seconds", total_elapsed)
+                    return (True, None, None, "Exact time available but booking not attempted (make_booking is False).")
                 
-            if isEmptyTimeButton or exact_slot is None:
-                return (False, None, None, "No availability available")
+                if isEmptyTimeButton or exact_slot is None:
+                    return (False, None, None, "No availability available")
         
-            logger.info("Selected availability: %s", exact_slot.text)
-            exact_slot.click()
+                logger.info("Selected availability: %s", exact_slot.text)
+                exact_slot.click()
             
-            try:
-                WebDriverWait(driver, 20).until(
-                    EC.presence_of_element_located((By.XPATH, "button[text()='Select']]"))
-                )
+                try:
+                    CancellableWait(driver, 20).until(
+                        EC.presence_of_element_located((By.XPATH, "button[text()='Select']]"))
+                    )
                 
-                reservationSelectButton = WebDriverWait(driver, 20).until(
-                    EC.element_to_be_clickable((By.XPATH, "//button[text()='Select']"))
-                )
-                reservationSelectButton.click()
-            except Exception as e:
-                logger.error("Error selecting reservation: %s", e)
+                    reservationSelectButton = CancellableWait(driver, 20).until(
+                        EC.element_to_be_clickable((By.XPATH, "//button[text()='Select']"))
+                    )
+                    reservationSelectButton.click()
+                except Exception as e:
+                    logger.error("Error selecting reservation: %s", e)
             
-            WebDriverWait(driver, 20).until(
-                EC.presence_of_element_located((By.XPATH, "//input[contains(@name, 'firstName')]"))
-            )
+                CancellableWait(driver, 20).until(
+                    EC.presence_of_element_located((By.XPATH, "//input[contains(@name, 'firstName')]"))
+                )
         
-            error_msg = ""
-            try:
-                booking_result, booking_info = receiving_reservation(driver, first_name, last_name, phone_number, email)
-                if booking_result:
-                    booked = True
-                    confirmation_url = booking_info
-                    logger.info("Booking successful. CancelReservation URL: %s", confirmation_url)
-                else:
-                    error_msg = booking_info
-                    logger.error("Booking failed: %s", error_msg)
+                error_msg = ""
+                try:
+                    booking_result, booking_info = receiving_reservation(driver, first_name, last_name, phone_number, email)
+                    if booking_result:
+                        booked = True
+                        confirmation_url = booking_info
+                        logger.info("Booking successful. CancelReservation URL: %s", confirmation_url)
+                        capture_session_state(driver)
+                    else:
+                        error_msg = booking_info
+                        logger.error("Booking failed: %s", error_msg)
+                except Exception as e:
+                    logger.exception("Unexpected error during reservation process")
+                    return (False, None, None, f"Unexpected error: {e}")
+        
+                total_elapsed = time.perf_counter() - overall_start
+                logger.info("Total booking process time: %.4f seconds", total_elapsed)
+                return (booked, confirmation_url if booked else None, None, error_msg)
             except Exception as e:
-                logger.exception("Unexpected error during reservation process")
+                logger.exception("Unexpected error during booking process")
                 return (False, None, None, f"Unexpected error: {e}")
-        
-            total_elapsed = time.perf_counter() - overall_start
-            logger.info("Total booking process time: %.4f seconds", total_elapsed)
-            return (booked, confirmation_url if booked else None, None, error_msg)
-        except Exception as e:
-            logger.exception("Unexpected error during booking process")
-            return (False, None, None, f"Unexpected error: {e}")
-        
-    finally:
-        if driver is not None:
-            driver.quit()
-            logger.info("WebDriver session closed.")
-            
-def cancel_reservation(cancel_url: str = ""):
+    except DriverUnavailable as e:
+        logger.exception("WebDriver initialization failed.")
+        return (False, None, None, f"WebDriver error: {e}")
+
+def get_day_slots_external(date, party_size='2', restaurant_id='', **kwargs):
+    """
+    Returns every bookable 'HH:MM' slot for a date and party size, from the
+    day slot cache or from one all-meals browser run. Other keyword arguments
+    go to make_reservation_external. Returns None if no slots were collected.
+    """
+    key = day_slot_key(restaurant_id, date, party_size)
+    day_slots = day_slot_cache.get(key)
+    if day_slots is None:
+        # The requested time only has to pass the "not in the past" check.
+        kwargs.setdefault("hour", 23)
+        kwargs.setdefault("minute", 59)
+        kwargs["use_cache"] = False
+
+        def collect():
+            make_reservation_external(date=date, party_size=party_size, restaurant_id=restaurant_id,
+                                      make_booking=False, all_meals=True, **kwargs)
+            return day_slot_cache.get(key)
+        # Concurrent requests for the same day share one browser run.
+        day_slots = availability_flights.do(("opentable", "day_slots") + key, collect)
+    return day_slots
+
+def sweep_dates_external(
+    dates,
+    party_size: str = '2',
+    restaurant_id: str = '',
+    browser_url: str = "",
+    proxy_host: str = None,
+    proxy_port: int = None,
+    proxy_username: str = None,
+    proxy_password: str = None,
+    proxy_scheme: str = "http",
+    launch_profile: str = DEFAULT_LAUNCH_PROFILE,
+    request_allowlist: str = None,
+    record_network: bool = False,
+    use_session_jar: bool = True,
+):
+    """
+    Collects every bookable slot for several dates from one widget page.
+    The page is loaded once and each date is picked in place, in date order
+    so the calendar only ever moves forward. Returns a list of
+    (date, slots, seconds) in date order, with slots None for a date that
+    could not be read; slot sets also go into the day slot cache.
+    """
+    overall_start = time.perf_counter()
+    results = {}
+    pending = []
+    for date in sorted(set(dates)):
+        try:
+            validate_date(date)
+        except ValueError:
+            results[date] = (date, None, 0.0)
+            continue
+        if not validate_reservation_date(date, 23, 59):
+            results[date] = (date, None, 0.0)
+            continue
+        cached = day_slot_cache.get(day_slot_key(restaurant_id, date, party_size))
+        if cached is not None:
+            results[date] = (date, cached, 0.0)
+        else:
+            pending.append(date)
+
+    if pending:
+        try:
+            with driver_session(driver_pool, browser_url, proxy_host, proxy_port, proxy_username, proxy_password, proxy_scheme,
+                                launch_profile, request_allowlist, flow="sweep_dates_external",
+                                record_network=record_network, session_jar=jar_identity(proxy_host, proxy_port, proxy_username, proxy_scheme) if use_session_jar else None) as driver:
+                driver.set_window_size(1300, 1070)
+                start = time.perf_counter()
+                driver.get(restaurant_id)
+                Select(driver.find_element(By.XPATH, "//select[contains(@data-auto, 'partySizePicker')]")).select_by_value(f"{party_size}")
+                logger.info("Widget loaded and party size set in %.4f seconds", time.perf_counter() - start)
+                record_step(driver, "widget_page")
+                for date in pending:
+                    start = time.perf_counter()
+                    try:
+                        select_widget_date(driver, date)
+                        day_slots = collect_day_slots(driver)
+                    except (TimeoutException, NoSuchElementException) as e:
+                        logger.error("Could not read slots for %s: %s", date, e)
+                        results[date] = (date, None, time.perf_counter() - start)
+                        continue
+                    elapsed = time.perf_counter() - start
+                    logger.info("Swept %s: %d slots in %.4f seconds", date, len(day_slots), elapsed)
+                    record_step(driver, f"availability_{date}")
+                    if day_slots:
+                        day_slot_cache.set(day_slot_key(restaurant_id, date, party_size), day_slots)
+                    results[date] = (date, day_slots, elapsed)
+                capture_session_state(driver)
+        except DriverUnavailable:
+            logger.exception("WebDriver initialization failed.")
+        except WebDriverException as e:
+            logger.error("Date sweep stopped: %s", e)
+
+    swept = [results.get(date, (date, None, 0.0)) for date in sorted(set(dates))]
+    logger.info("Swept %d dates (%d from the page) in %.4f seconds", len(swept), len(pending), time.perf_counter() - overall_start)
+    return swept
+
+@invalidates_restaurant("opentable", opentable_restaurant_from_url)
+def cancel_reservation(
+    cancel_url: str = "",
+    browser_url: str = "",
+    proxy_host: str = None,
+    proxy_port: int = None,
+    proxy_username: str = None,
+    proxy_password: str = None,
+    proxy_scheme: str = "http",
+    launch_profile: str = DEFAULT_LAUNCH_PROFILE,
+    request_allowlist: str = None,
+    record_network: bool = False,
+    use_session_jar: bool = True,
+):
     overall_start = time.perf_counter()
     logger.info("Starting cancelling process...")
     try:
-        driver = webdriver.Chrome()
-        driver.set_window_size(1300, 1070)
-        logger.info("WebDriver initialized successfully.")
-    except WebDriverException as e:
+        with driver_session(driver_pool, browser_url, proxy_host, proxy_port, proxy_username, proxy_password, proxy_scheme,
+                            launch_profile, request_allowlist, flow="cancel_reservation", record_network=record_network,
+                            session_jar=jar_identity(proxy_host, proxy_port, proxy_username, proxy_scheme) if use_session_jar else None) as driver:
+            logger.info("WebDriver initialized successfully.")
+            logger.info("Navigating to cancelling URL: %s", cancel_url)
+            start = time.perf_counter()
+            try:
+                driver.set_window_size(1300, 1070)
+                driver.get(cancel_url)
+            except WebDriverException as e:
+                logger.exception("Navigation to cancelling URL failed: %s", cancel_url)
+                return (False, f"WebDriver error: {e}")
+            elapsed = time.perf_counter() - start
+            logger.info("Cancel page loaded in %.4f seconds", elapsed)
+            record_step(driver, "cancel_page")
+            try:
+                cancel_button = driver.find_element(By.XPATH, "//button[@data-test='continue-cancel-button']")
+                elapsed = time.perf_counter() - start
+                logger.info("Cancel button became visible in %.4f seconds", elapsed)
+                cancel_button.click()
+                logger.info("Clicked the cancel button")
+            except TimeoutException:
+                elapsed = time.perf_counter() - overall_start
+                logger.error("Cancel button did not appear after %.4f seconds", elapsed)
+                return (False, "Cancel button did not appear.")
+            except Exception as e:
+                logger.exception("Unexpected error while cancelling: %s", str(e))
+                return (False, f"Unexpected error: {str(e)}")
+            try:
+                element = CancellableWait(driver, 10).until(
+                    EC.presence_of_element_located((By.XPATH, "//h1[contains(text(), 'canceled')]"))
+                )
+                elapsed = time.perf_counter() - start
+                logger.info("Cancel reservation message visible in %.4f seconds", elapsed)
+                record_step(driver, "cancel_confirmation")
+                capture_session_state(driver)
+                return (True, "The requested reservation is cancelled")
+            except TimeoutException:
+                elapsed = time.perf_counter() - overall_start
+                logger.error("Cancel reservation message did not appear after %.4f seconds", elapsed)
+                return (False, "Cancel reservation message did not appear.")
+            except Exception as e:
+                logger.exception("Unexpected error while waiting for cancellation confirmation: %s", str(e))
+                return (False, f"Unexpected error: {str(e)}")
+    except DriverUnavailable as e:
         logger.exception("WebDriver initialization failed.")
         return (False, f"WebDriver error: {e}")
-    logger.info("Navigating to cancelling URL: %s", cancel_url)
-    start = time.perf_counter()
-    try:
-        driver.get(cancel_url)
-    except WebDriverException as e:
-        logger.exception("Navigation to cancelling URL failed: %s", cancel_url)
-        return (False, f"WebDriver error: {e}")
-    elapsed = time.perf_counter() - start
-    logger.info("Cancel page loaded in %.4f seconds", elapsed)
-    try:
-        cancel_button = driver.find_element(By.XPATH, "//button[@data-test='continue-cancel-button']")
-        elapsed = time.perf_counter() - start
-        logger.info("Cancel button became visible in %.4f seconds", elapsed)
-        cancel_button.click()
-        logger.info("Clicked the cancel button")
-    except TimeoutException:
-        elapsed = time.perf_counter() - overall_start
-        logger.error("Cancel button did not appear after %.4f seconds", elapsed)
-        return (False, "Cancel button did not appear.")
-    except Exception as e:
-        logger.exception("Unexpected error while cancelling: %s", str(e))
-        return (False, f"Unexpected error: {str(e)}")
-    try:
-        element = WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.XPATH, "//h1[contains(text(), 'canceled')]"))
-        )
-        elapsed = time.perf_counter() - start
-        logger.info("Cancel reservation message visible in %.4f seconds", elapsed)
-        return (True, "The requested reservation is cancelled")
-    except TimeoutException:
-        elapsed = time.perf_counter() - overall_start
-        logger.error("Cancel reservation message did not appear after %.4f seconds", elapsed)
-        return (False, "Cancel reservation message did not appear.")
-    except Exception as e:
-        logger.exception("Unexpected error while waiting for cancellation confirmation: %s", str(e))
-        return (False, f"Unexpected error: {str(e)}")
 
 if __name__ == '__main__':
     
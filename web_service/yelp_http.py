@@ -0,0 +1,162 @@
+import time
+from datetime import datetime
+from html.parser import HTMLParser
+from config import logger
+from http_client import get_http_session, AvailabilityParseError
+from utils import select_time_slot, format_alternatives
+from capabilities import learn_from_yelp_page
+
+YELP_BASE_URL = "https://www.yelp.com"
+
+class ReservationPageParser(HTMLParser):
+    """
+    Pulls the parts of the Yelp reservations widget the Selenium flow reads:
+    the 'Select a date' input value, the party size options, the time slot
+    buttons with their disabled state, and the 'No Availability' marker.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.date_value = None
+        self.party_options = []
+        self.slots = []           # [(time_text, available)]
+        self.no_availability = False
+        self._option = None
+        self._button = None       # (text parts, available) of the open button
+        self._paragraph = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "input" and attrs.get("aria-label") == "Select a date":
+            self.date_value = attrs.get("value") or ""
+        elif tag == "option":
+            self._option = []
+        elif tag == "button" and attrs.get("data-button") == "true":
+            self._button = ([], "disabled" not in attrs)
+        elif tag == "p":
+            self._paragraph = []
+
+    def handle_endtag(self, tag):
+        if tag == "option" and self._option is not None:
+            self.party_options.append(" ".join("".join(self._option).split()))
+            self._option = None
+        elif tag == "button" and self._button is not None:
+            parts, available = self._button
+            text = " ".join("".join(parts).split())
+            if text != "Confirm" and ("am" in text or "pm" in text):
+                self.slots.append((text, available))
+            self._button = None
+        elif tag == "p" and self._paragraph is not None:
+            if "".join(self._paragraph).strip() == "No Availability":
+                self.no_availability = True
+            self._paragraph = None
+
+    def handle_data(self, data):
+        if self._option is not None:
+            self._option.append(data)
+        if self._button is not None:
+            self._button[0].append(data)
+        if self._paragraph is not None:
+            self._paragraph.append(data)
+
+def parse_reservation_page(html):
+    """
+    Parses a reservations page into a ReservationPageParser.
+    Raises AvailabilityParseError if the widget is not in the markup.
+    """
+    parser = ReservationPageParser()
+    parser.feed(html)
+    parser.close()
+    if parser.date_value is None:
+        raise AvailabilityParseError("date input not found in page")
+    if not parser.party_options:
+        raise AvailabilityParseError("party size options not found in page")
+    if not parser.slots and not parser.no_availability:
+        raise AvailabilityParseError("neither time slots nor 'No Availability' found in page")
+    return parser
+
+def fetch_reservation_page(session, restaurant_id, date, hour, minute, party_size, base_url=YELP_BASE_URL):
+    """
+    Fetches and parses the reservations page for one date, time and party size.
+    Raises AvailabilityParseError (or a network error) if it cannot be used.
+    """
+    requested_24 = f"{hour:02d}{minute:02d}"
+    reservation_link = f"{base_url}/reservations/{restaurant_id}?date={date}&time={requested_24}&covers={party_size}"
+    logger.info("Checking availability over HTTP: %s", reservation_link)
+    response = session.get(reservation_link)
+    if response.status != 200:
+        raise AvailabilityParseError(f"HTTP status {response.status}")
+    page = parse_reservation_page(response.text())
+    learn_from_yelp_page(restaurant_id, date, page)
+    return page
+
+def exact_slot_available(page, hour, minute):
+    """
+    Returns True if the page shows the given time as a bookable slot.
+    """
+    requested_dt = datetime(1900, 1, 1, hour, minute)
+    for time_text, available in page.slots:
+        try:
+            if available and datetime.strptime(time_text, "%I:%M %p") == requested_dt:
+                return True
+        except ValueError:
+            continue
+    return False
+
+def availability_from_page(page, date, hour, minute, party_size):
+    """
+    Applies make_reservation's availability checks to a parsed page loaded
+    for this date, time and party size. Returns make_reservation's 4-tuple.
+    """
+    date_obj = datetime.strptime(date, "%Y-%m-%d")
+    formatted_date_win = date_obj.strftime("%b ") + str(date_obj.day)
+    if formatted_date_win not in page.date_value:
+        logger.error(f"Reservation date {formatted_date_win} is not in allowed range.")
+        return (False, None, None, f"Reservation date {formatted_date_win} is not in allowed range.")
+
+    try:
+        size = int(party_size)
+    except (TypeError, ValueError) as e:
+        # Same answer the browser flow gives for a party size it cannot read.
+        logger.error("Unexpected party size %r: %s", party_size, e)
+        return (False, None, None, f"Unexpected error: {str(e)}")
+    if size < 1:
+        logger.error("Party size is invalid.")
+        return (False, None, None, "Party size is not in allowed range.")
+    party_option = f"{party_size} people" if size > 1 else "1 person"
+    if party_option not in page.party_options:
+        logger.error(f"The party size {party_size} is bigger than maximum.")
+        return (False, None, None, "The party size is bigger than maximum.")
+
+    if not page.slots:
+        logger.error("No time slot buttons found on the page.")
+        return (False, None, None, "No time slot buttons found on the page.")
+
+    requested_dt = datetime(1900, 1, 1, hour, minute)
+    exact_index, candidate_left, candidate_right = select_time_slot(len(page.slots), page.slots.__getitem__, requested_dt)
+    if exact_index is not None:
+        return (True, None, None, None)
+    return (False, None, format_alternatives(candidate_left, candidate_right), None)
+
+def check_availability_http(date, hour, minute, party_size, restaurant_id,
+                            proxy_host=None, proxy_port=None, proxy_username=None, proxy_password=None,
+                            proxy_scheme="http", base_url=YELP_BASE_URL):
+    """
+    Browserless version of make_reservation's availability check: fetches the
+    reservations page through the proxy and applies the same checks to the
+    server-rendered widget. Returns the same 4-tuple as make_reservation, or
+    None if the page could not be fetched or parsed and the caller should use
+    the browser instead.
+    """
+    start = time.perf_counter()
+    session = get_http_session(proxy_host, proxy_port, proxy_username, proxy_password, proxy_scheme)
+    try:
+        page = fetch_reservation_page(session, restaurant_id, date, hour, minute, party_size, base_url)
+    except Exception as e:
+        logger.warning("HTTP availability probe failed after %.4f seconds, falling back to the browser: %s",
+                       time.perf_counter() - start, e)
+        return None
+
+    result = availability_from_page(page, date, hour, minute, party_size)
+    logger.info("HTTP availability probe result %s in %.4f seconds", result, time.perf_counter() - start)
+    return result